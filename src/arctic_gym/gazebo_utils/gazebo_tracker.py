@@ -4,11 +4,8 @@ from math import cos, sin, radians
 
 from src.continuous_grid_arctic.utils.misc import rotateVector, angle_correction
 from src.continuous_grid_arctic.utils.sensors import LeaderPositionsTracker_v2
-from src.continuous_grid_arctic.utils.sensors import LeaderCorridor_lasers
 from src.continuous_grid_arctic.utils.sensors import LeaderCorridor_Prev_lasers_v2
 
-from collections import deque
-
 
 class GazeboLeaderPositionsTracker_v2(LeaderPositionsTracker_v2):
 
@@ -44,41 +41,12 @@ class GazeboLeaderPositionsTracker_v2(LeaderPositionsTracker_v2):
 
         # 1) Пересчет истории
         if len(self.leader_positions_hist) > 0:
-            x_hist_pose, y_hist_pose = zip(*self.leader_positions_hist)
-            x_new_hist_pose = x_hist_pose - delta_cx
-            x_new_hist_pose = np.round(x_new_hist_pose, decimals=5)
-            y_new_hist_pose = y_hist_pose - delta_cy
-            y_new_hist_pose = np.round(y_new_hist_pose, decimals=5)
-            pose_hist = zip(x_new_hist_pose, y_new_hist_pose)
-            self.leader_positions_hist.clear()
-            self.leader_positions_hist.extend(np.array(x) for x in pose_hist)
+            self.leader_positions_hist.view[...] = np.round(self.leader_positions_hist.view - (delta_cx, delta_cy),
+                                                            decimals=5)
 
         # 2) Пересчет коридора
         if len(self.corridor) > 0:
-
-            right_border, left_border = zip(*self.corridor)
-
-            x_right_border, y_right_border = zip(*right_border)
-            x_right_border_new = x_right_border - delta_cx
-            y_right_border_new = y_right_border - delta_cy
-
-            r1 = zip(x_right_border_new, y_right_border_new)
-            right_border_new = deque()
-            right_border_new.extend(np.array(x) for x in r1)
-
-            x_left_border, y_left_border = zip(*left_border)
-            x_left_border_new = x_left_border - delta_cx
-            # x_left_border_new = np.round(x_left_border_new, decimals=5)
-            y_left_border_new = y_left_border - delta_cy
-            # y_left_border_new = np.round(y_left_border_new, decimals=5)
-
-            l1 = zip(x_left_border_new, y_left_border_new)
-            left_border_new = deque()
-            left_border_new.extend(np.array(x) for x in l1)
-
-            self.corridor.clear()
-            right_left_new = zip(right_border_new, left_border_new)
-            self.corridor.extend(right_left_new)
+            self.corridor.shift((delta_cx, delta_cy))
 
         # Баг с удалением коридора
         # if len(self.corridor) > 2 and len(self.leader_positions_hist) > 2 \
@@ -121,11 +89,8 @@ class GazeboLeaderPositionsTracker_v2(LeaderPositionsTracker_v2):
                 #     distance.euclidean(point_behind_follower, env.leader.position) / (
                 #             self.saving_period * 5 * env.leader.max_speed))
 
-                self.leader_positions_hist.extend(np.array(x) for x in
-                                                  zip(np.linspace(point_behind_follower[0], leader_position[0],
-                                                                  first_dots_for_follower_count),
-                                                      np.linspace(point_behind_follower[1], leader_position[1],
-                                                                  first_dots_for_follower_count)))
+                self.leader_positions_hist.extend(np.linspace(point_behind_follower, leader_position,
+                                                              first_dots_for_follower_count))
                 # first_dots_for_follower_count = int(distance.euclidean(follower_position, leader_position) /
                 #                                     (self.saving_period * 1.5 * leader_max_speed))
                 # first_dots_for_follower_count = 5
@@ -227,70 +192,7 @@ class GazeboCorridor_Prev_lasers_v2(LeaderCorridor_Prev_lasers_v2):
             self.history_obstacles_list.pop(0)
             self.history_obstacles_list.append(corridor_lines)
 
-            all_obs_list = []
-
-            for j, corridor_lines_item in enumerate(self.history_obstacles_list):
-                corridor_lines_item = np.array(corridor_lines_item)
-
-                lasers_values_item = []
-                self.lasers_collides_item = []
-                for laser_end_point in self.lasers_end_points:
-                    if corridor_lines_item != []:
-                        rez = LeaderCorridor_lasers.intersect(corridor_lines_item[:, 0, :],
-                                                              corridor_lines_item[:, 1, :],
-                                                              np.array([follower_position]),
-                                                              np.array([laser_end_point]))
-                        intersected_line_item = corridor_lines_item[rez]
-
-                        if len(intersected_line_item) > 0:
-                            x = LeaderCorridor_lasers.seg_intersect(intersected_line_item[:, 0, :],
-                                                                    intersected_line_item[:, 1, :],
-                                                                    np.array([follower_position]),
-                                                                    np.array([laser_end_point]))
-                            # TODO: исключить коллинеарные, вместо их точек пересечения добавить ближайшую точку коллинеарной границы
-                            # но это бесполезно при использовании функции intersect, которая не работает с коллинеарными
-                            exclude_rows = np.concatenate([np.nonzero(np.isinf(x))[0], np.nonzero(np.isnan(x))[0]])
-                            norms = np.linalg.norm(x - follower_position, axis=1)
-                            lasers_values_item.append(np.min(norms))
-                            closest_dot_idx = np.argmin(np.linalg.norm(x - follower_position, axis=1))
-                            self.lasers_collides_item.append(x[closest_dot_idx])
-                        else:
-                            self.lasers_collides_item.append(laser_end_point)
-                    else:
-                        self.lasers_collides_item.append(laser_end_point)
-
-                obs_item = np.ones(self.lasers_count, dtype=np.float32) * self.laser_length
-                for i, collide in enumerate(self.lasers_collides_item):
-                    obs_item[i] = np.linalg.norm(collide - follower_position)
-
-                if self.pad_sectors:
-                    front = np.zeros(len(obs_item))
-                    right = np.zeros(len(obs_item))
-                    behind = np.zeros(len(obs_item))
-                    left = np.zeros(len(obs_item))
-
-                    lasers_in_sector = self.lasers_count / 4
-                    for i in range(len(obs_item)):
-                        if i < lasers_in_sector:
-                            front[i] = obs_item[i]
-                        elif lasers_in_sector <= i < 2 * lasers_in_sector:
-                            right[i] = obs_item[i]
-                        elif 2 * lasers_in_sector <= i < 3 * lasers_in_sector:
-                            behind[i] = obs_item[i]
-                        else:
-                            left[i] = obs_item[i]
-
-                    # front = np.array([obs_item[0], obs_item[1], 0, 0, 0, 0, 0, 0, 0, 0, 0, obs_item[11]])
-                    # right = np.array([0, 0, obs_item[2], obs_item[3], obs_item[4], 0, 0, 0, 0, 0, 0, 0])
-                    # behind = np.array([0, 0, 0, 0, 0, obs_item[5], obs_item[6], obs_item[7], 0, 0, 0, 0])
-                    # left = np.array([0, 0, 0, 0, 0, 0, 0, 0, obs_item[8], obs_item[9], obs_item[10], 0])
-                    res_out = np.concatenate((front, right, behind, left), axis=None)
-                else:
-                    res_out = obs_item
-
-                all_obs_list.append(res_out)
-
-            all_obs_arr = np.array(all_obs_list)
+            all_obs_arr = self._history_observation(follower_position)
             # print(all_obs_arr)
         #             print('ALL CORIDOR OBS ARR 1: ', all_obs_arr)
         #             print('ALL CORIDOR OBS ARR 1: ', all_obs_arr.shape)
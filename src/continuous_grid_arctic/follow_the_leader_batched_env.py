@@ -0,0 +1,169 @@
+import numpy as np
+from gym.vector import VectorEnv
+
+try:
+    from continuous_grid_arctic.follow_the_leader_continuous_env import Game
+    from continuous_grid_arctic.utils.kinematics import RobotsKinematics
+    from continuous_grid_arctic.utils.observation import detach
+except:
+    from src.continuous_grid_arctic.follow_the_leader_continuous_env import Game
+    from src.continuous_grid_arctic.utils.kinematics import RobotsKinematics
+    from src.continuous_grid_arctic.utils.observation import detach
+
+
+class BatchedGame(VectorEnv):
+    def __init__(self, num_envs, **game_kwargs):
+        """
+        Batch of N Game environments stepped as one vectorized environment (gym.vector.VectorEnv).
+        Kinematics of all leaders, followers and dynamic obstacles (bears) of the batch is kept in one
+        structure of arrays (RobotsKinematics) and updated for the whole batch per frame; collisions, green zone,
+        rewards and sensors are processed by the Game instances themselves.
+
+        All environments share the global random generators (see Game.seed), so the batch reproduces the Game
+        dynamics, but not the random sequence of N separate Game runs.
+        Finished environments are reset automatically, their last observation is returned in
+        info["terminal_observation"].
+
+        :param num_envs (int):
+            number of environments in the batch
+        :param game_kwargs:
+            Game parameters, the same for all environments; headless is True by default
+        """
+        game_kwargs.setdefault("headless", True)
+        if game_kwargs.get("manual_control", False):
+            raise ValueError("BatchedGame does not support manual_control")
+
+        self.games = [Game(**game_kwargs) for _ in range(num_envs)]
+        super(BatchedGame, self).__init__(num_envs,
+                                          self.games[0].observation_space,
+                                          self.games[0].action_space)
+
+        # строки массивов: для среды i ведомый -- i * robots_per_game, ведущий -- +1, медведи -- +2...
+        self.bears_per_game = self.games[0].bear_number if self.games[0].add_bear else 0
+        self.robots_per_game = 2 + self.bears_per_game
+        self.kinematics = RobotsKinematics(num_envs * self.robots_per_game)
+        self.robots = [None] * (num_envs * self.robots_per_game)
+
+        self._actions = None
+
+    def seed(self, seed=None):
+        # генераторы случайных чисел у всех сред общие
+        self.games[0].seed(seed)
+
+    def reset_async(self, *args, **kwargs):
+        pass
+
+    def reset_wait(self, *args, **kwargs):
+        return self._batch_observations([self._reset_game(i) for i in range(self.num_envs)])
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self, *args, **kwargs):
+        for env_index, game in enumerate(self.games):
+            game._apply_action(self._actions[env_index])
+            self._load_game(env_index)
+
+        frames_per_step = np.array([game.frames_per_step for game in self.games])
+        frame_results = [None] * self.num_envs
+        for frame_nb in range(frames_per_step.max()):
+            active_envs = np.flatnonzero(frames_per_step > frame_nb)
+            for env_index, frame_result in zip(active_envs, self._frame_step(active_envs)):
+                frame_results[env_index] = frame_result
+
+        observations = list()
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = list()
+        for env_index, game in enumerate(self.games):
+            reward, done, info = frame_results[env_index]
+            obs, rewards[env_index], dones[env_index], info = game._finish_step(reward, done, info)
+            if done:
+                info["terminal_observation"] = detach(obs)
+                obs = self._reset_game(env_index)
+            observations.append(obs)
+            infos.append(info)
+
+        return self._batch_observations(observations), rewards, dones, infos
+
+    def _frame_step(self, active_envs):
+        """One frame for the environments active_envs, returns reward, done and info of the frame for them"""
+        if len(active_envs) == 1:
+            # для одной среды массивы ничего не дают, кадр выполняется самой средой и её состояние копируется в массивы
+            env_index = active_envs[0]
+            frame_result = self.games[env_index]._frame()
+            self._load_game(env_index)
+            return [frame_result]
+
+        games = [self.games[i] for i in active_envs]
+        infos = [game._begin_frame() for game in games]
+
+        self._move_robots(active_envs * self.robots_per_game)
+        for game, info in zip(games, infos):
+            game._process_follower_move(info)
+
+        if self.bears_per_game > 0:
+            bears_index = (active_envs[:, None] * self.robots_per_game + 2 +
+                           np.arange(self.bears_per_game)[None, :]).ravel()
+            bears_points = np.array([game._bears_target_points() for game in games], dtype=np.float64)
+            self.kinematics.command_to_the_point(bears_index, bears_points.reshape(-1, 2))
+            self._move_robots(bears_index)
+
+        leader_speeds = [game._leader_frame_speed(info) for game, info in zip(games, infos)]
+        leader_moves = np.array([speed is not None for speed in leader_speeds], dtype=bool)
+        leaders_index = active_envs * self.robots_per_game + 1
+
+        stopped_index = leaders_index[~leader_moves]
+        if len(stopped_index) > 0:
+            self.kinematics.command_forward(stopped_index, 0)
+            self.kinematics.command_turn(stopped_index, 0, 0)
+            for row in stopped_index:
+                self.kinematics.store(row, self.robots[row])
+
+        moving_index = leaders_index[leader_moves]
+        if len(moving_index) > 0:
+            moving_games = [game for game, moves in zip(games, leader_moves) if moves]
+            target_points = np.array([game.cur_target_point for game in moving_games], dtype=np.float64)
+            speeds = np.array([speed for speed in leader_speeds if speed is not None], dtype=np.float64)
+            self.kinematics.command_to_the_point(moving_index, target_points, speed=speeds)
+            self._move_robots(moving_index)
+
+        return [game._end_frame(info) for game, info in zip(games, infos)]
+
+    def _move_robots(self, index):
+        """Moves the robots of the rows index and writes their state back to the robot objects"""
+        turned = self.kinematics.move(index)
+        for row, row_turned in zip(index, turned):
+            robot = self.robots[row]
+            self.kinematics.store(row, robot)
+            robot._update_rectangle(row_turned)
+
+    def _reset_game(self, env_index):
+        obs = self.games[env_index].reset()
+        self._load_game(env_index)
+        return obs
+
+    def _load_game(self, env_index):
+        """Binds the robots of the environment to its rows and copies their state into the arrays"""
+        game = self.games[env_index]
+        first_row = env_index * self.robots_per_game
+        robots = [game.follower, game.leader] + game.game_dynamic_list[:self.bears_per_game]
+        for row, robot in enumerate(robots, start=first_row):
+            self.robots[row] = robot
+            self.kinematics.load(row, robot)
+
+    @staticmethod
+    def _batch_observations(observations):
+        """Stacks the observation dicts of the environments; values of different shape are returned as tuples"""
+        batch = dict()
+        for key in observations[0]:
+            values = [obs[key] for obs in observations]
+            if all(isinstance(value, np.ndarray) for value in values) and len({value.shape for value in values}) == 1:
+                batch[key] = np.stack(values)
+            else:
+                batch[key] = tuple(values)
+        return batch
+
+    def close_extras(self, **kwargs):
+        for game in self.games:
+            game.close()
@@ -1,4 +1,3 @@
-import os
 import random
 import time
 import logging
@@ -7,12 +6,10 @@ from collections import OrderedDict
 import pygame
 from math import radians, cos, sin
 import numpy as np
-import pandas as pd
 from scipy.spatial import distance
 import gym
 from gym.envs.registration import register as gym_register
 from gym.spaces import Discrete, Box
-from copy import deepcopy
 
 try:
     from continuous_grid_arctic.utils.classes import AbstractRobot, GameObject, RobotWithSensors
@@ -22,7 +19,14 @@ try:
     from continuous_grid_arctic.utils.rrt_star import RRTStar
     from continuous_grid_arctic.utils.lqr_rrt_star import LQRRRTStar
     from continuous_grid_arctic.utils.dstar import Map, Dstar
+    from continuous_grid_arctic.utils.occupancy_grid import occupancy_grid
     from continuous_grid_arctic.utils.rrt import RRT
+    from continuous_grid_arctic.utils.spatial_index import ObstaclesIndex, PointsIndex
+    from continuous_grid_arctic.utils.sprites import rotated_image
+    from continuous_grid_arctic.utils.assets import get_font
+    from continuous_grid_arctic.utils.scenario_cache import ScenarioCache, scenario_key
+    from continuous_grid_arctic.utils.scenario_pack import ScenarioPack, scenario_parameters_id
+    from continuous_grid_arctic.utils.observation import StructuredObservation
     from continuous_grid_arctic.utils.misc import angle_correction, rotateVector, calculateAngle, distance_to_rect
 except:
     from src.continuous_grid_arctic.utils.classes import AbstractRobot, GameObject, RobotWithSensors
@@ -32,7 +36,14 @@ except:
     from src.continuous_grid_arctic.utils.rrt_star import RRTStar
     from src.continuous_grid_arctic.utils.lqr_rrt_star import LQRRRTStar
     from src.continuous_grid_arctic.utils.dstar import Map, Dstar
+    from src.continuous_grid_arctic.utils.occupancy_grid import occupancy_grid
     from src.continuous_grid_arctic.utils.rrt import RRT
+    from src.continuous_grid_arctic.utils.spatial_index import ObstaclesIndex, PointsIndex
+    from src.continuous_grid_arctic.utils.sprites import rotated_image
+    from src.continuous_grid_arctic.utils.assets import get_font
+    from src.continuous_grid_arctic.utils.scenario_cache import ScenarioCache, scenario_key
+    from src.continuous_grid_arctic.utils.scenario_pack import ScenarioPack, scenario_parameters_id
+    from src.continuous_grid_arctic.utils.observation import StructuredObservation
     from src.continuous_grid_arctic.utils.misc import angle_correction, rotateVector, calculateAngle, distance_to_rect
 
 AVG_FRAMES_PER_SECOND = 100
@@ -101,6 +112,12 @@ class Game(gym.Env):
                  ignore_follower_collisions=False,
                  path_finding_iterations=15000,
                  leader_margin=1.5,
+                 headless=False,
+                 sprite_angle_step=1,
+                 scenario_cache_size=0,
+                 scenario_cache_dir=None,
+                 scenario_pack=None,
+                 structured_observation=False,
                  **kwargs
                  ):
         """
@@ -129,7 +146,7 @@ class Game(gym.Env):
         :param show_sensors_flag (bool):
             flag, drawing sensors
         :param simulation_time_limit (int or None):
-            time limit for simulation, sec, if None - not limited
+            time limit for simulation, sec of simulated time (frames / framerate), if None - not limited
         :param reward_config (str, Path or None):
             path to the reward json created using the reward_constructor class. If None, creates by default (Ivan v.1)
         :param pixels_to_meter (int):
@@ -196,6 +213,24 @@ class Game(gym.Env):
             step grid for planning trajectory
         :param follower_sensors (dict):
             dictionary of the agent sensors configuration
+        :param headless (bool):
+            flag, simulation without a pygame window: frames are not limited by framerate, the drawing surface
+            is created only when render() is called
+        :param sprite_angle_step (float):
+            step in degrees to which the angles of rotated sprites are rounded when rendering, the rotated sprites are
+            cached for the whole process; None -- exact rotation on every frame. Hitboxes are not affected
+        :param scenario_cache_size (int):
+            number of generated scenarios (robots start positions, obstacles, finish points, the leader route) kept
+            in memory; a reset with the same seed and generation parameters takes the scenario from the cache
+            instead of generating it. 0 -- memory cache is off
+        :param scenario_cache_dir (str):
+            directory where the generated scenarios are saved, shared between processes and runs; None -- not saved
+        :param scenario_pack (str or ScenarioPack):
+            path to a pack of pre-generated scenarios (utils/scenario_pack), reset takes a random scenario from it
+            instead of generating one; the generation parameters of the pack must match the environment
+        :param structured_observation (bool):
+            flag, the observation is a StructuredObservation (utils/observation) filled in place every step instead of
+            a new dict; it gives the keys of the dict, but it is the same object each step
         """
 
         # нужно для сохранения видео
@@ -213,9 +248,18 @@ class Game(gym.Env):
             "pink": (251, 204, 231)
         }
         self.early_stopping = early_stopping
-        pygame.font.init()
-        self.font = pygame.font.SysFont('Arial', 30)
+        self.headless = headless
+        if self.headless and manual_control:
+            raise ValueError("Manual control requires a pygame window, headless must be False")
+        # в режиме без окна шрифт и поверхность для отрисовки создаются при первом вызове render()
+        self.font = None
+        self.gameDisplay = None
+        self.clock = None
+        if not self.headless:
+            self.font = get_font('Arial', 30)
         self.return_render_matrix = return_render_matrix
+        # наблюдение, которое заполняется на месте; None -- каждый шаг создаётся новый словарь
+        self.structured_observation = StructuredObservation() if structured_observation else None
         self.ignore_follower_collisions = ignore_follower_collisions
 
         # TODO: сделать нормально
@@ -224,6 +268,9 @@ class Game(gym.Env):
         self.constant_follower_speed = constant_follower_speed
         self.path_finding_algorythm = path_finding_algorythm
         self.path_finding_iterations = path_finding_iterations
+        self.scenario_cache = None
+        if scenario_cache_size > 0 or scenario_cache_dir is not None:
+            self.scenario_cache = ScenarioCache(scenario_cache_size, scenario_cache_dir)
 
         # задание траектории, которое полноценно обрабатывается в методе reset()
         self.trajectory = trajectory
@@ -270,6 +317,7 @@ class Game(gym.Env):
         self.show_box_flag = show_box_flag
         self.show_objects_flag = show_objects_flag
         self.show_sensors_flag = show_sensors_flag
+        self.sprite_angle_step = sprite_angle_step
 
         self.simulation_time_limit = simulation_time_limit
 
@@ -286,13 +334,14 @@ class Game(gym.Env):
 
         self.warm_start = warm_start
 
-        self.leader_img = pygame.image.load("{}/imgs/car_yellow.png".format(os.path.dirname(os.path.abspath(__file__))))
-        self.follower_img = pygame.image.load(
-            "{}/imgs/car_poice.png".format(os.path.dirname(os.path.abspath(__file__))))
-        self.wall_img = pygame.image.load("{}/imgs/wall.png".format(os.path.dirname(os.path.abspath(__file__))))
-        self.rock_img = pygame.image.load("{}/imgs/rock.png".format(os.path.dirname(os.path.abspath(__file__))))
+        # имена изображений из imgs/, сами изображения загружаются и масштабируются один раз на процесс (utils/assets)
+        # при первой отрисовке объекта
+        self.leader_img = "car_yellow.png"
+        self.follower_img = "car_poice.png"
+        self.wall_img = "wall.png"
+        self.rock_img = "rock.png"
 
-        self.bear_img = pygame.image.load("{}/imgs/bear.png".format(os.path.dirname(os.path.abspath(__file__))))
+        self.bear_img = "bear.png"
 
         self.caption = caption
         self.manual_control = manual_control
@@ -404,14 +453,27 @@ class Game(gym.Env):
                 random_frames_per_step)
             self.frames_per_step = np.random.randint(random_frames_per_step[0], random_frames_per_step[1])
         self.check_parameters()
+
+        self.scenario_pack = scenario_pack
+        if isinstance(scenario_pack, str):
+            self.scenario_pack = ScenarioPack(scenario_pack)
+        if self.scenario_pack is not None and \
+                self.scenario_pack.parameters != scenario_parameters_id(self._scenario_parameters()):
+            raise ValueError("Scenario pack was generated with other parameters: {}".format(
+                self.scenario_pack.parameters))
+
         self.green_zone_trajectory_points = list()
         self.left_border_points_list = list()
         self.right_border_points_list = list()
         self.follower_scan_dict = {}
         self.step_count = 0
+        # счётчик кадров симуляции, заменяет системное время pygame, чтобы эпизод при том же сиде
+        # не зависел от скорости машины
+        self.frame_count = 0
         self.cur_speed_multiplier = 1
         self.game_object_list = list()
         self.game_dynamic_list = list()
+        self.obstacles_index = None
 
         self.count_history = 0
 
@@ -445,6 +507,7 @@ class Game(gym.Env):
         if DEBUG:
             self.debug_info = {}
         self.step_count = 0
+        self.frame_count = 0
         self.accumulated_penalty = 0
         self.cur_speed_multiplier = 1
         self.found_target_point = False
@@ -457,34 +520,8 @@ class Game(gym.Env):
         # Список всех динамических препятствий
         self.game_dynamic_list = list()
 
-        # Создание ведущего и ведомого
-        self._create_robots()
-
-        # Создание препятствий
-        if self.add_obstacles:
-            self._create_obstacles()
-
-
-        # в случае, если траектория не задана или была сгенерирована, при каждой симуляции генерируем новую
-        # случайную траекторию
-        if (self.trajectory is None) or self.trajectory_generated:
-            self.finish_point = self.generate_finish_point([20, 20], [int(self.DISPLAY_WIDTH/2), self.DISPLAY_HEIGHT - 20])
-            if self.multiple_end_points:
-                if self.finish_point[1] >= (self.DISPLAY_HEIGHT / 2):
-                    self.finish_point2 = self.generate_finish_point([20, 20], [self.DISPLAY_WIDTH-20, int(self.DISPLAY_HEIGHT / 2)])
-                else:
-                    self.finish_point2 = self.generate_finish_point([20, int(self.DISPLAY_HEIGHT / 2)],  [self.DISPLAY_WIDTH-20, self.DISPLAY_HEIGHT - 20])
-                if self.finish_point2[1] >= (self.DISPLAY_HEIGHT / 2):
-                    self.finish_point3 = self.generate_finish_point([20, 20], [self.DISPLAY_WIDTH - 20,
-                                                                               int(self.DISPLAY_HEIGHT / 2)])
-                else:
-                    self.finish_point3 = self.generate_finish_point([20, int(self.DISPLAY_HEIGHT / 2)],
-                                                                    [self.DISPLAY_WIDTH - 20, self.DISPLAY_HEIGHT - 20])
-            if self.path_finding_algorythm == "dstar":
-                self.trajectory = self.generate_trajectory_dstar()
-            elif self.path_finding_algorythm == "astar":
-                self.trajectory = self.generate_trajectory_astar(max_iter=None)
-            self.trajectory_generated = True
+        # Создание ведущего и ведомого, препятствий и маршрута ведущего (или загрузка готового сценария из кэша)
+        self._create_scenario()
 
         # TODO : перенести в конфиг
         if self.add_bear:
@@ -514,10 +551,12 @@ class Game(gym.Env):
                 self.cur_target_id]  # координаты текущей целевой точки (возможно избыточны)
 
         # Инициализация сеанса pygame, создание окна и часов
-        pygame.init()
-        self.gameDisplay = pygame.display.set_mode((self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT))
-        pygame.display.set_caption(self.caption)
-        self.clock = pygame.time.Clock()
+        if not self.headless:
+            pygame.init()
+            self.gameDisplay = pygame.display.set_mode((self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT))
+            pygame.display.set_caption(self.caption)
+            self.clock = pygame.time.Clock()
+        self.ms_since_last_tick = 1000 / self.framerate
 
         self.simulation_number += 1
 
@@ -531,10 +570,15 @@ class Game(gym.Env):
             self._reset_pose_bear()
 
         self.leader_factual_trajectory = list()  # список, который сохраняет пройденные лидером точки;
+        # длина пути от начала траектории до каждой её точки и сетка по точкам траектории
+        self.leader_trajectory_path_length = list()
+        self.leader_trajectory_index = PointsIndex(cell_size=max(self.leader_pos_epsilon, 1))
+        # первая точка траектории, входящая в зелёную зону
+        self.green_zone_start_id = 0
         # добавляем начальные позиции - от ведомого до лидера, чтоб там была сейф зона.
         first_dots_for_follower_count = int(distance.euclidean(self.follower.position, self.leader.position) / (
                 self.trajectory_saving_period * self.leader.max_speed))
-        self.leader_factual_trajectory.extend(
+        self._save_leader_trajectory_points(
             zip(np.linspace(self.follower.position[0], self.leader.position[0], first_dots_for_follower_count),
                 np.linspace(self.follower.position[1], self.leader.position[1], first_dots_for_follower_count)))
 
@@ -542,12 +586,110 @@ class Game(gym.Env):
         self.finish_position_framestimer = None
         return self._get_obs()
 
-    def _create_robots(self):
+    def _create_scenario(self):
+        """
+        Creates the robots, the obstacles, the finish points and the leader route. If the route is generated, the
+        scenario is taken from the scenario pack (random scenario) or from the scenario cache. For the cache the
+        scenario is found by the current state of the random generators, the generators are set to the state after
+        its generation, so the simulation is the same as without the cache.
+        """
+        if self.scenario_pack is not None and ((self.trajectory is None) or self.trajectory_generated):
+            self._apply_scenario(self.scenario_pack[random.randrange(len(self.scenario_pack))])
+            return
+
+        key = None
+        if self.scenario_cache is not None and ((self.trajectory is None) or self.trajectory_generated):
+            key = scenario_key(self._scenario_parameters())
+            scenario = self.scenario_cache.get(key)
+            if scenario is not None:
+                self._apply_scenario(scenario)
+                random.setstate(scenario["random_state"])
+                np.random.set_state(scenario["np_random_state"])
+                return
+
+        self._generate_scenario()
+        if key is not None:
+            self.scenario_cache.put(key, self._scenario_state())
+
+    def _generate_scenario(self):
+        """Generates the scenario: random positions of the robots and the obstacles, the finish points and the route"""
+        # Создание ведущего и ведомого
+        self._create_robots()
+
+        # Создание препятствий
+        if self.add_obstacles:
+            self._create_obstacles()
+
+        # сетка статических препятствий, ведущий и ведомый проверяются всегда
+        self.obstacles_index = ObstaclesIndex(self.game_object_list, moving_objects=(self.leader, self.follower))
+
+        # в случае, если траектория не задана или была сгенерирована, при каждой симуляции генерируем новую
+        # случайную траекторию
+        if (self.trajectory is None) or self.trajectory_generated:
+            self.finish_point = self.generate_finish_point([20, 20], [int(self.DISPLAY_WIDTH/2), self.DISPLAY_HEIGHT - 20])
+            if self.multiple_end_points:
+                if self.finish_point[1] >= (self.DISPLAY_HEIGHT / 2):
+                    self.finish_point2 = self.generate_finish_point([20, 20], [self.DISPLAY_WIDTH-20, int(self.DISPLAY_HEIGHT / 2)])
+                else:
+                    self.finish_point2 = self.generate_finish_point([20, int(self.DISPLAY_HEIGHT / 2)],  [self.DISPLAY_WIDTH-20, self.DISPLAY_HEIGHT - 20])
+                if self.finish_point2[1] >= (self.DISPLAY_HEIGHT / 2):
+                    self.finish_point3 = self.generate_finish_point([20, 20], [self.DISPLAY_WIDTH - 20,
+                                                                               int(self.DISPLAY_HEIGHT / 2)])
+                else:
+                    self.finish_point3 = self.generate_finish_point([20, int(self.DISPLAY_HEIGHT / 2)],
+                                                                    [self.DISPLAY_WIDTH - 20, self.DISPLAY_HEIGHT - 20])
+            if self.path_finding_algorythm == "dstar":
+                self.trajectory = self.generate_trajectory_dstar()
+            elif self.path_finding_algorythm == "astar":
+                self.trajectory = self.generate_trajectory_astar(max_iter=None)
+            self.trajectory_generated = True
+
+    def _scenario_parameters(self):
+        """Parameters of the environment that affect the generation of the scenario"""
+        return (self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT, self.min_distance, self.max_distance,
+                self.leader_config["width"], self.leader_config["height"],
+                self.follower_config["width"], self.follower_config["height"],
+                self.add_obstacles, self.obstacle_number, self.bridge_size, self.step_grid, self.leader_margin,
+                self.leader_pos_epsilon, self.multiple_end_points, self.path_finding_algorythm,
+                self.path_finding_iterations)
+
+    def _scenario_state(self):
+        """Generated scenario and the state of the random generators after its generation"""
+        return {"leader_start_position": self.leader.start_position.tolist(),
+                "follower_start_distance": self.follower_start_distance,
+                "obstacles_positions": [obstacle.start_position.tolist() for obstacle in self.obstacles]
+                if self.add_obstacles else [],
+                "finish_points": [self.finish_point, self.finish_point2, self.finish_point3]
+                if self.multiple_end_points else [self.finish_point],
+                "trajectory": list(self.trajectory),
+                "found_target_point": self.found_target_point,
+                "random_state": random.getstate(),
+                "np_random_state": np.random.get_state()}
+
+    def _apply_scenario(self, scenario):
+        """Creates the robots, the obstacles and the leader route from a ready scenario without random generation"""
+        self._create_robots(scenario["leader_start_position"], scenario["follower_start_distance"])
+        if self.add_obstacles:
+            self._create_obstacles(scenario["obstacles_positions"])
+        self.obstacles_index = ObstaclesIndex(self.game_object_list, moving_objects=(self.leader, self.follower))
+
+        self.finish_point = tuple(scenario["finish_points"][0])
+        if self.multiple_end_points:
+            self.finish_point2 = tuple(scenario["finish_points"][1])
+            self.finish_point3 = tuple(scenario["finish_points"][2])
+        self.trajectory = list(scenario["trajectory"])
+        self.found_target_point = bool(scenario["found_target_point"])
+        self.trajectory_generated = True
+
+    def _create_robots(self, leader_start_position=None, follower_start_distance=None):
         # TODO: сторонние конфигурации для создания роботов
         #  TODO : исправить (уйти от привязки к переменной self.max_distance)
-        leader_start_position = (
-            random.randrange(self.DISPLAY_WIDTH / 2 + self.max_distance, self.DISPLAY_WIDTH - self.max_distance, 10),
-            random.randrange(self.max_distance, self.DISPLAY_HEIGHT - self.max_distance, 10))
+        if leader_start_position is None:
+            leader_start_position = (
+                random.randrange(self.DISPLAY_WIDTH / 2 + self.max_distance, self.DISPLAY_WIDTH - self.max_distance, 10),
+                random.randrange(self.max_distance, self.DISPLAY_HEIGHT - self.max_distance, 10))
+        else:
+            leader_start_position = tuple(leader_start_position)
 
         leader_start_direction = angle_to_point(leader_start_position,
                                                 np.array((self.DISPLAY_WIDTH / 2, self.DISPLAY_HEIGHT / 2),
@@ -566,8 +708,11 @@ class Game(gym.Env):
                                     start_direction=leader_start_direction)
 
         # !!! вся эта процедура повторяется после создания в резете при вызове _pos_follower_behind_leader
-        follower_start_distance_from_leader = random.randrange(int(self.min_distance * 1.1),
-                                                               int(self.max_distance * 0.9), 1)
+        if follower_start_distance is None:
+            follower_start_distance = random.randrange(int(self.min_distance * 1.1), int(self.max_distance * 0.9), 1)
+        # сохраняется для кэша сценариев
+        self.follower_start_distance = follower_start_distance
+        follower_start_distance_from_leader = follower_start_distance
         follower_start_position_theta = radians(angle_correction(leader_start_direction + 180))
         follower_start_position = np.array((follower_start_distance_from_leader * cos(follower_start_position_theta),
                                             follower_start_distance_from_leader * sin(
@@ -610,7 +755,13 @@ class Game(gym.Env):
         self.follower.direction = follower_direction
         self.follower.start_direction = follower_direction
 
-    def _create_obstacles(self):
+    def _create_obstacles(self, obstacles_positions=None):
+        """
+        Creates the bridge walls and the rocks
+
+        :param obstacles_positions (list):
+            positions of the rocks; None -- generated randomly
+        """
 
         #####################################
         # TODO: отсутствие абсолютных чисел!
@@ -646,26 +797,11 @@ class Game(gym.Env):
                                        self.obstacles1.rectangle.bottom - self.leader.height * self.leader_margin,
                                        self.obstacles1.rectangle.width + 8 * self.leader.width,
                                        self.obstacles2.rectangle.top - self.obstacles1.rectangle.bottom + 3 * self.leader.height)
-        for i in range(self.obstacle_number):
-
-            is_free = False
-
-            while not is_free:
-                generated_position = (random.randrange(130, self.DISPLAY_WIDTH - 120, self.step_grid),
-                                      random.randrange(20, self.DISPLAY_HEIGHT - 20, self.step_grid))
-
-                if self.leader.rectangle.collidepoint(generated_position) or \
-                        self.follower.rectangle.collidepoint(generated_position) or \
-                        ((generated_position[0] >= wall_start_x) and (generated_position[0] <= wall_end_x)) or \
-                        bridge_rectangle.collidepoint(generated_position) or \
-                        (distance.euclidean(self.leader.position, generated_position) <= (
-                                self.max_distance) + obstacle_size / 2):
-                    # чтобы вокруг лидера на минимальном расстоянии не было препятствий (чтобы спокойно генерировать
-                    # ведомого за ним)
-                    is_free = False
-                else:
-                    is_free = True
-
+        if obstacles_positions is None:
+            obstacles_positions = [self._generate_obstacle_position(wall_start_x, wall_end_x, bridge_rectangle,
+                                                                    obstacle_size)
+                                   for i in range(self.obstacle_number)]
+        for generated_position in obstacles_positions:
             self.obstacles.append(GameObject('rock',
                                              image=self.rock_img,
                                              start_position=generated_position,
@@ -676,6 +812,28 @@ class Game(gym.Env):
         self.game_object_list.append(self.obstacles2)
         self.game_object_list.extend(self.obstacles)
 
+    def _generate_obstacle_position(self, wall_start_x, wall_end_x, bridge_rectangle, obstacle_size):
+        """Random position of a rock away from the robots and the bridge"""
+        is_free = False
+
+        while not is_free:
+            generated_position = (random.randrange(130, self.DISPLAY_WIDTH - 120, self.step_grid),
+                                  random.randrange(20, self.DISPLAY_HEIGHT - 20, self.step_grid))
+
+            if self.leader.rectangle.collidepoint(generated_position) or \
+                    self.follower.rectangle.collidepoint(generated_position) or \
+                    ((generated_position[0] >= wall_start_x) and (generated_position[0] <= wall_end_x)) or \
+                    bridge_rectangle.collidepoint(generated_position) or \
+                    (distance.euclidean(self.leader.position, generated_position) <= (
+                            self.max_distance) + obstacle_size / 2):
+                # чтобы вокруг лидера на минимальном расстоянии не было препятствий (чтобы спокойно генерировать
+                # ведомого за ним)
+                is_free = False
+            else:
+                is_free = True
+
+        return generated_position
+
     def _init_reward_flags(self):
         self.stop_signal = False
         self.is_in_box = False
@@ -906,6 +1064,15 @@ class Game(gym.Env):
         return cur_point
 
     def step(self, action):
+        action = self._apply_action(action)
+
+        # кадры не строят наблюдение, оно строится один раз в конце шага
+        for cur_ministep_nb in range(self.frames_per_step):
+            reward, done, info = self._frame()
+        return self._finish_step(reward, done, info)
+
+    def _apply_action(self, action):
+        """Passes the agent action to the follower as desired speeds, returns the processed action"""
         # Если контролирует автомат, то нужно преобразовать угловую скорость с учётом её знака.
         if self.constant_follower_speed:
             self.follower.command_forward(self.follower.max_speed + self.PIXELS_TO_METER)
@@ -931,9 +1098,10 @@ class Game(gym.Env):
                 self.follower.command_turn(action[1], 1)
             else:
                 self.follower.command_turn(0, 0)
+        return action
 
-        for cur_ministep_nb in range(self.frames_per_step):
-            obs, reward, done, info = self.frame_step(action)
+    def _finish_step(self, reward, done, info):
+        """Completes the agent step after all its frames: sensors, observation and episode logging"""
         self.follower_scan_dict = self.follower.use_sensors(self)
         obs = self._get_obs()
         if self.random_frames_per_step is not None:
@@ -946,6 +1114,33 @@ class Game(gym.Env):
 
     def frame_step(self, action):
         """Standard gym handler for one step of the environment (in this case, one frame)"""
+        reward, done, info = self._frame()
+        return self._get_obs(), reward, done, info
+
+    def _frame(self):
+        """One frame of the simulation without building the observation, returns reward, done and info"""
+        info = self._begin_frame()
+
+        self.follower.move()
+        self._process_follower_move(info)
+
+        if self.add_bear:
+            for cur_bear, cur_bear_point in zip(self.game_dynamic_list, self._bears_target_points()):
+                cur_bear.move_to_the_point(cur_bear_point)
+
+        leader_speed = self._leader_frame_speed(info)
+        if leader_speed is not None:
+            self.leader.move_to_the_point(self.cur_target_point, speed=leader_speed)
+        else:
+            self.leader.command_forward(0)
+            self.leader.command_turn(0, 0)
+
+        return self._end_frame(info)
+
+    # Кадр разбит на этапы между движениями роботов, чтобы их можно было выполнять для пакета сред (BatchedGame)
+    def _begin_frame(self):
+        """Starts a new frame: updates the frame counter and returns a fresh info dict"""
+        self.frame_count += 1
         self.is_in_box = False
         self.is_on_trace = False
         info = {
@@ -953,9 +1148,10 @@ class Game(gym.Env):
             "agent_status": "moving",
             "leader_status": "moving"
         }
+        return info
 
-        self.follower.move()
-
+    def _process_follower_move(self, info):
+        """Processing of the frame after the follower has moved: collisions, green zone and leader waypoints"""
         # определение столкновения ведомого с препятствиями
         if not self.ignore_follower_collisions and self._collision_check(self.follower):
             self.crash = True
@@ -965,7 +1161,6 @@ class Game(gym.Env):
 
         # Определение коробки и агента в ней
         # определение текущих точек маршрута, которые являются подходящими для Агента
-        self.green_zone_trajectory_points = list()
         self._trajectory_in_box()
         # self._get_green_zone_border_points()
 
@@ -973,8 +1168,6 @@ class Game(gym.Env):
         self._check_agent_position()
 
         # работа с движением лидера
-        prev_leader_position = self.leader.position.copy()
-
         if distance.euclidean(self.leader.position, self.cur_target_point) < self.leader_pos_epsilon:
             self.cur_target_id += 1
             if self.cur_target_id >= len(self.trajectory):
@@ -982,17 +1175,15 @@ class Game(gym.Env):
             else:
                 self.cur_target_point = self.trajectory[self.cur_target_id]
 
+    def _bears_target_points(self):
+        """Updates and returns the current target points of dynamic obstacles"""
         # TODO : Добавить движение динамичкеского препятствия тут
-
-        if self.add_bear:
-
-            for cur_dyn_obj_index in range(0, len(self.game_dynamic_list)):
-                if self.move_bear_v4 and cur_dyn_obj_index % 2:
-                    self.cur_points_for_bear[cur_dyn_obj_index] = self._move_bear_v4(cur_dyn_obj_index)
-                else:
-                    self.cur_points_for_bear[cur_dyn_obj_index] = self._choose_points_for_bear_stat(cur_dyn_obj_index)
-                    # self.cur_points_for_bear[cur_dyn_obj_index] = self._choose_point_around_lid(cur_dyn_obj_index)
-                self.game_dynamic_list[cur_dyn_obj_index].move_to_the_point(self.cur_points_for_bear[cur_dyn_obj_index])
+        for cur_dyn_obj_index in range(0, len(self.game_dynamic_list)):
+            if self.move_bear_v4 and cur_dyn_obj_index % 2:
+                self.cur_points_for_bear[cur_dyn_obj_index] = self._move_bear_v4(cur_dyn_obj_index)
+            else:
+                self.cur_points_for_bear[cur_dyn_obj_index] = self._choose_points_for_bear_stat(cur_dyn_obj_index)
+                # self.cur_points_for_bear[cur_dyn_obj_index] = self._choose_point_around_lid(cur_dyn_obj_index)
 
         # TODO : старые алгоритмы движения динамического препятствия
         # if self.add_bear:
@@ -1044,26 +1235,28 @@ class Game(gym.Env):
 
 
         # TODO : Добавить движение динамичкеского препятствия тут №№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№№3
+        return self.cur_points_for_bear
 
-        if not self.leader_finished:
-            if self.leader_speed_regime is not None:
-                speed = self._process_leader_speed_regime()
-            else:
-                speed = self.leader.max_speed
-
-            if self.leader_acceleration_regime is not None:
-                acceleration = self._process_leader_acceleration_regime() / self.frames_per_step
-            else:
-                acceleration = 0
-            self.leader.move_to_the_point(self.cur_target_point, speed=speed + acceleration)
-
+    def _leader_frame_speed(self, info):
+        """Returns the leader speed for the current frame or None if the leader has finished the route"""
+        if self.leader_finished:
+            info["leader_status"] = "finished"
+            return None
 
+        if self.leader_speed_regime is not None:
+            speed = self._process_leader_speed_regime()
+        else:
+            speed = self.leader.max_speed
 
+        if self.leader_acceleration_regime is not None:
+            acceleration = self._process_leader_acceleration_regime() / self.frames_per_step
         else:
-            self.leader.command_forward(0)
-            self.leader.command_turn(0, 0)
-            info["leader_status"] = "finished"
+            acceleration = 0
+        return speed + acceleration
 
+    def _end_frame(self, info):
+        """Completes the frame after all robots have moved: leader collisions, episode end and reward.
+        Returns reward, done and info of the frame"""
         # обработка столкновений лидера
         if self._collision_check(self.leader):
             print("Лидер столкнулся с препятствием!")
@@ -1071,8 +1264,8 @@ class Game(gym.Env):
             info["mission_status"] = "fail"
             info["leader_status"] = "crash"
 
-        if pygame.time.get_ticks() % self.trajectory_saving_period == 0:
-            self.leader_factual_trajectory.append(self.leader.position.copy())
+        if self.frame_count % self.trajectory_saving_period == 0:
+            self._save_leader_trajectory_points([self.leader.position.copy()])
 
         if self.leader_finished and self.is_in_box:
             if self.finish_position_framestimer is None:
@@ -1114,16 +1307,15 @@ class Game(gym.Env):
 
         self.overall_reward += res_reward
 
-        self.ms_since_last_tick = self.clock.tick(self.framerate)
+        if not self.headless:
+            self.ms_since_last_tick = self.clock.tick(self.framerate)
 
         if self.simulation_time_limit is not None:
-            if pygame.time.get_ticks() * 1000 > self.simulation_time_limit:
+            if self._to_seconds(self.frame_count) > self.simulation_time_limit:
                 # TODO : вернуть
                 self.done = True
                 print("Время истекло! Прошло {} секунд.".format(self.simulation_time_limit))
 
-        obs = self._get_obs()
-
         self.step_count += 1
 
         if self.step_count > self.max_steps:
@@ -1138,7 +1330,7 @@ class Game(gym.Env):
         else:
             reward_to_return = res_reward
 
-        return obs, reward_to_return, self.done, info
+        return reward_to_return, self.done, info
 
     def _process_leader_speed_regime(self):
         """The function processes the leader's movement speed dictionary."""
@@ -1175,7 +1367,8 @@ class Game(gym.Env):
 
     def _collision_check(self, target_object):
         """Considers whether the object is involved in collisions"""
-        objects_to_collide = [cur_obj.rectangle for cur_obj in self.game_object_list if cur_obj is not target_object]
+        objects_to_collide = [cur_obj.rectangle for cur_obj in self.obstacles_index.query_rect(target_object.rectangle)
+                              if cur_obj is not target_object]
         dyn_objects_to_collide = [cur_obj.rectangle for cur_obj in self.game_dynamic_list if cur_obj is not target_object]
         if target_object.name == 'leader':
             if (target_object.rectangle.collidelist(objects_to_collide) != -1) or \
@@ -1195,9 +1388,14 @@ class Game(gym.Env):
 
     def render(self, custom_message=None, **kwargs):
         """Standard for gym method of displaying a window and processing events in it (for example, keystrokes)"""
+        if self.headless and self.gameDisplay is None:
+            # окна нет, рисуем на поверхности в памяти
+            self.font = get_font('Arial', 30)
+            self.gameDisplay = pygame.Surface((self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT))
 
         self._show_tick()
-        pygame.display.update()
+        if not self.headless:
+            pygame.display.update()
         if self.return_render_matrix:
             return np.transpose(pygame.surfarray.array3d(self.gameDisplay), axes=(1, 0, 2))
 
@@ -1207,7 +1405,7 @@ class Game(gym.Env):
                  """
         cur_rect = object_to_rotate.rectangle
         # Rotate the original image without modifying it.
-        new_image = pygame.transform.rotate(object_to_rotate.image, -object_to_rotate.direction)
+        new_image = rotated_image(object_to_rotate.image, -object_to_rotate.direction, self.sprite_angle_step)
         # Get a new rect with the center of the old rect.
         # Изменение хитбокса убрал в самих роботов
         # object_to_rotate.rectangle = new_image.get_rect(center=cur_rect.center)
@@ -1359,16 +1557,29 @@ class Game(gym.Env):
 
         return trajectory
 
+    def _occupancy_grid(self, step_grid=None):
+        """
+        Occupancy grid of the static obstacles (the bridge walls and the rocks) inflated by leader_margin,
+        shared by the path planners
+
+        :param step_grid (int):
+            size of a cell in pixels; None -- self.step_grid
+        :return: np.ndarray of bool (DISPLAY_WIDTH // step_grid, DISPLAY_HEIGHT // step_grid)
+        """
+        step_grid = step_grid or self.step_grid
+        obstacles = self.obstacles + [self.obstacles1, self.obstacles2] if self.add_obstacles else []
+        margin = self.leader_margin * max(self.leader.width, self.leader.height)
+        return occupancy_grid([(*obstacle.start_position, obstacle.width, obstacle.height) for obstacle in obstacles],
+                              (self.DISPLAY_WIDTH // step_grid, self.DISPLAY_HEIGHT // step_grid),
+                              step_grid,
+                              margin)
+
     # Алгоритм поиска RRT
     def generate_trajectory_rrt(self):
 
-        obstacle_list = []  # [x,y,size(radius)]
+        # сетка препятствий в координатах планировщика (клетки step_grid)
+        obstacle_list = self._occupancy_grid()
 
-        for i in range(self.obstacle_number):
-            obst = (self.obstacles[i].start_position[0] / self.step_grid,
-                    self.obstacles[i].start_position[1] / self.step_grid,
-                    (100 / self.step_grid) / 2)
-            obstacle_list.append(obst)
         t_rrt = time.time()
 
         # Set Initial parameters
@@ -1396,45 +1607,22 @@ class Game(gym.Env):
 
         path = rrt.planning(animation=False)
         # trajectory = rrt_star.planning(animation=False)
+        if DEBUG:
+            self.debug_info["path_finding_time"] = time.time() - t_rrt
 
-        trajectory = []
-        trajectory = path[::-1]
-        trajectory.pop(0)
-
-        time_rrt = time.time() - t_rrt
-        len_rrt = len(trajectory)
-        path_tab_rrt = '~/Desktop/lentRRT.xlsx'
-        rrt_table = pd.read_excel(path_tab_rrt, index_col=False)
-        new_data = {'Time': time_rrt, 'Len': len_rrt}
-        new_dstar_table = rrt_table.append(new_data, ignore_index=True)
-        new_dstar_table.to_excel(path_tab_rrt, index=False)
-
-        return trajectory
+        return self._planner_trajectory(path)
 
     # Алгоритм поиска RRTstar
     def generate_trajectory_rrtstar(self):
 
-        obstacle_list = []  # [x,y,size(radius)]
-
-        for i in range(self.obstacle_number):
-            obst = (self.obstacles[i].start_position[0] / self.step_grid,
-                    self.obstacles[i].start_position[1] / self.step_grid,
-                    (80 / self.step_grid) / 2)
-            obstacle_list.append(obst)
-
-        for k in range(20, 460, 40):
-            most1 = (750 / self.step_grid, k / self.step_grid, 20 / self.step_grid)
-            obstacle_list.append(most1)
-
-        for k in range(560, 1000, 40):
-            most2 = (750 / self.step_grid, k / self.step_grid, 20 / self.step_grid)
-            obstacle_list.append(most2)
+        # сетка препятствий в координатах планировщика (клетки step_grid)
+        obstacle_list = self._occupancy_grid()
 
         t_rrtstar = time.time()
         # Set Initial parameters
         rrt_star = RRTStar(
             start=self.leader.start_position / self.step_grid,
-            goal=self.finish_point / self.step_grid,
+            goal=np.divide(self.finish_point, self.step_grid),
             # (50,50),#((self.leader.start_position[0]+200)/self.step_grid,
             # (self.leader.start_position[1]-200)/self.step_grid),
             rand_area=[0, 150],
@@ -1442,50 +1630,35 @@ class Game(gym.Env):
             expand_dis=20, goal_sample_rate=20, path_resolution=1, connect_circle_dist=50)
 
         path = rrt_star.planning(animation=False)
+        if DEBUG:
+            self.debug_info["path_finding_time"] = time.time() - t_rrtstar
 
-        trajectory = []
-        trajectory = path[::-1]
-        trajectory.pop(0)
-
-        time_rrtstar = time.time() - t_rrtstar
-        len_rrtstar = len(trajectory)
-        path_tab_rrtstar = '~/Desktop/lentRRTstar.xlsx'
-        rrtstar_table = pd.read_excel(path_tab_rrtstar, index_col=False)
-        new_data = {'Time': time_rrtstar, 'Len': len_rrtstar}
-        new_dstar_table = rrtstar_table.append(new_data, ignore_index=True)
-        new_dstar_table.to_excel(path_tab_rrtstar, index=False)
-
-        return trajectory
+        return self._planner_trajectory(path)
 
     # Алгоритм поиска LQR RRTstar
     def generate_trajectory_lqr_rrtstar(self):
 
-        obstacle_list = []  # [x,y,size(radius)]
+        # сетка препятствий в координатах планировщика (клетки step_grid)
+        obstacle_list = self._occupancy_grid()
 
-        for i in range(self.obstacle_number):
-            obst = (self.obstacles[i].start_position[0] / self.step_grid,
-                    self.obstacles[i].start_position[1] / self.step_grid,
-                    (80 / self.step_grid) / 2)
-            obstacle_list.append(obst)
-
-        for k in range(20, 460, 40):
-            most1 = (750 / self.step_grid, k / self.step_grid, 20 / self.step_grid)
-            obstacle_list.append(most1)
-
-        for k in range(560, 1000, 40):
-            most2 = (750 / self.step_grid, k / self.step_grid, 20 / self.step_grid)
-            obstacle_list.append(most2)
-
-        lqr_rrt_star = LQRRRTStar(self.leader.start_position / self.step_grid, (90, 90),
-                                  # self.finish_point/self.step_grid,
+        t_lqr_rrtstar = time.time()
+        lqr_rrt_star = LQRRRTStar(self.leader.start_position / self.step_grid,
+                                  np.divide(self.finish_point, self.step_grid),
                                   obstacle_list,
                                   [0, 100.0])
         path = lqr_rrt_star.planning(animation=False)
+        if DEBUG:
+            self.debug_info["path_finding_time"] = time.time() - t_lqr_rrtstar
 
-        trajectory = []
+        return self._planner_trajectory(path)
+
+    def _planner_trajectory(self, path):
+        """Route of the RRT planners from the start to the goal without the start point, sets found_target_point"""
+        self.found_target_point = path is not None
+        if path is None:
+            return []
         trajectory = path[::-1]
         trajectory.pop(0)
-
         return trajectory
 
     # Алгоритм поиска Dstar (еще не настроен)
@@ -1493,54 +1666,18 @@ class Game(gym.Env):
     def generate_trajectory_dstar(self):
 
         m = Map(self.DISPLAY_WIDTH // self.step_grid, self.DISPLAY_HEIGHT // self.step_grid)
-        #m = Map(150, 100)
-
-        ox, oy = [], []
-        margin = int(self.leader_margin * max(self.leader.width, self.leader.height) // self.step_grid)
-
-        for obst in self.obstacles + [self.obstacles1, self.obstacles2]:
-            position_on_map = (int(obst.start_position[0] // self.step_grid), int(obst.start_position[1] // self.step_grid))
-            halfheight = int((obst.height / 2) // self.step_grid) + margin
-            halfwidth = int((obst.width / 2) // self.step_grid) + margin
-            for i in range(position_on_map[0] - halfwidth, position_on_map[0] + halfwidth):
-                for j in range(position_on_map[1] - halfheight, position_on_map[1] + halfheight):
-                    ox.append(i)
-                    oy.append(j)
-        """
-        for ob in range(self.obstacle_number):
-            for i in range(-50, 50, 10):
-                for j in range(-50, 50, 10):
-                    ox.append(int((self.obstacles[ob].start_position[0] + i) / self.step_grid))
-                    oy.append(int((self.obstacles[ob].start_position[1] + j) / self.step_grid))
-
-        for k in range(0, 490, 10):
-            for i in range(-40, 40, 10):
-                # for j in range(-30,30,10):
-                ox.append(int((750 + i) / self.step_grid))
-                oy.append(int((k) / self.step_grid))
-
-        for k in range(520, 1000, 10):
-            for i in range(-40, 40, 10):
-                # for j in range(-30,30,10):
-                ox.append(int((750 + i) / self.step_grid))
-                oy.append(int((k) / self.step_grid))
-        """
-        m.set_obstacle([(i, j) for i, j in zip(ox, oy)])
-
-        m2 = deepcopy(m)
-        m3 = deepcopy(m)
+        m.obstacle = self._occupancy_grid()
 
         ########### работа dstar 1
         start = [int(self.leader.start_position[0] / self.step_grid),
                  int(self.leader.start_position[1] / self.step_grid)]
         goal = [int(self.finish_point[0] / self.step_grid),
                 int(self.finish_point[1] / self.step_grid)]
-        start = m.map[start[0]][start[1]]
-        end = m.map[goal[0]][goal[1]]
+        # состояние поиска хранится в Dstar, карта не меняется, поэтому одна карта используется для всех участков
         dstar = Dstar(m, self.path_finding_iterations)
         if DEBUG:
             t_1 = time.time()
-        rx, ry, self.found_target_point = dstar.run(start, end)
+        rx, ry, self.found_target_point = dstar.run(tuple(start), tuple(goal))
         if DEBUG:
             t_2 = time.time()
             self.debug_info["path_finding_time"] = t_2 - t_1
@@ -1560,10 +1697,8 @@ class Game(gym.Env):
             goal2 = [int(self.finish_point2[0] / self.step_grid),
                      int(self.finish_point2[1] / self.step_grid)]
 
-            start2 = m2.map[start2[0]][start2[1]]
-            end2 = m2.map[goal2[0]][goal2[1]]
-            dstar2 = Dstar(m2)
-            rx2, ry2, found_target_point_2 = dstar2.run(start2, end2)
+            dstar2 = Dstar(m)
+            rx2, ry2, found_target_point_2 = dstar2.run(tuple(start2), tuple(goal2))
             trajectory2 = []
             # trajectory = path[::-1]
             for i in range(len(rx2)):
@@ -1577,10 +1712,8 @@ class Game(gym.Env):
             goal3 = [int(self.finish_point3[0] / self.step_grid),
                      int(self.finish_point3[1] / self.step_grid)]
 
-            start3 = m3.map[start3[0]][start3[1]]
-            end3 = m3.map[goal3[0]][goal3[1]]
-            dstar3 = Dstar(m3)
-            rx3, ry3, found_target_point_3 = dstar3.run(start3, end3)
+            dstar3 = Dstar(m)
+            rx3, ry3, found_target_point_3 = dstar3.run(tuple(start3), tuple(goal3))
             trajectory3 = []
             # trajectory = path[::-1]
             for i in range(len(rx3)):
@@ -1622,7 +1755,7 @@ class Game(gym.Env):
             generated_finish_point = (random.randrange(left_top_border[0], right_bottom_border[0], 10),
                                       random.randrange(left_top_border[1], right_bottom_border[1], 10))
 
-            for cur_object in self.game_object_list:
+            for cur_object in self.obstacles_index.query_radius(generated_finish_point, self.leader_pos_epsilon):
                 if (cur_object.rectangle.collidepoint(generated_finish_point)) or \
                         (distance_to_rect(generated_finish_point, cur_object) < self.leader_pos_epsilon):
                     correct_point_position = False
@@ -1631,10 +1764,17 @@ class Game(gym.Env):
 
     def generate_trajectory_astar(self,
                                   max_iter=None):
-        """Randomly generates points on the map that the leader must go through, builds a route using the A-star method"""
+        """
+        Randomly generates points on the map that the leader must go through, builds a route using the A-star method,
+        sets found_target_point
+        """
 
-        # шаг сетки для вычислений. Если менять коэф, то надо изменить и в atar file в def return_path
-        step_grid = 20
+        # шаг сетки для вычислений, тот же, что и у D*
+        step_grid = self.step_grid
+
+        def reached(path, cell):
+            # при ограничении итераций A* возвращает путь до последней раскрытой клетки
+            return path is not None and len(path) > 0 and path[-1] == (cell[0] * step_grid, cell[1] * step_grid)
 
         start = (int(self.leader.start_position[0] / step_grid),
                  int(self.leader.start_position[1] / step_grid))
@@ -1642,35 +1782,18 @@ class Game(gym.Env):
         end = (int(self.finish_point[0] / step_grid),
                int(self.finish_point[1] / step_grid))
 
-        astar_grid_width = int(self.DISPLAY_WIDTH / step_grid)
-        astar_grid_height = int(self.DISPLAY_HEIGHT / step_grid)
+        grid = self._occupancy_grid(step_grid)
 
-        grid = np.zeros([astar_grid_width, astar_grid_height], dtype=int)
+        leader_size_factor = self.leader_margin * max(self.leader.width, self.leader.height)
 
-        leader_size_factor = int((max(self.leader.width, self.leader.height) * 2))
-
-        for cur_obstacle in self.game_object_list:
-            if cur_obstacle in {self.leader, self.follower}:
-                continue
-            else:
-                start_x = max(int((cur_obstacle.rectangle.left - leader_size_factor) / step_grid), 0)
-                end_x = min(int((cur_obstacle.rectangle.right + leader_size_factor) / step_grid), astar_grid_width - 1)
-
-                start_y = max(int((cur_obstacle.rectangle.top - leader_size_factor) / step_grid), 0)
-                end_y = min(int((cur_obstacle.rectangle.bottom + leader_size_factor) / step_grid),
-                            astar_grid_height - 1)
-
-                for x_coord in range(start_x, end_x):
-                    for y_coord in range(start_y, end_y):
-                        grid[x_coord, y_coord] = 1
         if self.add_obstacles:
             bridge_point = np.divide(self.bridge_point, step_grid).astype(int)
             bridge_point = (bridge_point[0], bridge_point[1])
-            grid[bridge_point] = 0
+            grid[bridge_point] = False
 
-            for i in range(int((self.obstacles1.rectangle.left / step_grid) - (leader_size_factor / step_grid)),
-                           int((self.obstacles1.rectangle.right / step_grid) + (leader_size_factor / step_grid))):
-                grid[i, bridge_point[1]] = 0
+            grid[int((self.obstacles1.rectangle.left / step_grid) - (leader_size_factor / step_grid)):
+                 int((self.obstacles1.rectangle.right / step_grid) + (leader_size_factor / step_grid)),
+                 bridge_point[1]] = False
 
             first_bridge_point = (
                 int((self.obstacles1.rectangle.right + self.leader_pos_epsilon) / step_grid), bridge_point[1])
@@ -1686,11 +1809,14 @@ class Game(gym.Env):
                          start=start,
                          end=first_bridge_point,
                          max_iterations=max_iter,
-                         return_none_on_max_iter=False)
+                         return_none_on_max_iter=False,
+                         step_grid=step_grid)
 
             if path is None:
+                self.found_target_point = False
                 return []
 
+            first_part_found = reached(path, first_bridge_point)
             if path[-1] != first_bridge_point:
                 path.append(self.first_bridge_point)
 
@@ -1698,7 +1824,9 @@ class Game(gym.Env):
                                    start=second_bridge_point,
                                    end=end,
                                    max_iterations=max_iter,
-                                   return_none_on_max_iter=False)
+                                   return_none_on_max_iter=False,
+                                   step_grid=step_grid)
+            self.found_target_point = first_part_found and reached(path_continued, end)
             if path_continued is None:
                 return path
             return path + path_continued
@@ -1707,7 +1835,9 @@ class Game(gym.Env):
                          start=start,
                          end=end,
                          max_iterations=max_iter,
-                         return_none_on_max_iter=False)
+                         return_none_on_max_iter=False,
+                         step_grid=step_grid)
+            self.found_target_point = reached(path, end)
             return path
 
     def generate_trajectory_old(self, n=8, min_distance=30, border=20, parent=None, position=None, iter_limit=10000):
@@ -1788,6 +1918,15 @@ class Game(gym.Env):
 
     def _get_obs(self):
         """Returns observations of the environment each step"""
+        if len(self.trajectory) > 0 and self.cur_target_point == self.trajectory[-1]:
+            leader_target_point = self.trajectory[-2]
+        else:
+            leader_target_point = self.cur_target_point
+
+        if self.structured_observation is not None:
+            self.structured_observation.fill(self.leader, self.follower, leader_target_point, self.follower_scan_dict)
+            return self.structured_observation
+
         obs_dict = dict()
 
         obs_dict["numerical_features"] = np.array([self.leader.position[0],
@@ -1800,10 +1939,7 @@ class Game(gym.Env):
                                                    self.follower.speed,
                                                    self.follower.direction,
                                                    self.follower.rotation_speed], dtype=np.float32)
-        if len(self.trajectory) > 0 and self.cur_target_point == self.trajectory[-1]:
-            obs_dict["leader_target_point"] = self.trajectory[-2]
-        else:
-            obs_dict["leader_target_point"] = self.cur_target_point
+        obs_dict["leader_target_point"] = leader_target_point
 
         obs_dict.update(self.follower_scan_dict)
 
@@ -1823,24 +1959,27 @@ class Game(gym.Env):
                                                     self.follower_config['max_speed'], 360,
                                                     self.follower_config['max_rotation_speed']), dtype=np.float32))
 
-    # TODO: Вроде можно оптимизировать. Не каждый раз всю траекторию смотреть, а только добавлять новые и
-    #  удалять вышедшие за пределы
-    def _trajectory_in_box(self):
-        """Constructs an array of Master waypoints that are included in the box in which the Follower should be located."""
-
-        self.green_zone_trajectory_points = list()
-
-        accumulated_distance = 0
-
-        for cur_point, prev_point in zip(reversed(self.leader_factual_trajectory[:-1]),
-                                         reversed(self.leader_factual_trajectory[1:])):
-
-            accumulated_distance += distance.euclidean(prev_point, cur_point)
-
-            if accumulated_distance <= self.max_distance:
-                self.green_zone_trajectory_points.append(cur_point)
+    def _save_leader_trajectory_points(self, points):
+        """Adds points to the factual trajectory of the leader, its path lengths and its index"""
+        for point in points:
+            if len(self.leader_factual_trajectory) > 0:
+                self.leader_trajectory_path_length.append(self.leader_trajectory_path_length[-1] +
+                                                          distance.euclidean(self.leader_factual_trajectory[-1], point))
             else:
-                break
+                self.leader_trajectory_path_length.append(0.)
+            self.leader_factual_trajectory.append(point)
+            self.leader_trajectory_index.add(point)
+
+    def _trajectory_in_box(self):
+        """Constructs an array of Master waypoints that are included in the box in which the Follower should be located.
+        The points go from the newest to the oldest; the window of the points is moved along the saved trajectory."""
+        last_id = len(self.leader_factual_trajectory) - 1
+        path_length = self.leader_trajectory_path_length
+        # в зелёной зоне точки, от которых путь до последней точки траектории не длиннее max_distance
+        while self.green_zone_start_id < last_id and \
+                path_length[last_id] - path_length[self.green_zone_start_id] > self.max_distance:
+            self.green_zone_start_id += 1
+        self.green_zone_trajectory_points = self.leader_trajectory_index.points[self.green_zone_start_id:last_id][::-1]
 
     def _get_green_zone_border_points(self):
 
@@ -1921,11 +2060,10 @@ class Game(gym.Env):
                 self.is_on_trace = False
 
             else:
-                closest_point_on_trajectory_id = self.closest_point(self.follower.position,
-                                                                    self.leader_factual_trajectory)
-                closest_point_on_trajectory = self.leader_factual_trajectory[int(closest_point_on_trajectory_id)]
-
-                if distance.euclidean(self.follower.position, closest_point_on_trajectory) <= self.leader_pos_epsilon:
+                # ближайшая точка траектории ищется только в клетках сетки вокруг ведомого
+                closest_point_on_trajectory_id, _ = self.leader_trajectory_index.nearest(self.follower.position,
+                                                                                         self.leader_pos_epsilon)
+                if closest_point_on_trajectory_id is not None:
                     self.is_on_trace = True
                     self.is_in_box = False
 
@@ -0,0 +1,266 @@
+import multiprocessing as mp
+import sys
+from collections.abc import Mapping
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from gym.vector import VectorEnv
+from gym.vector.utils import CloudpickleWrapper
+
+try:
+    from continuous_grid_arctic.utils.observation import detach
+except:
+    from src.continuous_grid_arctic.utils.observation import detach
+
+# SharedMemory(track=False) появился в Python 3.13
+_TRACK_PARAMETER = sys.version_info >= (3, 13)
+
+
+class SubprocVecEnv(VectorEnv):
+    def __init__(self, env_fns, context=None, copy=True):
+        """
+        Pool of environments (Game or Game with wrappers) working in separate processes.
+        Workers write observations, rewards and done flags directly into preallocated shared memory arrays,
+        only infos and observation entries that are not numeric arrays of a fixed shape are sent through pipes.
+
+        The layout of the shared arrays is taken from the observation returned by reset in the first worker.
+        The shared memory blocks belong to the main process, it unlinks them in close. Workers do not track the
+        blocks they open: on Python >= 3.13 they are opened with track=False, on older versions the worker
+        unregisters them from the resource_tracker, and the main process registers them again after all workers
+        have opened them (a worker may share the resource_tracker with the main process).
+        Finished environments are reset automatically, their last observation is returned in
+        info["terminal_observation"].
+
+        :param env_fns (list):
+            functions creating the environments
+        :param context (str):
+            multiprocessing start method ("fork", "spawn", "forkserver"), None -- default for the platform
+        :param copy (bool):
+            if False, step and reset return views to the shared arrays, valid until the next call
+        """
+        self.copy = copy
+        self.closed = False
+        self.shared_memories = list()
+        self.parent_pipes = list()
+        self.processes = list()
+        ctx = mp.get_context(context)
+
+        for env_index, env_fn in enumerate(env_fns):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(target=_worker,
+                                  args=(env_index, CloudpickleWrapper(env_fn), child_pipe, parent_pipe),
+                                  daemon=True)
+            process.start()
+            child_pipe.close()
+            self.parent_pipes.append(parent_pipe)
+            self.processes.append(process)
+
+        self.parent_pipes[0].send(("spaces", None))
+        observation_space, action_space = self._receive(self.parent_pipes[0])
+        super(SubprocVecEnv, self).__init__(len(env_fns), observation_space, action_space)
+
+        # разметка общей памяти: ключ наблюдения (None для наблюдения-массива) -> (форма, тип)
+        self.parent_pipes[0].send(("layout", None))
+        self.observation_layout = self._receive(self.parent_pipes[0])
+
+        self.observation_buffers = dict()
+        for key, (shape, dtype) in self.observation_layout.items():
+            self.observation_buffers[key] = self._create_buffer((self.num_envs,) + shape, dtype)
+        self.rewards_buffer = self._create_buffer((self.num_envs,), np.float64)
+        self.dones_buffer = self._create_buffer((self.num_envs,), np.bool_)
+
+        buffers_description = {
+            "observations": {key: (memory.name, (self.num_envs,) + shape, dtype)
+                             for (key, (shape, dtype)), memory in zip(self.observation_layout.items(),
+                                                                     self.shared_memories)},
+            "rewards": (self.shared_memories[-2].name, (self.num_envs,), np.float64),
+            "dones": (self.shared_memories[-1].name, (self.num_envs,), np.bool_),
+        }
+        for pipe in self.parent_pipes:
+            pipe.send(("attach", buffers_description))
+        for pipe in self.parent_pipes:
+            self._receive(pipe)
+        if not _TRACK_PARAMETER:
+            # воркер с общим resource_tracker снял регистрацию блоков главного процесса, она восстанавливается,
+            # чтобы трекер удалил блоки при аварийном завершении; повторная регистрация ничего не меняет
+            for memory in self.shared_memories:
+                resource_tracker.register(memory._name, "shared_memory")
+
+    def _create_buffer(self, shape, dtype):
+        nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        memory = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.shared_memories.append(memory)
+        return np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+    @staticmethod
+    def _receive(pipe):
+        result, success = pipe.recv()
+        if not success:
+            raise RuntimeError("Error in the environment worker:\n{}".format(result))
+        return result
+
+    def seed(self, seed=None):
+        for env_index, pipe in enumerate(self.parent_pipes):
+            pipe.send(("seed", None if seed is None else seed + env_index))
+        for pipe in self.parent_pipes:
+            self._receive(pipe)
+
+    def reset_async(self, *args, **kwargs):
+        for pipe in self.parent_pipes:
+            pipe.send(("reset", None))
+
+    def reset_wait(self, *args, **kwargs):
+        extras = [self._receive(pipe) for pipe in self.parent_pipes]
+        return self._read_observations(extras)
+
+    def step_async(self, actions):
+        for pipe, action in zip(self.parent_pipes, actions):
+            pipe.send(("step", action))
+
+    def step_wait(self, *args, **kwargs):
+        results = [self._receive(pipe) for pipe in self.parent_pipes]
+        extras, infos = zip(*results)
+        rewards = self.rewards_buffer.copy() if self.copy else self.rewards_buffer
+        dones = self.dones_buffer.copy() if self.copy else self.dones_buffer
+        return self._read_observations(extras), rewards, dones, list(infos)
+
+    def _read_observations(self, extras):
+        """Collects the batch of observations from the shared arrays and the entries sent through pipes"""
+        batch = dict()
+        for key, buffer in self.observation_buffers.items():
+            if any(key in env_extras for env_extras in extras):
+                batch[key] = tuple(env_extras[key] if key in env_extras else buffer[env_index].copy()
+                                   for env_index, env_extras in enumerate(extras))
+            else:
+                batch[key] = buffer.copy() if self.copy else buffer
+        for key in extras[0]:
+            if key not in batch:
+                batch[key] = tuple(env_extras.get(key) for env_extras in extras)
+
+        if None in batch:
+            return batch[None]
+        return batch
+
+    def close_extras(self, timeout=None, terminate=False):
+        for pipe in self.parent_pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            if terminate:
+                process.terminate()
+            process.join(timeout)
+        for pipe in self.parent_pipes:
+            pipe.close()
+
+        self.observation_buffers = dict()
+        self.rewards_buffer = None
+        self.dones_buffer = None
+        for memory in self.shared_memories:
+            memory.close()
+            memory.unlink()
+        self.shared_memories = list()
+
+
+def _observation_layout(observation):
+    """Shapes and types of the observation entries that can be stored in shared memory"""
+    entries = observation.items() if isinstance(observation, Mapping) else [(None, observation)]
+    layout = dict()
+    for key, value in entries:
+        value = _as_numeric_array(value)
+        if value is not None:
+            layout[key] = (value.shape, value.dtype)
+    return layout
+
+
+def _as_numeric_array(value):
+    """Converts the value to a numeric array, returns None if it is not possible (e.g. deques of points)"""
+    if not isinstance(value, (np.ndarray, list, tuple, int, float)):
+        return None
+    try:
+        value = np.asarray(value)
+    except ValueError:
+        return None
+    if value.dtype.kind not in "biuf":
+        return None
+    return value
+
+
+def _attach_buffer(description, shared_memories):
+    """Opens the shared memory block created by the main process as an array, the block is not tracked"""
+    name, shape, dtype = description
+    if _TRACK_PARAMETER:
+        memory = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        memory = shared_memory.SharedMemory(name=name)
+        # иначе resource_tracker удалил бы блок главного процесса при завершении воркера
+        resource_tracker.unregister(memory._name, "shared_memory")
+    shared_memories.append(memory)
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _worker(env_index, env_fn, pipe, parent_pipe):
+    parent_pipe.close()
+    env = env_fn.fn()
+    observation_buffers = None
+    rewards_buffer = None
+    dones_buffer = None
+    shared_memories = list()
+
+    def write_observation(observation):
+        """Writes the observation into the shared arrays, returns the entries that do not fit them"""
+        entries = observation.items() if isinstance(observation, Mapping) else [(None, observation)]
+        extras = dict()
+        for key, value in entries:
+            if key in observation_buffers:
+                array_value = _as_numeric_array(value)
+                buffer = observation_buffers[key]
+                if array_value is not None and array_value.shape == buffer.shape[1:]:
+                    buffer[env_index] = array_value
+                    continue
+            extras[key] = value
+        return extras
+
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "step":
+                observation, reward, done, info = env.step(data)
+                if done:
+                    info["terminal_observation"] = detach(observation)
+                    observation = env.reset()
+                rewards_buffer[env_index] = reward
+                dones_buffer[env_index] = done
+                pipe.send(((write_observation(observation), info), True))
+            elif command == "reset":
+                pipe.send((write_observation(env.reset()), True))
+            elif command == "seed":
+                env.seed(data)
+                pipe.send((None, True))
+            elif command == "spaces":
+                pipe.send(((env.observation_space, env.action_space), True))
+            elif command == "layout":
+                pipe.send((_observation_layout(env.reset()), True))
+            elif command == "attach":
+                observation_buffers = {key: _attach_buffer(description, shared_memories)
+                                       for key, description in data["observations"].items()}
+                rewards_buffer = _attach_buffer(data["rewards"], shared_memories)
+                dones_buffer = _attach_buffer(data["dones"], shared_memories)
+                pipe.send((None, True))
+            elif command == "close":
+                break
+            else:
+                raise RuntimeError("Unknown command {}".format(command))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        import traceback
+        pipe.send((traceback.format_exc(), False))
+    finally:
+        observation_buffers = None
+        rewards_buffer = None
+        dones_buffer = None
+        for memory in shared_memories:
+            memory.close()
+        env.close()
@@ -21,6 +21,8 @@ class LQRPlanner:
         self.GOAL_DIST = 0.1
         self.MAX_ITER = 150
         self.EPS = 0.01
+        # матрицы системы и веса постоянны, поэтому коэффициент регулятора вычисляется один раз
+        self.gain = None
 
     def lqr_planning(self, sx, sy, gx, gy, show_animation=True):
 
@@ -61,7 +63,7 @@ class LQRPlanner:
                 plt.pause(1.0)
 
         if not found_path:
-            print("Cannot found path")
+            # Cannot found path
             return [], []
 
         return rx, ry
@@ -108,8 +110,9 @@ class LQRPlanner:
 
     def lqr_control(self, A, B, x):
 
-        Kopt, X, ev = self.dlqr(A, B, np.eye(2), np.eye(1))
+        if self.gain is None:
+            self.gain, X, ev = self.dlqr(A, B, np.eye(2), np.eye(1))
 
-        u = -Kopt @ x
+        u = -self.gain @ x
 
         return u
\ No newline at end of file
@@ -0,0 +1,65 @@
+import os
+import struct
+
+import pygame
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imgs")
+
+# реестр общий для всех сред процесса: изображения загружаются и масштабируются один раз
+# (имя, размер или None) -> изображение
+_IMAGES = dict()
+# имя -> размер исходного изображения
+_IMAGE_SIZES = dict()
+# (имя шрифта, размер) -> шрифт
+_FONTS = dict()
+
+
+def image_size(name):
+    """
+    Size of the original image from imgs/, read from the PNG header without decoding the image
+
+    :param name (str):
+        file name in imgs/
+    :return: width and height of the image
+    """
+    if name not in _IMAGE_SIZES:
+        with open(os.path.join(IMAGES_DIR, name), "rb") as image_file:
+            header = image_file.read(24)
+        # сигнатура PNG (8 байт), длина и тип блока IHDR (8 байт), затем ширина и высота
+        _IMAGE_SIZES[name] = struct.unpack(">II", header[16:24])
+    return _IMAGE_SIZES[name]
+
+
+def load_image(name, size=None):
+    """
+    Image from imgs/, loaded and scaled once per process. The returned surface is shared, it must not be changed
+
+    :param name (str):
+        file name in imgs/
+    :param size (tuple(int, int)):
+        size of the scaled image; None -- original size
+    """
+    key = (name, None if size is None else (int(size[0]), int(size[1])))
+    if key not in _IMAGES:
+        if size is None:
+            _IMAGES[key] = pygame.image.load(os.path.join(IMAGES_DIR, name))
+        else:
+            _IMAGES[key] = pygame.transform.scale(load_image(name), key[1])
+    return _IMAGES[key]
+
+
+def get_font(name="Arial", size=30):
+    """
+    System font created once per process (after pygame.quit the fonts are created again)
+
+    :param name (str):
+        font name for pygame.font.SysFont
+    :param size (int):
+        font size
+    """
+    if not pygame.font.get_init():
+        pygame.font.init()
+        _FONTS.clear()
+    if (name, size) not in _FONTS:
+        _FONTS[(name, size)] = pygame.font.SysFont(name, size)
+    return _FONTS[(name, size)]
@@ -1,167 +1,118 @@
 from warnings import warn
 import heapq
-from scipy.spatial import distance
+from math import sqrt, inf
 
+import numpy as np
 
-class Node:
-    """
-    A node class for A* Pathfinding
-    """
-
-    def __init__(self, parent=None, position=None):
-        self.parent = parent
-        self.position = position
-
-        self.g = 0
-        self.h = 0
-        self.f = 0
-
-    def __eq__(self, other):
-        return self.position == other.position
-
-    def __repr__(self):
-        return f"{self.position} - g: {self.g} h: {self.h} f: {self.f}"
-
-    # defining less than for purposes of heap queue
-    def __lt__(self, other):
-        return self.f < other.f
+# смещения соседей и длины шагов к ним
+STRAIGHT_SQUARES = ((0, -1), (0, 1), (-1, 0), (1, 0),)
+DIAGONAL_SQUARES = ((-1, -1), (-1, 1), (1, -1), (1, 1),)
+DIAGONAL_COST = sqrt(2)
 
-    # defining greater than for purposes of heap queue
-    def __gt__(self, other):
-        return self.f > other.f
 
+def octile_distance(position, end):
+    """Length of the shortest path on an 8-connected grid without obstacles, consistent heuristic for A*"""
+    dx = abs(position[0] - end[0])
+    dy = abs(position[1] - end[1])
+    return max(dx, dy) + (DIAGONAL_COST - 1) * min(dx, dy)
 
-# def return_path(current_node):
-#     path = []
-#     current = current_node
-#     while current is not None:
-#         path.append(current.position)
-#         current = current.parent
-#     return path[::-1]  # Return reversed path
 
-def return_path(current_node):
+def return_path(parents, cell, height, step_grid=20):
+    """Path from the start to the cell in pixels, cells are restored by the parents array (flat indices)"""
     path = []
-    current = current_node
-    step_grid = 20
-    while current is not None:
-        #print(current.position[0])
-        path.append((current.position[0]*step_grid,current.position[1]*step_grid))
-        current = current.parent
+    while cell != -1:
+        path.append((cell // height * step_grid, cell % height * step_grid))
+        cell = parents[cell]
     return path[::-1]  # Return reversed path
 
-def astar(maze, start, end, allow_diagonal_movement=True, max_iterations=None,return_none_on_max_iter=True):
+
+def astar(maze, start, end, allow_diagonal_movement=True, max_iterations=None, return_none_on_max_iter=True,
+          step_grid=20):
     """
-    Returns a list of tuples as a path from the given start to the given end in the given maze
-    :param maze:
-    :param start:
-    :param end:
-    :return:
+    Returns a list of tuples as a path from the given start to the given end in the given maze.
+    Straight steps cost 1, diagonal steps cost sqrt(2), the heuristic is the octile distance, so the path is the
+    shortest one. The best g and the closed flag of each cell are kept in arrays indexed by the cell.
+
+    :param maze (np.ndarray):
+        grid (width, height), non-zero cells are obstacles
+    :param start, end (tuple(int, int)):
+        start and end cells
+    :param allow_diagonal_movement (bool):
+        use 8 neighbors instead of 4
+    :param max_iterations (int):
+        maximum number of expanded cells; None -- not limited
+    :param return_none_on_max_iter (bool):
+        when the limit is reached return None, otherwise the path to the last expanded cell
+    :param step_grid (int):
+        size of a cell in pixels, the path is returned in pixels
+    :return: list of points of the path or None
     """
+    maze = np.asarray(maze)
+    width, height = maze.shape
+    blocked = (maze != 0).ravel().tolist()
 
-    # Create start and end node
-    start_node = Node(None, start)
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, end)
-    end_node.g = end_node.h = end_node.f = 0
+    adjacent_squares = [(dx, dy, 1) for dx, dy in STRAIGHT_SQUARES]
+    if allow_diagonal_movement:
+        adjacent_squares += [(dx, dy, DIAGONAL_COST) for dx, dy in DIAGONAL_SQUARES]
 
-    # Initialize both open and closed list
-    open_list = []
-    closed_list = []
+    start_cell = start[0] * height + start[1]
+    end_cell = end[0] * height + end[1]
+    best_g = [inf] * (width * height)
+    closed = bytearray(width * height)
+    parents = [-1] * (width * height)
 
-    # Heapify the open_list and Add the start node
-    heapq.heapify(open_list)
-    heapq.heappush(open_list, start_node)
+    best_g[start_cell] = 0
+    # (f, h, номер добавления, клетка): при равных f раньше раскрываются клетки ближе к цели
+    open_list = [(octile_distance(start, end), octile_distance(start, end), 0, start_cell)]
+    pushed = 1
 
     # Adding a stop condition
     outer_iterations = 0
-
-    if max_iterations is None:
-        max_iterations = 1000  # (len(maze[0]) * len(maze) // 2)
-
-    # what squares do we search
-    adjacent_squares = ((0, -1), (0, 1), (-1, 0), (1, 0),)
-    if allow_diagonal_movement:
-        adjacent_squares = ((0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1),)
+    current_cell = start_cell
 
     # Loop until you find the end
-    while len(open_list) > 0:
-        outer_iterations += 1
-
+    while open_list:
+        f, h, _, cell = heapq.heappop(open_list)
+        if closed[cell]:
+            # устаревшая запись, клетка уже раскрыта с меньшим g
+            continue
 
-
-        if outer_iterations > max_iterations:
+        outer_iterations += 1
+        if max_iterations is not None and outer_iterations > max_iterations:
             # if we hit this point return the path such as it is
             # it will not contain the destination
             warn("giving up on pathfinding too many iterations")
             if return_none_on_max_iter:
                 return None
-            else:
-                return return_path(current_node)
+            return return_path(parents, current_cell, height, step_grid)
 
-            # Get the current node
-        current_node = heapq.heappop(open_list)
-        closed_list.append(current_node)
+        current_cell = cell
+        closed[cell] = 1
 
         # Found the goal
-        if current_node == end_node:
-            return return_path(current_node)
-
-        #if distance.euclidean(current_node.position,end_node.position)<20:
-        #    return return_path(current_node)
-
-        # Generate children
-        children = []
-
-        for new_position in adjacent_squares:  # Adjacent squares
-
-            # Get node position
-            node_position = (current_node.position[0] + new_position[0], current_node.position[1] + new_position[1])
-
+        if cell == end_cell:
+            return return_path(parents, cell, height, step_grid)
+
+        x, y = divmod(cell, height)
+        g = best_g[cell]
+        for dx, dy, step_cost in adjacent_squares:
+            child_x = x + dx
+            child_y = y + dy
             # Make sure within range
-            if node_position[0] > (len(maze) - 1) or node_position[0] < 0 or node_position[1] > (
-                    len(maze[len(maze) - 1]) - 1) or node_position[1] < 0:
+            if child_x < 0 or child_x >= width or child_y < 0 or child_y >= height:
                 continue
-
-            # Make sure walkable terrain
-            if maze[node_position[0]][node_position[1]] != 0:
+            child = child_x * height + child_y
+            # Make sure walkable terrain and not expanded yet
+            if blocked[child] or closed[child]:
                 continue
-
-            # Create new node
-            new_node = Node(current_node, node_position)
-
-            # Append
-            children.append(new_node)
-
-        # Loop through children
-        for child in children:
-            # Child is on the closed list
-            if len([closed_child for closed_child in closed_list if closed_child == child]) > 0:
+            child_g = g + step_cost
+            if child_g >= best_g[child]:
                 continue
-
-            #Изначальный вариант
-            # Create the f, g, and h values
-            # child.g = current_node.g + 1
-            # child.h = ((child.position[0] - end_node.position[0]) ** 2) + (
-            #            (child.position[1] - end_node.position[1]) ** 2)
-            # print(child.h)
-            # child.f = child.g + child.h
-
-            child.g = current_node.g + 1
-            #print(child.g)
-            child.h = ((child.position[0] - end_node.position[0]) ** 2) + (
-                        (child.position[1] - end_node.position[1]) ** 2)
-                        #distance.cityblock(child.position,start_node.position)
-            #print(child.h)
-            child.f = child.g + child.h
-            #print(child.f)
-
-            # Child is already in the open list
-            if len([open_node for open_node in open_list if
-                    child.position == open_node.position and child.g > open_node.g]) > 0:
-                continue
-
-            # Add the child to the open list
-            heapq.heappush(open_list, child)
+            best_g[child] = child_g
+            parents[child] = cell
+            child_h = octile_distance((child_x, child_y), end)
+            heapq.heappush(open_list, (child_g + child_h, child_h, pushed, child))
+            pushed += 1
 
     warn("Couldn't get a path to destination")
-    return None
\ No newline at end of file
+    return None
@@ -6,9 +6,13 @@ from scipy.spatial import distance
 try:
     from continuous_grid_arctic.utils.misc import angle_correction, angle_to_point
     from continuous_grid_arctic.utils.sensors import SENSOR_CLASSNAME_TO_CLASS
+    from continuous_grid_arctic.utils.sprites import rotated_size
+    from continuous_grid_arctic.utils.assets import image_size, load_image
 except:
     from src.continuous_grid_arctic.utils.misc import angle_correction, angle_to_point
     from src.continuous_grid_arctic.utils.sensors import SENSOR_CLASSNAME_TO_CLASS
+    from src.continuous_grid_arctic.utils.sprites import rotated_size
+    from src.continuous_grid_arctic.utils.assets import image_size, load_image
 
 import json
 
@@ -24,8 +28,9 @@ class GameObject():
         """
         A class that reflects any game object and must be inherited by instantiating classes
 
-        :param image (pygame.image):
-            object image
+        :param image (pygame.image or str):
+            object image or the name of the image file in imgs/; images by name are loaded from the process-wide
+            registry only when they are drawn, so the simulation without rendering does not create surfaces
         :param start_position (tuple(int,int)):
             starting coordinates of the object
         :param height, width (int):
@@ -34,26 +39,44 @@ class GameObject():
             whether the object blocks the line of sight (for lidars and turn avoidance, not yet used)
         """
         self.name = name
-        self.image = image
+        self.image_name = image if isinstance(image, str) else None
+        self._image = None if isinstance(image, str) else image
 
         if height and width:
             self.height = height
             self.width = width
-            self.image = pygame.transform.scale(self.image, (width, height))
+            # размер как у pygame.transform.scale
+            self.image_size = (int(width), int(height))
+            if self._image is not None:
+                self._image = pygame.transform.scale(self._image, self.image_size)
         else:
-            self.height = self.image.get_height()
-            self.width = self.image.get_width()
+            self.image_size = self._image.get_size() if self._image is not None else image_size(self.image_name)
+            self.width, self.height = self.image_size
 
         self.start_position = np.array(start_position, dtype=np.float32)
         self.position = self.start_position
 
-        self.rectangle = self.image.get_rect(center=self.position, width=width, height=height)
+        self.rectangle = self._get_rect()
 
         self.blocks_vision = blocks_vision
 
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = load_image(self.image_name, self.image_size)
+        return self._image
+
+    def _get_rect(self):
+        """Hitbox centered in the current position, the same as image.get_rect(center=..., width=..., height=...)"""
+        rectangle = pygame.Rect((0, 0), self.image_size)
+        rectangle.center = self.position
+        rectangle.width = self.width
+        rectangle.height = self.height
+        return rectangle
+
     def place_in_position(self, position):
         self.position = np.array(position, dtype=np.float32)
-        self.rectangle = self.image.get_rect(center=self.position, width=self.width, height=self.height)
+        self.rectangle = self._get_rect()
 
 
 class AbstractRobot(GameObject):
@@ -166,23 +189,34 @@ class AbstractRobot(GameObject):
         """A function that moves the robot taking into account the set desired speeds."""
         # скорректировали скорости
         self._controller_call()
-        if self.rotation_speed != 0:
+        turned = self.rotation_speed != 0
+        if turned:
             self.direction = angle_correction(self.direction + self.rotation_direction * self.rotation_speed)
-            # TODO: объединить изменение положения хитбокса и изменение размера в соответствии с поворотом
-            # Rotate the original image without modifying it.
-            new_image = pygame.transform.rotate(self.image, -self.direction)
-            # Get a new rect with the center of the old rect.
-            self.rectangle = new_image.get_rect(center=self.rectangle.center)
 
         movement_vec = np.array((cos(radians(self.direction)) * self.speed, sin(radians(self.direction)) * self.speed),
                                 dtype=np.float32)
         self.position += movement_vec
+        self._update_rectangle(turned)
+
+    def _update_rectangle(self, turned):
+        """Moves the hitbox to the current position, after a turn its size is recalculated for the new direction"""
+        if turned:
+            # TODO: объединить изменение положения хитбокса и изменение размера в соответствии с поворотом
+            # размер хитбокса равен размеру повёрнутого изображения, он считается без поворота самого изображения
+            center = self.rectangle.center
+            self.rectangle = pygame.Rect((0, 0), rotated_size(*self.image_size, -self.direction))
+            self.rectangle.center = center
         position_diff = self.position - self.rectangle.center
         if np.linalg.norm(position_diff) > 0:
             self.rectangle.move_ip(position_diff)
 
     def move_to_the_point(self, next_point, speed=None):
         """Automatic control function for moving to a point"""
+        self.command_to_the_point(next_point, speed=speed)
+        self.move()
+
+    def command_to_the_point(self, next_point, speed=None):
+        """Sets the desired speeds for moving to a point without moving the robot"""
 
         if speed is not None:
             new_speed = speed
@@ -212,8 +246,6 @@ class AbstractRobot(GameObject):
         self.command_turn(delta_turn, new_rotation_direction)
         self.command_forward(new_speed)
 
-        self.move()
-
 
 class RobotWithSensors(AbstractRobot):
     def __init__(self,
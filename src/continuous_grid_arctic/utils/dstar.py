@@ -2,184 +2,207 @@
 D* grid planning
 author: Nirnay Roy
 See Wikipedia article (https://en.wikipedia.org/wiki/D*)
-"""
-import math
 
+The obstacle mask of the grid is a NumPy array. The search state of the cells (h, k, tag, parent) is kept in flat
+arrays indexed by x * col + y, the open list is a binary heap with lazy deletion of outdated entries.
+"""
+import heapq
+from functools import lru_cache
 from sys import maxsize
 
-#import matplotlib.pyplot as plt
+import numpy as np
 
 show_animation = False
 clear_if_path_not_found = False
 
+# значения tag
+NEW = 0
+OPEN = 1
+CLOSED = 2
 
-class State:
-
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.parent = None
-        self.state = "."
-        self.t = "new"  # tag for state
-        self.h = 0
-        self.k = 0
-
-    def cost(self, state):
-        if self.state == "#" or state.state == "#":
-            return maxsize
-
-        return math.sqrt(math.pow((self.x - state.x), 2) +
-                         math.pow((self.y - state.y), 2))
-
-    def set_state(self, state):
-        """
-        .: new
-        #: obstacle
-        e: oparent of current state
-        *: closed state
-        s: current state
-        """
-        if state not in ["s", ".", "#", "e", "*"]:
-            return
-        self.state = state
+# смещения соседей в порядке обхода исходного алгоритма
+NEIGHBOR_OFFSETS = [(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1) if i != 0 or j != 0]
 
 
 class Map:
 
     def __init__(self, row, col):
+        """
+        Grid of row x col cells with the obstacle mask
+
+        :param row, col (int):
+            grid size along x and y
+        """
         self.row = row
         self.col = col
-        self.map = self.init_map()
-
-    def init_map(self):
-        map_list = []
-        for i in range(self.row):
-            tmp = []
-            for j in range(self.col):
-                tmp.append(State(i, j))
-            map_list.append(tmp)
-        return map_list
-
-    def get_neighbors(self, state):
-        state_list = []
-        for i in [-1, 0, 1]:
-            for j in [-1, 0, 1]:
-                if i == 0 and j == 0:
-                    continue
-                if state.x + i < 0 or state.x + i >= self.row:
-                    continue
-                if state.y + j < 0 or state.y + j >= self.col:
-                    continue
-                state_list.append(self.map[state.x + i][state.y + j])
-        return state_list
+        self.obstacle = np.zeros((row, col), dtype=bool)
 
     def set_obstacle(self, point_list):
-        for x, y in point_list:
-            if x < 0 or x >= self.row or y < 0 or y >= self.col:
-                continue
-
-            self.map[x][y].set_state("#")
+        """Marks the cells (x, y) as obstacles, cells outside the grid are ignored"""
+        points = np.asarray(point_list, dtype=int).reshape(-1, 2)
+        inside = (points[:, 0] >= 0) & (points[:, 0] < self.row) & (points[:, 1] >= 0) & (points[:, 1] < self.col)
+        self.obstacle[points[inside, 0], points[inside, 1]] = True
+
+    def neighbors(self):
+        return grid_neighbors(self.row, self.col)
+
+
+@lru_cache(maxsize=8)
+def grid_neighbors(row, col):
+    """
+    Neighbors of each cell by the flat index x * col + y (in the order of NEIGHBOR_OFFSETS, without cells outside
+    the grid) and the lengths of the steps to them. The table depends only on the grid size and is shared by searches.
+    """
+    x, y = np.divmod(np.arange(row * col), col)
+    neighbors = list()
+    costs = list()
+    for i, j in NEIGHBOR_OFFSETS:
+        inside = (x + i >= 0) & (x + i < row) & (y + j >= 0) & (y + j < col)
+        neighbors.append(np.where(inside, (x + i) * col + y + j, -1))
+        costs.append(float(np.hypot(i, j)))
+    neighbors = np.stack(neighbors, axis=1).tolist()
+    return tuple(tuple((cell, costs[n]) for n, cell in enumerate(cell_neighbors) if cell >= 0)
+                 for cell_neighbors in neighbors)
 
 
 class Dstar:
     def __init__(self, maps, max_iterat=15000):
+        """
+        :param maps (Map):
+            grid with obstacles, it is not changed by the search
+        :param max_iterat (int):
+            maximum number of steps along the found path
+        """
         self.map = maps
         self.max_iterat = max_iterat
-        self.open_list = set()
+        size = maps.row * maps.col
+        # клетки пройденного пути перестают быть препятствиями, как в исходном алгоритме, поэтому маска копируется
+        self.obstacle = maps.obstacle.ravel().tolist()
+        self.h = [0] * size
+        self.k = [0] * size
+        self.tag = [NEW] * size
+        self.parent = [-1] * size
+        # принадлежность к открытому списку отдельно от tag: конечная клетка попадает в список с tag NEW
+        self.in_open = [False] * size
+        self.open_list = list()
+        self.neighbors = maps.neighbors()
+
+    def _cell(self, state):
+        return state[0] * self.map.col + state[1]
+
+    def cost(self, x, y, step_cost):
+        if self.obstacle[x] or self.obstacle[y]:
+            return maxsize
+        return step_cost
+
+    def _neighbors_costs(self, x):
+        """Neighbors of the cell x and the costs of moving to them"""
+        obstacle = self.obstacle
+        if obstacle[x]:
+            return [(y, maxsize) for y, step_cost in self.neighbors[x]]
+        return [(y, maxsize if obstacle[y] else step_cost) for y, step_cost in self.neighbors[x]]
 
     def process_state(self):
         x = self.min_state()
 
-        # if len(self.open_list)==0:
-        #     return -1
-
         if x is None:
             return -1
 
-        k_old = self.get_kmin()
+        # x -- вершина кучи, поэтому минимальный k равен его k
+        k_old = self.k[x]
         self.remove(x)
 
-        if k_old < x.h:
-            for y in self.map.get_neighbors(x):
-                if y.h <= k_old and x.h > y.h + x.cost(y):
-                    x.parent = y
-                    x.h = y.h + x.cost(y)
-        elif k_old == x.h:
-            for y in self.map.get_neighbors(x):
-                if y.t == "new" or y.parent == x and y.h != x.h + x.cost(y) \
-                        or y.parent != x and y.h > x.h + x.cost(y):
-                    y.parent = x
-                    self.insert(y, x.h + x.cost(y))
+        h, tag, parent = self.h, self.tag, self.parent
+        if k_old < h[x]:
+            for y, cost in self._neighbors_costs(x):
+                if h[y] <= k_old and h[x] > h[y] + cost:
+                    parent[x] = y
+                    h[x] = h[y] + cost
+        elif k_old == h[x]:
+            for y, cost in self._neighbors_costs(x):
+                if tag[y] == NEW or parent[y] == x and h[y] != h[x] + cost \
+                        or parent[y] != x and h[y] > h[x] + cost:
+                    parent[y] = x
+                    self.insert(y, h[x] + cost)
         else:
-            for y in self.map.get_neighbors(x):
-                if y.t == "new" or y.parent == x and y.h != x.h + x.cost(y):
-                    y.parent = x
-                    self.insert(y, x.h + x.cost(y))
+            for y, cost in self._neighbors_costs(x):
+                if tag[y] == NEW or parent[y] == x and h[y] != h[x] + cost:
+                    parent[y] = x
+                    self.insert(y, h[x] + cost)
                 else:
-                    if y.parent != x and y.h > x.h + x.cost(y):
-                        self.insert(y, x.h)
+                    if parent[y] != x and h[y] > h[x] + cost:
+                        self.insert(y, h[x])
                     else:
-                        if y.parent != x and x.h > y.h + x.cost(y) \
-                                and y.t == "close" and y.h > k_old:
-                            self.insert(y, y.h)
+                        if parent[y] != x and h[x] > h[y] + cost \
+                                and tag[y] == CLOSED and h[y] > k_old:
+                            self.insert(y, h[y])
         return self.get_kmin()
 
     def min_state(self):
-        if not self.open_list:
+        # устаревшие записи (клетка удалена из списка или её k изменился) удаляются с вершины кучи
+        open_list, in_open, k = self.open_list, self.in_open, self.k
+        while open_list and not (in_open[open_list[0][1]] and k[open_list[0][1]] == open_list[0][0]):
+            heapq.heappop(open_list)
+        if not open_list:
             return None
-        min_state = min(self.open_list, key=lambda x: x.k)
-        return min_state
+        return open_list[0][1]
 
     def get_kmin(self):
-        if not self.open_list:
+        x = self.min_state()
+        if x is None:
             return -1
-        k_min = min([x.k for x in self.open_list])
-        return k_min
+        return self.k[x]
 
     def insert(self, state, h_new):
-        if state.t == "new":
-            state.k = h_new
-        elif state.t == "open":
-            state.k = min(state.k, h_new)
-        elif state.t == "close":
-            state.k = min(state.h, h_new)
-        state.h = h_new
-        state.t = "open"
-        self.open_list.add(state)
+        if self.tag[state] == NEW:
+            self.k[state] = h_new
+        elif self.tag[state] == OPEN:
+            self.k[state] = min(self.k[state], h_new)
+        elif self.tag[state] == CLOSED:
+            self.k[state] = min(self.h[state], h_new)
+        self.h[state] = h_new
+        self.tag[state] = OPEN
+        self.in_open[state] = True
+        heapq.heappush(self.open_list, (self.k[state], state))
 
     def remove(self, state):
-        if state.t == "open":
-            state.t = "close"
-        self.open_list.remove(state)
+        if self.tag[state] == OPEN:
+            self.tag[state] = CLOSED
+        self.in_open[state] = False
 
     def modify_cost(self, x):
-        if x.t == "close":
-            self.insert(x, x.parent.h + x.cost(x.parent))
+        if self.tag[x] == CLOSED:
+            parent = self.parent[x]
+            step_cost = dict(self.neighbors[x])[parent]
+            self.insert(x, self.h[parent] + self.cost(x, parent, step_cost))
 
     def run(self, start, end):
-
+        """
+        :param start, end (tuple(int, int)):
+            start and end cells (x, y)
+        :return: x and y coordinates of the path cells (without the end cell), flag that the end was reached
+        """
         rx = []
         ry = []
+        start = self._cell(start)
+        end = self._cell(end)
 
-        self.open_list.add(end)
+        self.in_open[end] = True
+        heapq.heappush(self.open_list, (self.k[end], end))
         # Задаем количество итераций для прерыания (15к около 5секунд)
         iterat = 0
 
-        while True:
-            self.process_state()
-
-            if start.t == "close":
-                break
-        start.set_state("s")
-        s = start
-        s = s.parent
-        s.set_state("e")
+        while self.tag[start] != CLOSED:
+            if self.process_state() == -1 and self.tag[start] != CLOSED:
+                # открытый список исчерпан, старт недостижим
+                return rx, ry, False
+        self.obstacle[start] = False
+        self.obstacle[self.parent[start]] = False
         tmp = start
         found_targed_point = True
         while tmp != end:
             # Реализовал прерывание таким образом
             iterat += 1
-            #print(iterat)
             if iterat > self.max_iterat:
                 found_targed_point = False
                 if clear_if_path_not_found:
@@ -187,18 +210,14 @@ class Dstar:
                     ry.clear()
                 break
 
-            tmp.set_state("*")
-            rx.append(tmp.x)
-            ry.append(tmp.y)
-            if show_animation:
-                plt.plot(rx, ry, "-r")  # надо домножить на grid_step? раньше было домножение, но оно было выше, где оно не нужно
-                plt.pause(0.01)
-            if tmp.parent.state == "#":
+            self.obstacle[tmp] = False
+            rx.append(tmp // self.map.col)
+            ry.append(tmp % self.map.col)
+            if self.obstacle[self.parent[tmp]]:
                 self.modify(tmp)
                 continue
-            tmp = tmp.parent
-        tmp.set_state("e")
-        #print(iterat)
+            tmp = self.parent[tmp]
+        self.obstacle[tmp] = False
 
         return rx, ry, found_targed_point
 
@@ -206,5 +225,5 @@ class Dstar:
         self.modify_cost(state)
         while True:
             k_min = self.process_state()
-            if k_min >= state.h:
-                break
\ No newline at end of file
+            if k_min >= self.h[state]:
+                break
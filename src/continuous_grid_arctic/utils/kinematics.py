@@ -0,0 +1,183 @@
+import numpy as np
+
+
+class RobotsKinematics:
+    def __init__(self, robots_number):
+        """
+        Kinematic state of a group of robots (AbstractRobot) stored as a structure of arrays.
+        Reproduces the controller and the movement of AbstractRobot for many robots at once, rows are addressed
+        by integer index arrays.
+
+        :param robots_number (int):
+            number of rows (robots) in the arrays
+        """
+        self.robots_number = robots_number
+
+        # координаты хранятся в float64, для роботов с float32 позицией результат округляется как в AbstractRobot.move
+        self.position = np.zeros((robots_number, 2), dtype=np.float64)
+        self.single_precision = np.ones(robots_number, dtype=bool)
+
+        self.direction = np.zeros(robots_number, dtype=np.float64)
+        self.speed = np.zeros(robots_number, dtype=np.float64)
+        self.rotation_speed = np.zeros(robots_number, dtype=np.float64)
+        self.rotation_direction = np.zeros(robots_number, dtype=np.float64)
+
+        self.desirable_speed = np.zeros(robots_number, dtype=np.float64)
+        self.desirable_rotation_speed = np.zeros(robots_number, dtype=np.float64)
+        self.desirable_rotation_direction = np.zeros(robots_number, dtype=np.float64)
+
+        self.min_speed = np.zeros(robots_number, dtype=np.float64)
+        self.max_speed = np.zeros(robots_number, dtype=np.float64)
+        self.max_rotation_speed = np.zeros(robots_number, dtype=np.float64)
+        self.max_speed_change = np.zeros(robots_number, dtype=np.float64)
+        self.max_rotation_speed_change = np.zeros(robots_number, dtype=np.float64)
+
+    def load(self, index, robot):
+        """Copies the state of the robot object into the row"""
+        self.position[index] = robot.position
+        self.single_precision[index] = robot.position.dtype == np.float32
+
+        self.direction[index] = robot.direction
+        self.speed[index] = robot.speed
+        self.rotation_speed[index] = robot.rotation_speed
+        self.rotation_direction[index] = robot.rotation_direction
+
+        self.desirable_speed[index] = robot.desirable_speed
+        self.desirable_rotation_speed[index] = robot.desirable_rotation_speed
+        self.desirable_rotation_direction[index] = robot.desirable_rotation_direction
+
+        self.min_speed[index] = robot.min_speed
+        self.max_speed[index] = robot.max_speed
+        self.max_rotation_speed[index] = robot.max_rotation_speed
+        self.max_speed_change[index] = robot.max_speed_change
+        self.max_rotation_speed_change[index] = robot.max_rotation_speed_change
+
+    def store(self, index, robot):
+        """Copies the row into the robot object (the hitbox is not updated)"""
+        # позиция меняется на месте, как и в AbstractRobot.move
+        robot.position[:] = self.position[index]
+
+        robot.direction = float(self.direction[index])
+        robot.speed = float(self.speed[index])
+        robot.rotation_speed = float(self.rotation_speed[index])
+        robot.rotation_direction = int(self.rotation_direction[index])
+
+        robot.desirable_speed = float(self.desirable_speed[index])
+        robot.desirable_rotation_speed = float(self.desirable_rotation_speed[index])
+        robot.desirable_rotation_direction = int(self.desirable_rotation_direction[index])
+
+    def command_forward(self, index, desirable_speed):
+        """Vectorized AbstractRobot.command_forward"""
+        desirable_speed = np.minimum(desirable_speed, self.max_speed[index])
+        self.desirable_speed[index] = np.maximum(desirable_speed, self.min_speed[index])
+
+    def command_turn(self, index, desirable_rotation_speed, rotation_direction):
+        """Vectorized AbstractRobot.command_turn"""
+        desirable_rotation_speed = np.broadcast_to(desirable_rotation_speed, np.shape(index))
+        rotation_direction = np.broadcast_to(rotation_direction, np.shape(index))
+
+        self.desirable_rotation_speed[index] = np.minimum(desirable_rotation_speed, self.max_rotation_speed[index])
+        self.desirable_rotation_direction[index] = rotation_direction
+
+        if np.any((rotation_direction == 0) & (desirable_rotation_speed != 0)):
+            raise ValueError("Turn speed specified, but direction = 0!")
+
+    def command_to_the_point(self, index, next_points, speed=None):
+        """
+        Vectorized AbstractRobot.command_to_the_point
+
+        :param index (np.array):
+            rows of the robots
+        :param next_points (np.array):
+            target points, shape (len(index), 2)
+        :param speed (np.array or None):
+            desired speeds; if None, the distance to the target point is used as in AbstractRobot
+        """
+        relative_position = np.asarray(next_points, dtype=np.float64) - self.position[index]
+
+        if speed is None:
+            new_speed = np.sqrt(relative_position[:, 0] ** 2 + relative_position[:, 1] ** 2)
+        else:
+            new_speed = speed
+
+        # angle_to_point
+        with np.errstate(divide="ignore", invalid="ignore"):
+            res_angle = np.degrees(np.arctan(relative_position[:, 1] / relative_position[:, 0]))
+        res_angle = np.where(relative_position[:, 0] < 0, res_angle + 180, res_angle)
+        res_angle = np.where(relative_position[:, 0] == 0, 0, res_angle)
+        res_angle = _angle_correction(res_angle)
+
+        desirable_angle = np.trunc(res_angle)
+        cur_direction = np.trunc(self.direction[index])
+        angle_diff = desirable_angle - cur_direction
+
+        delta_turn = np.where(angle_diff > 0,
+                              np.where(angle_diff > 180, cur_direction + (360 - desirable_angle), angle_diff),
+                              np.where(-angle_diff > 180, (360 - cur_direction) + desirable_angle, -angle_diff))
+        new_rotation_direction = np.where(angle_diff > 0,
+                                          np.where(angle_diff > 180, -1, 1),
+                                          np.where(-angle_diff > 180, 1, -1))
+
+        self.command_turn(index, delta_turn, new_rotation_direction)
+        self.command_forward(index, new_speed)
+
+    def move(self, index):
+        """
+        Vectorized AbstractRobot.move without the hitbox update.
+
+        :param index (np.array):
+            rows of the robots to move
+        :return turned (np.array):
+            mask of the robots that have turned in this frame (their hitbox size has to be recalculated)
+        """
+        # _turn_processing
+        rotation_speed = self.rotation_speed[index]
+        desirable_rotation_speed = self.desirable_rotation_speed[index]
+        desirable_rotation_direction = self.desirable_rotation_direction[index]
+        max_rotation_speed_change = self.max_rotation_speed_change[index]
+
+        rotation_direction = self.rotation_direction[index]
+        rotation_direction = np.where(rotation_direction == 0, desirable_rotation_direction, rotation_direction)
+
+        same_direction = rotation_direction == desirable_rotation_direction
+        speed_rotation_change = np.where(
+            same_direction,
+            np.minimum(np.abs(rotation_speed - desirable_rotation_speed), max_rotation_speed_change),
+            -np.minimum(np.abs(desirable_rotation_speed + rotation_speed), max_rotation_speed_change))
+        speed_rotation_change = np.where(same_direction & (desirable_rotation_speed < rotation_speed),
+                                         -speed_rotation_change, speed_rotation_change)
+
+        new_rotation_speed = rotation_speed + speed_rotation_change
+        rotation_direction = np.where(new_rotation_speed < 0, -rotation_direction, rotation_direction)
+        rotation_speed = np.abs(new_rotation_speed)
+
+        # _speed_processing
+        speed = self.speed[index]
+        desirable_speed = self.desirable_speed[index]
+        speed_change = np.minimum(self.max_speed_change[index], np.abs(speed - desirable_speed))
+        speed = speed + np.where(speed > desirable_speed, -speed_change, speed_change)
+
+        # поворот и перемещение
+        turned = rotation_speed != 0
+        direction = self.direction[index]
+        direction = np.where(turned, _angle_correction(direction + rotation_direction * rotation_speed), direction)
+
+        radians = np.radians(direction)
+        movement_vec = np.stack((np.cos(radians) * speed, np.sin(radians) * speed), axis=1).astype(np.float32)
+        position = self.position[index] + movement_vec
+        single_precision = self.single_precision[index]
+        position[single_precision] = position[single_precision].astype(np.float32)
+
+        self.rotation_speed[index] = rotation_speed
+        self.rotation_direction[index] = rotation_direction
+        self.speed[index] = speed
+        self.direction[index] = direction
+        self.position[index] = position
+
+        return turned
+
+
+def _angle_correction(angle):
+    """Vectorized misc.angle_correction"""
+    angle = np.where(angle >= 360, angle - 360, angle)
+    return np.where(angle < 0, 360 + angle, angle)
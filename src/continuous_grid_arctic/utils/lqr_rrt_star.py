@@ -2,7 +2,6 @@
 Path planning code with LQR RRT*
 author: AtsushiSakai(@Atsushi_twi)
 """
-import copy
 import math
 import os
 import random
@@ -45,7 +44,7 @@ class LQRRRTStar(RRTStar):
         Setting Parameter
         start:Start Position [x,y]
         goal:Goal Position [x,y]
-        obstacleList:obstacle Positions [[x,y,size],...]
+        obstacleList:obstacle Positions [[x,y,size],...] or occupancy grid
         randArea:Random Sampling Area [min,max]
         """
         self.start = self.Node(start[0], start[1])
@@ -69,18 +68,17 @@ class LQRRRTStar(RRTStar):
         animation: flag for animation on or off
         """
 
-        self.node_list = [self.start]
+        self.start_tree()
         for i in range(self.max_iter):
-            print("Iter:", i, ", number of nodes:", len(self.node_list))
             rnd = self.get_random_node()
-            nearest_ind = self.get_nearest_node_index(self.node_list, rnd)
+            nearest_ind = self.nodes_index.nearest(rnd.x, rnd.y)
             new_node = self.steer(self.node_list[nearest_ind], rnd)
 
             if self.check_collision(new_node, self.obstacle_list):
                 near_indexes = self.find_near_nodes(new_node)
                 new_node = self.choose_parent(new_node, near_indexes)
                 if new_node:
-                    self.node_list.append(new_node)
+                    self.add_node(new_node)
                     self.rewire(new_node, near_indexes)
 
             if animation and i % 5 == 0:
@@ -91,15 +89,11 @@ class LQRRRTStar(RRTStar):
                 if last_index:
                     return self.generate_final_course(last_index)
 
-        print("reached max iteration")
-
         last_index = self.search_best_goal_node()
         if last_index:
             return self.generate_final_course(last_index)
-        else:
-            print("Cannot find path")
 
-        return None
+        return None  # cannot find path
 
     def draw_graph(self, rnd=None):
         plt.clf()
@@ -122,8 +116,7 @@ class LQRRRTStar(RRTStar):
         plt.pause(0.01)
 
     def search_best_goal_node(self):
-        dist_to_goal_list = [self.calc_dist_to_goal(n.x, n.y) for n in self.node_list]
-        goal_inds = [dist_to_goal_list.index(i) for i in dist_to_goal_list if i <= self.goal_xy_th]
+        goal_inds = self.nodes_index.query_radius(self.end.x, self.end.y, self.goal_xy_th)
 
         if not goal_inds:
             return None
@@ -170,7 +163,6 @@ class LQRRRTStar(RRTStar):
     #     return path
 
     def generate_final_course(self, goal_index):
-        print("final")
         path = [[self.end.x*10, self.end.y*10]]
         node = self.node_list[goal_index]
         while node.parent:
@@ -204,15 +196,14 @@ class LQRRRTStar(RRTStar):
 
         px, py, course_lens = self.sample_path(wx, wy, self.step_size)
 
-        if px is None:
+        if not px:
             return None
 
-        newNode = copy.deepcopy(from_node)
-        newNode.x = px[-1]
-        newNode.y = py[-1]
+        # новый узел вместо deepcopy: копирование from_node копировало бы всю цепочку родителей
+        newNode = self.Node(px[-1], py[-1])
         newNode.path_x = px
         newNode.path_y = py
-        newNode.cost += sum([abs(c) for c in course_lens])
+        newNode.cost = from_node.cost + sum([abs(c) for c in course_lens])
         newNode.parent = from_node
 
         return newNode
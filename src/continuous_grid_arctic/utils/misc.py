@@ -60,7 +60,10 @@ def calculateAngle(v, w):
     :param w:
     :return:
     """
-    return np.arccos(v.dot(w) / (np.linalg.norm(v, axis=1) * np.linalg.norm(w)))
+    cosines = v.dot(w) / (np.linalg.norm(v, axis=1) * np.linalg.norm(w))
+    # косинус сонаправленных векторов из-за округления может выйти за [-1, 1], и arccos дал бы NaN;
+    # нулевые векторы по-прежнему дают NaN
+    return np.arccos(np.clip(cosines, -1.0, 1.0))
 
 def move_to_the_point(direction, 
                       position, 
@@ -103,4 +106,134 @@ def areDotsOnLeft(line, dots):
     # D = (x2 - x1) * (yp - y1) - (xp - x1) * (y2 - y1)
     d = (line[1, 0] - line[0, 0]) * (dots[:, 1] - line[0, 1]) - (dots[:, 0] - line[0, 0]) * (
                 line[1, 1] - line[0, 1])
-    return d > 0.01
\ No newline at end of file
+    return d > 0.01
+
+
+def rects_to_array(objects):
+    """
+    Hitboxes of game objects as an array of boxes
+    :param objects: list of objects with pygame.Rect rectangle
+    :return: ndarray (objects, 4) -- left, top, right, bottom
+    """
+    return np.array([(cur_object.rectangle.left, cur_object.rectangle.top,
+                      cur_object.rectangle.right, cur_object.rectangle.bottom) for cur_object in objects],
+                    dtype=np.float64).reshape(-1, 4)
+
+
+def distance_to_rects(cur_point, rects):
+    """
+    Vectorized distance_to_rect: distance from the point to the nearest of 8 characteristic points
+    (corners and middles of the sides) of each box
+    :param cur_point: point (x, y)
+    :param rects: ndarray (boxes, 4) -- left, top, right, bottom
+    :return: ndarray (boxes,)
+    """
+    left, top, right, bottom = rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+    # середины сторон считаются как в pygame.Rect: целочисленно
+    center_x = left + (right - left) // 2
+    center_y = top + (bottom - top) // 2
+    points_x = np.stack((left, left, right, right, center_x, left, center_x, right), axis=1)
+    points_y = np.stack((top, bottom, top, bottom, top, center_y, bottom, center_y), axis=1)
+    diff_x = points_x - np.float64(cur_point[0])
+    diff_y = points_y - np.float64(cur_point[1])
+    return np.sqrt(diff_x ** 2 + diff_y ** 2).min(axis=1, initial=np.inf)
+
+
+def rays_first_sample_hits(start_point, end_points, points_number, rects):
+    """
+    Rays from start_point to end_points are sampled in points_number points (the end point is not included),
+    for each ray finds the first sample that is inside one of the boxes. As in pygame.Rect.collidepoint,
+    coordinates of samples are truncated to integers.
+    :param start_point: ndarray (2,)
+    :param end_points: ndarray (rays, 2)
+    :param points_number: number of samples on a ray
+    :param rects: ndarray (boxes, 4) -- left, top, right, bottom
+    :return: samples ndarray (rays, points_number, 2) and index of the first hit sample for each ray, -1 if none
+    """
+    u = np.arange(points_number) / points_number
+    samples = end_points[:, np.newaxis, :] * u[np.newaxis, :, np.newaxis] + \
+        start_point[np.newaxis, np.newaxis, :] * (1 - u)[np.newaxis, :, np.newaxis]
+
+    if len(rects) == 0:
+        return samples, np.full(len(end_points), -1)
+
+    int_samples = np.trunc(samples)[:, :, np.newaxis, :]
+    inside = (int_samples[..., 0] >= rects[:, 0]) & (int_samples[..., 0] < rects[:, 2]) & \
+             (int_samples[..., 1] >= rects[:, 1]) & (int_samples[..., 1] < rects[:, 3])
+    sample_hits = inside.any(axis=2)
+    first_hits = np.where(sample_hits.any(axis=1), sample_hits.argmax(axis=1), -1)
+    return samples, first_hits
+
+
+def rays_rects_intersection(start_point, end_points, rects):
+    """
+    Exact intersection of segments from start_point to end_points with boxes (slab method)
+    :param start_point: ndarray (2,)
+    :param end_points: ndarray (rays, 2)
+    :param rects: ndarray (boxes, 4) -- left, top, right, bottom
+    :return: ndarray (rays,) -- fraction of the segment to the first intersection, 1 if there is none
+    """
+    if len(rects) == 0:
+        return np.ones(len(end_points))
+
+    ray_vectors = end_points - start_point
+    lower = rects[np.newaxis, :, :2] - start_point
+    upper = rects[np.newaxis, :, 2:] - start_point
+    vectors = ray_vectors[:, np.newaxis, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1 = lower / vectors
+        t2 = upper / vectors
+
+    # луч параллелен оси: пересечение на всей прямой, если начало внутри полосы, иначе пусто
+    parallel = vectors == 0
+    inside_slab = (lower <= 0) & (upper >= 0)
+    t_min = np.where(parallel, np.where(inside_slab, -np.inf, np.inf), np.minimum(t1, t2))
+    t_max = np.where(parallel, np.where(inside_slab, np.inf, -np.inf), np.maximum(t1, t2))
+
+    t_near = t_min.max(axis=2)
+    t_far = t_max.min(axis=2)
+    hits = (t_near <= t_far) & (t_far >= 0) & (t_near <= 1)
+    return np.where(hits, np.maximum(t_near, 0), 1).min(axis=1)
+
+
+def lasers_segments_intersection(lasers, segments):
+    """
+    Nearest intersections of lasers with segments (walls) for all lasers, walls and history entries at once.
+    The intersection test and the intersection point are the same as in LeaderCorridor_lasers.intersect and
+    LeaderCorridor_lasers.seg_intersect.
+    :param lasers: ndarray (L, 2, 2) -- start and end point of each laser
+    :param segments: ndarray (M, 2, 2) or (H, M, 2, 2) -- walls; walls with NaN coordinates are ignored (padding)
+    :return: distances (L,) or (H, L) from the start of the laser to the nearest intersection (inf if there is none),
+             points (..., L, 2) of the nearest intersections and indices (..., L) of the intersected walls (-1 if none)
+    """
+    lasers = np.asarray(lasers, dtype=np.float64)
+    segments = np.asarray(segments, dtype=np.float64)
+    result_shape = segments.shape[:-3] + (len(lasers),)
+    if segments.shape[-3] == 0:
+        return np.full(result_shape, np.inf), np.full(result_shape + (2,), np.nan), np.full(result_shape, -1)
+
+    # оси: (история, лазер, стена, координата)
+    c = lasers[:, np.newaxis, 0, :]
+    d = lasers[:, np.newaxis, 1, :]
+    a = segments[..., np.newaxis, :, 0, :]
+    b = segments[..., np.newaxis, :, 1, :]
+
+    def ccw(p, q, r):
+        return (r[..., 1] - p[..., 1]) * (q[..., 0] - p[..., 0]) > (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hits = (ccw(a, c, d) != ccw(b, c, d)) & (ccw(a, b, c) != ccw(a, b, d))
+
+        da = b - a
+        db = d - c
+        dp = a - c
+        denom = -da[..., 1] * db[..., 0] + da[..., 0] * db[..., 1]
+        num = -da[..., 1] * dp[..., 0] + da[..., 0] * dp[..., 1]
+        points = (num / denom)[..., np.newaxis] * db + c
+        distances = np.where(hits, np.linalg.norm(points - c, axis=-1), np.inf)
+
+    nearest = distances.argmin(axis=-1)
+    nearest_distances = np.take_along_axis(distances, nearest[..., np.newaxis], axis=-1)[..., 0]
+    nearest_points = np.take_along_axis(points, nearest[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+    nearest_ids = np.where(np.isfinite(nearest_distances), nearest, -1)
+    return nearest_distances, nearest_points, nearest_ids
@@ -0,0 +1,96 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+# числовые признаки среды: поля записи идут подряд без выравнивания, поэтому запись можно рассматривать как вектор
+# float32 в старом порядке obs["numerical_features"]
+NUMERICAL_FEATURES_DTYPE = np.dtype([("leader_position", np.float32, (2,)),
+                                     ("leader_speed", np.float32),
+                                     ("leader_direction", np.float32),
+                                     ("leader_rotation_speed", np.float32),
+                                     ("follower_position", np.float32, (2,)),
+                                     ("follower_speed", np.float32),
+                                     ("follower_direction", np.float32),
+                                     ("follower_rotation_speed", np.float32)])
+
+# положения полей в векторе obs["numerical_features"]
+LEADER_POSITION = slice(0, 2)
+LEADER_SPEED = 2
+LEADER_DIRECTION = 3
+LEADER_ROTATION_SPEED = 4
+FOLLOWER_POSITION = slice(5, 7)
+FOLLOWER_SPEED = 7
+FOLLOWER_DIRECTION = 8
+FOLLOWER_ROTATION_SPEED = 9
+
+
+class StructuredObservation(Mapping):
+    def __init__(self):
+        """
+        Observation of Game that is filled in place every step (Game(structured_observation=True)).
+        The numerical features are a structured record (fields of NUMERICAL_FEATURES_DTYPE), numerical_features is
+        a float32 view of the same memory. The Mapping interface gives the keys of the old observation dict:
+        "numerical_features", "leader_target_point" and the names of the follower sensors.
+        The object is reused by the environment, a copy of the values must be made to keep them (to_dict).
+        """
+        self.record = np.zeros((), dtype=NUMERICAL_FEATURES_DTYPE)
+        self.numerical_features = self.record.reshape(1).view(np.float32)
+        self.leader_target_point = None
+        self.sensors = dict()
+
+    def fill(self, leader, follower, leader_target_point, sensors):
+        """
+        Writes the state of the robots to the record without creating new arrays
+
+        :param leader, follower (AbstractRobot):
+            robots of the environment
+        :param leader_target_point (tuple):
+            current target point of the leader
+        :param sensors (dict):
+            outputs of the follower sensors by names, kept by reference
+        """
+        features = self.numerical_features
+        features[LEADER_POSITION] = leader.position
+        features[LEADER_SPEED] = leader.speed
+        features[LEADER_DIRECTION] = leader.direction
+        features[LEADER_ROTATION_SPEED] = leader.rotation_speed
+        features[FOLLOWER_POSITION] = follower.position
+        features[FOLLOWER_SPEED] = follower.speed
+        features[FOLLOWER_DIRECTION] = follower.direction
+        features[FOLLOWER_ROTATION_SPEED] = follower.rotation_speed
+        self.leader_target_point = leader_target_point
+        self.sensors = sensors
+
+    def __getitem__(self, key):
+        if key == "numerical_features":
+            return self.numerical_features
+        if key == "leader_target_point":
+            return self.leader_target_point
+        return self.sensors[key]
+
+    def __iter__(self):
+        yield "numerical_features"
+        yield "leader_target_point"
+        yield from (key for key in self.sensors if key not in ("numerical_features", "leader_target_point"))
+
+    def __len__(self):
+        return 2 + sum(1 for key in self.sensors if key not in ("numerical_features", "leader_target_point"))
+
+    def to_dict(self):
+        """Observation in the format of the old dict, the numerical features are copied"""
+        obs_dict = dict(self)
+        obs_dict["numerical_features"] = self.numerical_features.copy()
+        return obs_dict
+
+
+def detach(observation):
+    """
+    Observation that stays valid after the environment is reset or stepped again (e.g. the terminal observation of
+    vector environments): StructuredObservation is overwritten in place by the environment, so its copy is returned
+
+    :param observation (dict or StructuredObservation):
+        observation returned by the environment
+    """
+    if isinstance(observation, StructuredObservation):
+        return observation.to_dict()
+    return observation
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def occupancy_grid(obstacles, grid_size, step_grid, margin=0):
+    """
+    Occupancy grid of the path planners: each obstacle rectangle, inflated by margin, is rasterized by slicing.
+    The obstacle with the center in the cell c and the half size s (in cells) occupies the cells [c - s, c + s),
+    cells outside the grid are skipped.
+
+    :param obstacles (iterable of tuple(float, float, float, float)):
+        center x, center y, width and height of the obstacles in pixels
+    :param grid_size (tuple(int, int)):
+        number of cells along x and y
+    :param step_grid (int):
+        size of a cell in pixels
+    :param margin (float):
+        inflation of the obstacles on each side in pixels, rounded down to whole cells
+    :return: np.ndarray of bool (x, y), True -- the cell is occupied
+    """
+    grid = np.zeros(grid_size, dtype=bool)
+    obstacles = np.asarray(list(obstacles), dtype=np.float64).reshape(-1, 4)
+    if len(obstacles) == 0:
+        return grid
+
+    margin_cells = int(margin // step_grid)
+    centers = (obstacles[:, :2] // step_grid).astype(int)
+    half_sizes = ((obstacles[:, 2:] / 2) // step_grid).astype(int) + margin_cells
+    # границы прямоугольников обрезаются по сетке, иначе отрицательные индексы срезов считались бы с конца
+    starts = np.maximum(centers - half_sizes, 0)
+    ends = np.minimum(centers + half_sizes, grid_size)
+    for (start_x, start_y), (end_x, end_y) in zip(starts.tolist(), ends.tolist()):
+        grid[start_x:end_x, start_y:end_y] = True
+    return grid
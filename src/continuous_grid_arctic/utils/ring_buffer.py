@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class SlidingBuffer:
+    def __init__(self, item_shape=(), dtype=np.float64, capacity=64):
+        """
+        Queue of fixed-shape items stored in one preallocated array. Items are appended at the end and removed from
+        the beginning, the stored items always occupy a contiguous slice of the array, so they are available as a
+        view without copying. The view is valid until the next change of the buffer.
+
+        :param item_shape (tuple):
+            shape of one item
+        :param dtype (np.dtype):
+            type of the items
+        :param capacity (int):
+            initial number of items in the array, it is doubled when the array is full
+        """
+        self.item_shape = tuple(item_shape)
+        self.buffer = np.zeros((capacity,) + self.item_shape, dtype=dtype)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        return self.view[index]
+
+    def __iter__(self):
+        return iter(self.view)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.view if dtype is None else self.view.astype(dtype)
+
+    @property
+    def view(self):
+        return self.buffer[self.start:self.end]
+
+    def _reserve(self, count):
+        """Frees space for count items at the end of the array"""
+        if self.end + count <= len(self.buffer):
+            return
+        size = len(self)
+        if size + count <= len(self.buffer) // 2:
+            # сдвиг в начало массива, с последнего сдвига добавлено не меньше половины массива -- в среднем O(1)
+            self.buffer[:size] = self.buffer[self.start:self.end]
+        else:
+            new_buffer = np.zeros((max(2 * len(self.buffer), size + count),) + self.item_shape,
+                                  dtype=self.buffer.dtype)
+            new_buffer[:size] = self.view
+            self.buffer = new_buffer
+        self.start = 0
+        self.end = size
+
+    def append(self, item):
+        self._reserve(1)
+        self.buffer[self.end] = item
+        self.end += 1
+
+    def extend(self, items):
+        if not isinstance(items, np.ndarray):
+            items = list(items)
+        items = np.asarray(items, dtype=self.buffer.dtype).reshape((-1,) + self.item_shape)
+        self._reserve(len(items))
+        self.buffer[self.end:self.end + len(items)] = items
+        self.end += len(items)
+
+    def popleft(self, count=1):
+        if count > len(self):
+            raise IndexError("pop from an empty buffer")
+        self.start += count
+
+    def remove(self, mask):
+        """Removes the items marked by the boolean mask, the order of the other items is kept"""
+        kept = self.view[~np.asarray(mask, dtype=bool)]
+        self.buffer[self.start:self.start + len(kept)] = kept
+        self.end = self.start + len(kept)
+
+    def clear(self):
+        self.start = 0
+        self.end = 0
+
+
+class CorridorBuffer:
+    def __init__(self):
+        """
+        Corridor along the leader trajectory: pairs of border points [right, left] and the walls between consecutive
+        pairs. The walls are updated on append and popleft, so the sensors get them as a ready array.
+        Supports the part of the deque interface used by the trackers and the sensors.
+        """
+        self.borders = SlidingBuffer((2, 2), np.float64)
+        # стены между соседними парами точек: [правая стена, левая стена], каждая из двух точек
+        self.walls_buffer = SlidingBuffer((2, 2, 2), np.float64)
+
+    def __len__(self):
+        return len(self.borders)
+
+    def __getitem__(self, index):
+        return self.borders[index]
+
+    def __iter__(self):
+        return iter(self.borders)
+
+    @property
+    def walls(self):
+        """Walls (K, 2, 2, 2): right and left wall between each pair of consecutive border points"""
+        return self.walls_buffer.view
+
+    def append(self, border_dots):
+        border_dots = np.asarray(border_dots, dtype=np.float64)
+        if len(self.borders) > 0:
+            self.walls_buffer.append(np.stack((self.borders[-1], border_dots), axis=1))
+        self.borders.append(border_dots)
+
+    def extend(self, borders):
+        for border_dots in borders:
+            self.append(border_dots)
+
+    def popleft(self):
+        self.borders.popleft()
+        if len(self.walls_buffer) > 0:
+            self.walls_buffer.popleft()
+
+    def shift(self, delta):
+        """Moves all border points and walls by -delta (e.g. when the coordinate system moves with the robot)"""
+        self.borders.view[...] -= delta
+        self.walls_buffer.view[...] -= delta
+
+    def clear(self):
+        self.borders.clear()
+        self.walls_buffer.clear()
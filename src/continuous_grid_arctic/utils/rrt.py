@@ -8,10 +8,70 @@ import random
 
 #import matplotlib.pyplot as plt
 import numpy as np
+from scipy.spatial import cKDTree
 
 show_animation = True
 
 
+class NodesIndex:
+    """
+    Index of the positions of the tree nodes (by the order of node_list) for the nearest node and radius queries.
+    The first nodes are kept in a KD-tree, the recently added ones are checked directly, the KD-tree is rebuilt when
+    rebuild_size new nodes are added.
+    """
+
+    def __init__(self, rebuild_size=64):
+        self.rebuild_size = rebuild_size
+        self.positions = np.zeros((256, 2))
+        self.size = 0
+        self.tree = None
+        self.tree_size = 0
+
+    def add(self, node):
+        if self.size == len(self.positions):
+            self.positions = np.concatenate((self.positions, np.zeros_like(self.positions)))
+        self.positions[self.size] = node.x, node.y
+        self.size += 1
+        if self.size - self.tree_size >= self.rebuild_size:
+            self._rebuild()
+
+    def update(self, index, node):
+        """The node moved (rewire), the KD-tree is rebuilt if it contains the node"""
+        self.positions[index] = node.x, node.y
+        if index < self.tree_size:
+            self._rebuild()
+
+    def _rebuild(self):
+        self.tree = cKDTree(self.positions[:self.size])
+        self.tree_size = self.size
+
+    def nearest(self, x, y):
+        """Index of the nearest node, of equally distant nodes the first one"""
+        best_index = -1
+        best_distance = float("inf")
+        if self.tree is not None:
+            _, best_index = self.tree.query((x, y))
+            best_distance = (self.positions[best_index, 0] - x) ** 2 + (self.positions[best_index, 1] - y) ** 2
+        if self.size > self.tree_size:
+            recent = self.positions[self.tree_size:self.size]
+            distances = (recent[:, 0] - x) ** 2 + (recent[:, 1] - y) ** 2
+            recent_index = int(np.argmin(distances))
+            if distances[recent_index] < best_distance:
+                best_index = self.tree_size + recent_index
+        return int(best_index)
+
+    def query_radius(self, x, y, radius):
+        """Sorted indices of the nodes at a distance of at most radius"""
+        indices = list()
+        if self.tree is not None:
+            indices = self.tree.query_ball_point((x, y), radius)
+        if self.size > self.tree_size:
+            recent = self.positions[self.tree_size:self.size]
+            distances = (recent[:, 0] - x) ** 2 + (recent[:, 1] - y) ** 2
+            indices += (np.flatnonzero(distances <= radius ** 2) + self.tree_size).tolist()
+        return sorted(indices)
+
+
 class RRT:
     """
     Class for RRT planning
@@ -53,7 +113,7 @@ class RRT:
         Setting Parameter
         start:Start Position [x,y]
         goal:Goal Position [x,y]
-        obstacleList:obstacle Positions [[x,y,size],...]
+        obstacleList:obstacle Positions [[x,y,size],...] or occupancy grid
         randArea:Random Sampling Area [min,max]
         play_area:stay inside this area [xmin,xmax,ymin,ymax]
         """
@@ -71,6 +131,17 @@ class RRT:
         self.max_iter = max_iter
         self.obstacle_list = obstacle_list
         self.node_list = []
+        self.nodes_index = NodesIndex()
+
+    def start_tree(self):
+        """Starts the tree from the start node"""
+        self.node_list = [self.start]
+        self.nodes_index = NodesIndex()
+        self.nodes_index.add(self.start)
+
+    def add_node(self, node):
+        self.node_list.append(node)
+        self.nodes_index.add(node)
 
     def planning(self, animation=True):
         """
@@ -78,17 +149,17 @@ class RRT:
         animation: flag for animation on or off
         """
 
-        self.node_list = [self.start]
+        self.start_tree()
         for i in range(self.max_iter):
             rnd_node = self.get_random_node()
-            nearest_ind = self.get_nearest_node_index(self.node_list, rnd_node)
+            nearest_ind = self.nodes_index.nearest(rnd_node.x, rnd_node.y)
             nearest_node = self.node_list[nearest_ind]
 
             new_node = self.steer(nearest_node, rnd_node, self.expand_dis)
 
             if self.check_if_outside_play_area(new_node, self.play_area) and \
                self.check_collision(new_node, self.obstacle_list):
-                self.node_list.append(new_node)
+                self.add_node(new_node)
 
             if animation and i % 5 == 0:
                 self.draw_graph(rnd_node)
@@ -229,17 +300,28 @@ class RRT:
 
     @staticmethod
     def check_collision(node, obstacleList):
+        """
+        obstacleList is a list of circles [[x,y,size],...] or an occupancy grid (np.ndarray of bool, see
+        utils/occupancy_grid) in the coordinates of the planner, points outside the grid collide
+        """
 
         if node is None:
             return False
 
-        for (ox, oy, size) in obstacleList:
-            dx_list = [ox - x for x in node.path_x]
-            dy_list = [oy - y for y in node.path_y]
-            d_list = [dx * dx + dy * dy for (dx, dy) in zip(dx_list, dy_list)]
-
-            if min(d_list) <= size**2:
+        if isinstance(obstacleList, np.ndarray):
+            cells_x = np.floor(node.path_x).astype(int)
+            cells_y = np.floor(node.path_y).astype(int)
+            width, height = obstacleList.shape
+            if cells_x.min() < 0 or cells_x.max() >= width or cells_y.min() < 0 or cells_y.max() >= height:
                 return False  # collision
+            return not obstacleList[cells_x, cells_y].any()
+
+        obstacles = np.asarray(obstacleList, dtype=np.float64).reshape(-1, 3)
+        # квадраты расстояний от всех препятствий до всех точек пути (препятствия x точки)
+        dx = obstacles[:, 0:1] - np.asarray(node.path_x)
+        dy = obstacles[:, 1:2] - np.asarray(node.path_y)
+        if np.any((dx * dx + dy * dy).min(axis=1, initial=np.inf) <= obstacles[:, 2] ** 2):
+            return False  # collision
 
         return True  # safe
 
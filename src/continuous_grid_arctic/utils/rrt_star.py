@@ -43,7 +43,7 @@ class RRTStar(RRT):
         Setting Parameter
         start:Start Position [x,y]
         goal:Goal Position [x,y]
-        obstacleList:obstacle Positions [[x,y,size],...]
+        obstacleList:obstacle Positions [[x,y,size],...] or occupancy grid
         randArea:Random Sampling Area [min,max]
         """
         super().__init__(start, goal, obstacle_list, rand_area, expand_dis,
@@ -51,6 +51,7 @@ class RRTStar(RRT):
         self.connect_circle_dist = connect_circle_dist
         self.goal_node = self.Node(goal[0], goal[1])
         self.search_until_max_iter = search_until_max_iter
+        self.goal_reachable = dict()
 
     def planning(self, animation=True):
         """
@@ -58,11 +59,12 @@ class RRTStar(RRT):
         animation: flag for animation on or off .
         """
 
-        self.node_list = [self.start]
+        self.start_tree()
+        # положение узла -> можно ли из него пройти к цели, путь к цели зависит только от положения узла
+        self.goal_reachable = dict()
         for i in range(self.max_iter):
-            print("Iter:", i, ", number of nodes:", len(self.node_list))
             rnd = self.get_random_node()
-            nearest_ind = self.get_nearest_node_index(self.node_list, rnd)
+            nearest_ind = self.nodes_index.nearest(rnd.x, rnd.y)
             new_node = self.steer(self.node_list[nearest_ind], rnd,
                                   self.expand_dis)
             near_node = self.node_list[nearest_ind]
@@ -76,9 +78,9 @@ class RRTStar(RRT):
                     new_node, near_inds)
                 if node_with_updated_parent:
                     self.rewire(node_with_updated_parent, near_inds)
-                    self.node_list.append(node_with_updated_parent)
+                    self.add_node(node_with_updated_parent)
                 else:
-                    self.node_list.append(new_node)
+                    self.add_node(new_node)
 
             if animation:
                 self.draw_graph(rnd)
@@ -89,8 +91,6 @@ class RRTStar(RRT):
                 if last_index is not None:
                     return self.generate_final_course(last_index)
 
-        print("reached max iteration")
-
         last_index = self.search_best_goal_node()
         if last_index is not None:
             return self.generate_final_course(last_index)
@@ -127,7 +127,7 @@ class RRTStar(RRT):
         min_cost = min(costs)
 
         if min_cost == float("inf"):
-            print("There is no good path.(min_cost is inf)")
+            # There is no good path
             return None
 
         min_ind = near_inds[costs.index(min_cost)]
@@ -137,18 +137,17 @@ class RRTStar(RRT):
         return new_node
 
     def search_best_goal_node(self):
-        dist_to_goal_list = [
-            self.calc_dist_to_goal(n.x, n.y) for n in self.node_list
-        ]
-        goal_inds = [
-            dist_to_goal_list.index(i) for i in dist_to_goal_list
-            if i <= self.expand_dis
-        ]
+        goal_inds = self.nodes_index.query_radius(self.end.x, self.end.y,
+                                                  self.expand_dis)
 
         safe_goal_inds = []
         for goal_ind in goal_inds:
-            t_node = self.steer(self.node_list[goal_ind], self.goal_node)
-            if self.check_collision(t_node, self.obstacle_list):
+            node = self.node_list[goal_ind]
+            if (node.x, node.y) not in self.goal_reachable:
+                t_node = self.steer(node, self.goal_node)
+                self.goal_reachable[(node.x, node.y)] = self.check_collision(
+                    t_node, self.obstacle_list)
+            if self.goal_reachable[(node.x, node.y)]:
                 safe_goal_inds.append(goal_ind)
 
         if not safe_goal_inds:
@@ -182,10 +181,7 @@ class RRTStar(RRT):
         # expand_dist
         if hasattr(self, 'expand_dis'):
             r = min(r, self.expand_dis)
-        dist_list = [(node.x - new_node.x)**2 + (node.y - new_node.y)**2
-                     for node in self.node_list]
-        near_inds = [dist_list.index(i) for i in dist_list if i <= r**2]
-        return near_inds
+        return self.nodes_index.query_radius(new_node.x, new_node.y, r)
 
     def rewire(self, new_node, near_inds):
         """
@@ -219,6 +215,7 @@ class RRTStar(RRT):
                 near_node.path_x = edge_node.path_x
                 near_node.path_y = edge_node.path_y
                 near_node.parent = edge_node.parent
+                self.nodes_index.update(i, near_node)
                 self.propagate_cost_to_leaves(new_node)
 
     def calc_new_cost(self, from_node, to_node):
@@ -0,0 +1,78 @@
+import os
+import pickle
+import random
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# версия формата сценария, меняется при изменении генерации, чтобы не использовать старые файлы кэша
+SCENARIO_FORMAT_VERSION = 1
+
+
+def scenario_key(parameters):
+    """
+    Key of the scenario generated from the current state of the random generators (random and np.random) with the
+    given generation parameters. After seed(value) the state is determined by the value, so the key is determined
+    by the seed.
+
+    :param parameters (tuple):
+        parameters of the environment that affect the generation of the scenario
+    :return: hex string
+    """
+    state = (SCENARIO_FORMAT_VERSION, parameters, random.getstate(), np.random.get_state())
+    return hashlib.sha1(pickle.dumps(state, protocol=4)).hexdigest()
+
+
+class ScenarioCache:
+    def __init__(self, max_size=1000, cache_dir=None):
+        """
+        Cache of generated scenarios (robots start positions, obstacles, finish points, the leader route) together
+        with the state of the random generators after the generation. The last max_size scenarios are kept in memory,
+        if cache_dir is set, all scenarios are also saved to disk and can be shared between processes and runs.
+
+        :param max_size (int):
+            number of scenarios kept in memory
+        :param cache_dir (str):
+            directory for the scenario files; None -- memory only
+        """
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.scenarios = OrderedDict()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "{}.pkl".format(key))
+
+    def get(self, key):
+        """Returns the scenario or None if it is not in the cache"""
+        if key in self.scenarios:
+            self.scenarios.move_to_end(key)
+            return self.scenarios[key]
+        if self.cache_dir is None or not os.path.exists(self._path(key)):
+            return None
+        with open(self._path(key), "rb") as scenario_file:
+            scenario = pickle.load(scenario_file)
+        self._remember(key, scenario)
+        return scenario
+
+    def put(self, key, scenario):
+        self._remember(key, scenario)
+        if self.cache_dir is not None:
+            # запись через временный файл, чтобы другие процессы не прочитали недописанный сценарий
+            tmp_path = "{}.{}.tmp".format(self._path(key), os.getpid())
+            with open(tmp_path, "wb") as scenario_file:
+                pickle.dump(scenario, scenario_file, protocol=4)
+            os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key, scenario):
+        if self.max_size <= 0:
+            return
+        self.scenarios[key] = scenario
+        self.scenarios.move_to_end(key)
+        while len(self.scenarios) > self.max_size:
+            self.scenarios.popitem(last=False)
+
+    def clear(self):
+        self.scenarios.clear()
@@ -0,0 +1,171 @@
+import json
+import argparse
+import multiprocessing
+
+import numpy as np
+
+
+def scenario_parameters_id(parameters):
+    """String id of the generation parameters (Game._scenario_parameters), used to check that a pack fits the env"""
+    return json.dumps(list(parameters))
+
+
+def save_scenario_pack(path, scenarios, seeds, parameters):
+    """
+    Saves scenarios to a npz file by columns: fixed-size fields are stored as arrays (N, ...), obstacles and
+    trajectories of all scenarios are concatenated, their bounds are stored in the *_offsets arrays (N + 1).
+
+    :param path (str):
+        path to the npz file
+    :param scenarios (list of dict):
+        scenarios in the format of Game._scenario_state
+    :param seeds (list of int):
+        seeds with which the scenarios were generated
+    :param parameters (tuple):
+        generation parameters (Game._scenario_parameters)
+    """
+    obstacles = [np.asarray(scenario["obstacles_positions"], dtype=np.float32).reshape(-1, 2) for scenario in scenarios]
+    trajectories = [np.asarray(scenario["trajectory"]).reshape(-1, 2) for scenario in scenarios]
+    np.savez(path,
+             parameters=np.array(scenario_parameters_id(parameters)),
+             seeds=np.asarray(seeds, dtype=np.int64),
+             leader_start_position=np.array([scenario["leader_start_position"] for scenario in scenarios],
+                                            dtype=np.float64).reshape(-1, 2),
+             follower_start_distance=np.array([scenario["follower_start_distance"] for scenario in scenarios],
+                                              dtype=np.int64),
+             finish_points=np.array([scenario["finish_points"] for scenario in scenarios]),
+             found_target_point=np.array([scenario["found_target_point"] for scenario in scenarios], dtype=bool),
+             obstacles_positions=np.concatenate(obstacles) if obstacles else np.zeros((0, 2), dtype=np.float32),
+             obstacles_offsets=np.cumsum([0] + [len(positions) for positions in obstacles]),
+             trajectory=np.concatenate(trajectories) if trajectories else np.zeros((0, 2)),
+             trajectory_offsets=np.cumsum([0] + [len(trajectory) for trajectory in trajectories]))
+
+
+class ScenarioPack:
+    def __init__(self, path):
+        """
+        Scenarios pre-generated by save_scenario_pack (see the command line interface of this module).
+        pack[i] returns the scenario in the format of Game._scenario_state without the random generators state.
+
+        :param path (str):
+            path to the npz file
+        """
+        with np.load(path) as data:
+            self.columns = {name: data[name] for name in data.files}
+        self.parameters = str(self.columns["parameters"])
+        self.seeds = self.columns["seeds"]
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def __getitem__(self, index):
+        columns = self.columns
+        obstacles_slice = slice(columns["obstacles_offsets"][index], columns["obstacles_offsets"][index + 1])
+        trajectory_slice = slice(columns["trajectory_offsets"][index], columns["trajectory_offsets"][index + 1])
+        # значения приводятся к типам python, как у сгенерированного сценария
+        return {"leader_start_position": columns["leader_start_position"][index].tolist(),
+                "follower_start_distance": int(columns["follower_start_distance"][index]),
+                "obstacles_positions": columns["obstacles_positions"][obstacles_slice].tolist(),
+                "finish_points": [tuple(point) for point in columns["finish_points"][index].tolist()],
+                "trajectory": [tuple(point) for point in columns["trajectory"][trajectory_slice].tolist()],
+                "found_target_point": bool(columns["found_target_point"][index])}
+
+
+# среда процесса-генератора, создаётся один раз на процесс
+_worker_env = None
+
+
+def _init_worker(game_kwargs):
+    global _worker_env
+    # импорт внутри функции: модуль среды сам импортирует этот модуль
+    try:
+        from continuous_grid_arctic.follow_the_leader_continuous_env import Game
+    except:
+        from src.continuous_grid_arctic.follow_the_leader_continuous_env import Game
+    _worker_env = Game(**dict(game_kwargs, headless=True))
+
+
+def _generate_scenario(seed):
+    """Generates the scenario with the seed in the same way as reset() does"""
+    _worker_env.seed(seed)
+    _worker_env.game_object_list = list()
+    _worker_env.found_target_point = False
+    _worker_env._generate_scenario()
+    scenario = _worker_env._scenario_state()
+    del scenario["random_state"], scenario["np_random_state"]
+    return seed, scenario
+
+
+def generate_scenario_pack(path, scenarios_number, game_kwargs=None, processes=None, start_seed=0,
+                           keep_failed=False, max_seeds=None):
+    """
+    Generates scenarios for the seeds start_seed, start_seed + 1, ... in parallel and saves them to path.
+
+    :param path (str):
+        path to the npz file
+    :param scenarios_number (int):
+        number of scenarios in the pack
+    :param game_kwargs (dict):
+        parameters of Game, the pack can be used only by environments with the same generation parameters
+    :param processes (int):
+        number of processes; None -- number of cores
+    :param start_seed (int):
+        first seed
+    :param keep_failed (bool):
+        keep scenarios where the route to the finish point was not found
+    :param max_seeds (int):
+        maximum number of seeds to try, RuntimeError is raised if they give less than scenarios_number scenarios;
+        None -- 10 * scenarios_number
+    :return: number of seeds that were tried
+    """
+    game_kwargs = game_kwargs or {}
+    processes = processes or multiprocessing.cpu_count()
+    max_seeds = max_seeds or 10 * scenarios_number
+    scenarios = list()
+    seeds = list()
+    next_seed = start_seed
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(game_kwargs,)) as pool:
+        while len(scenarios) < scenarios_number:
+            # сиды пачками, чтобы не генерировать много лишних сценариев в конце
+            batch_size = min(4 * processes, 2 * (scenarios_number - len(scenarios)),
+                             start_seed + max_seeds - next_seed)
+            if batch_size <= 0:
+                raise RuntimeError("{} of {} scenarios with the found route in {} seeds, check the planner "
+                                   "parameters or use keep_failed".format(len(scenarios), scenarios_number, max_seeds))
+            batch = range(next_seed, next_seed + batch_size)
+            next_seed += batch_size
+            for seed, scenario in pool.imap(_generate_scenario, batch):
+                if (keep_failed or scenario["found_target_point"]) and len(scenarios) < scenarios_number:
+                    scenarios.append(scenario)
+                    seeds.append(seed)
+        parameters = pool.apply(_scenario_parameters)
+    save_scenario_pack(path, scenarios, seeds, parameters)
+    return next_seed - start_seed
+
+
+def _scenario_parameters():
+    return _worker_env._scenario_parameters()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generates scenarios (obstacles, robots start positions, "
+                                                 "finish points and the leader route) for Game(scenario_pack=...)")
+    parser.add_argument("output", type=str, help="path to the npz file")
+    parser.add_argument("--number", type=int, default=1000, help="number of scenarios")
+    parser.add_argument("--processes", type=int, default=None, help="number of processes, by default all cores")
+    parser.add_argument("--start_seed", type=int, default=0, help="seed of the first scenario")
+    parser.add_argument("--env_config", type=str, default=None,
+                        help="json file with Game parameters, the generation parameters must match the training env")
+    parser.add_argument("--keep_failed", action="store_true",
+                        help="keep scenarios where the route to the finish point was not found")
+    parser.add_argument("--max_seeds", type=int, default=None,
+                        help="maximum number of seeds to try, by default 10 * number")
+    args = parser.parse_args()
+
+    env_config = {}
+    if args.env_config is not None:
+        with open(args.env_config) as config_file:
+            env_config = json.load(config_file)
+    tried = generate_scenario_pack(args.output, args.number, env_config, args.processes, args.start_seed,
+                                   args.keep_failed, args.max_seeds)
+    print("{} scenarios saved to {}, {} seeds tried".format(args.number, args.output, tried))
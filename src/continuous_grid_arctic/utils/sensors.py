@@ -3,12 +3,17 @@ import numpy as np
 import pygame
 from scipy.spatial import distance
 from collections import deque
-import itertools
 
 try:
-    from continuous_grid_arctic.utils.misc import angle_correction, rotateVector, calculateAngle, distance_to_rect, areDotsOnLeft
+    from continuous_grid_arctic.utils.misc import angle_correction, rotateVector, calculateAngle, areDotsOnLeft
+    from continuous_grid_arctic.utils.misc import rects_to_array, distance_to_rects, rays_first_sample_hits, \
+        rays_rects_intersection, lasers_segments_intersection
+    from continuous_grid_arctic.utils.ring_buffer import SlidingBuffer, CorridorBuffer
 except:
-    from src.continuous_grid_arctic.utils.misc import angle_correction, rotateVector, calculateAngle, distance_to_rect, areDotsOnLeft
+    from src.continuous_grid_arctic.utils.misc import angle_correction, rotateVector, calculateAngle, areDotsOnLeft
+    from src.continuous_grid_arctic.utils.misc import rects_to_array, distance_to_rects, rays_first_sample_hits, \
+        rays_rects_intersection, lasers_segments_intersection
+    from src.continuous_grid_arctic.utils.ring_buffer import SlidingBuffer, CorridorBuffer
 
 import pandas as pd
 
@@ -20,6 +25,8 @@ class LaserSensor():
     Implements laser lidar
     The number of rays, the angle between them, the covered sector, and the frequency of “points” are set.
     scan() returns points that are not covered by obstacles, reacts to everything with hitboxes (leader, rocks, bears, river)
+    All rays are processed at once as arrays; with exact_hits=True the hit point is the exact intersection of the ray
+    with the hitbox instead of the first of points_number samples inside it.
     """
 
     def __init__(self,
@@ -34,11 +41,13 @@ class LaserSensor():
                  sensor_speed=0.1,
                  return_all_points=False,
                  add_noise=False,
-                 return_only_distances=False
+                 return_only_distances=False,
+                 exact_hits=False
                  ):  # в секундах? Пока не используется
 
         self.host_object = host_object
         self.return_only_distances = return_only_distances
+        self.exact_hits = exact_hits
 
         self.available_angle = min(360, available_angle)
         self.angle_step = angle_step
@@ -71,17 +80,16 @@ class LaserSensor():
         """
 
         # Если на нужной дистанции нет ни одного объекта - просто рисуем крайние точки, иначе нужно будет идти сложным путём
-        objects_in_range = list()
-
         env_range = self.range * env.PIXELS_TO_METER
 
-        for cur_object in (env.game_object_list + env.game_dynamic_list):
-            if cur_object is env.follower:
-                continue
-
-            if cur_object.blocks_vision:
-                if distance_to_rect(self.host_object.position, cur_object) <= env_range + (3 * env.PIXELS_TO_METER):
-                    objects_in_range.append(cur_object)
+        search_range = env_range + (3 * env.PIXELS_TO_METER)
+        candidates = [cur_object for cur_object in (env.obstacles_index.query_radius(self.host_object.position,
+                                                                                      search_range) +
+                                                    env.game_dynamic_list)
+                      if cur_object is not env.follower and cur_object.blocks_vision]
+        candidates_distances = distance_to_rects(self.host_object.position, rects_to_array(candidates))
+        objects_in_range = [cur_object for cur_object, cur_distance in zip(candidates, candidates_distances)
+                            if cur_distance <= search_range]
 
         # Далее определить, в какой стороне находится объект из списка, и если он входит в область лидара, ставить точку как надо
         # иначе -- просто ставим точку на максимуме
@@ -103,33 +111,35 @@ class LaserSensor():
             angles.append(angle_correction(-self.host_object.direction + cur_angle_diff))
             angles.append(angle_correction(-self.host_object.direction - cur_angle_diff))
 
-        for angle in angles:
-
-            x2, y2 = (x1 + env_range * cos(radians(angle)), y1 - env_range * sin(radians(angle)))
-
-            point_to_add = None
-            object_in_sight = False
-
-            for i in range(0, self.points_number):
-                u = i / self.points_number
-                cur_point = ((x2 * u + x1 * (1 - u)), (y2 * u + y1 * (1 - u)))
-
-                if self.return_all_points:
-                    self.sensed_points.append(cur_point)
-                for cur_object in objects_in_range:
-                    if cur_object.rectangle.collidepoint(cur_point):
-                        point_to_add = np.array(cur_point, dtype=np.float32)
-                        object_in_sight = True
-                        break
-
-                if object_in_sight:
-                    break
-
-            if point_to_add is None:
-                point_to_add = np.array((x2, y2), dtype=np.float32)
+        start_point = np.array((x1, y1), dtype=np.float64)
+        end_points = np.array([(x1 + env_range * cos(radians(angle)), y1 - env_range * sin(radians(angle)))
+                               for angle in angles], dtype=np.float64)
+        rects = rects_to_array(objects_in_range)
+
+        samples, first_hits = rays_first_sample_hits(start_point, end_points, self.points_number, rects)
+        if self.exact_hits:
+            hit_fractions = rays_rects_intersection(start_point, end_points, rects)
+            hit_points = start_point + (end_points - start_point) * hit_fractions[:, np.newaxis]
+            # точки до точного пересечения, сама точка пересечения -- последней
+            samples_before_hit = (np.arange(self.points_number) / self.points_number)[np.newaxis, :] < \
+                hit_fractions[:, np.newaxis]
+            ray_hits = hit_fractions < 1
+        else:
+            hit_points = samples[np.arange(len(angles)), np.maximum(first_hits, 0)]
+            samples_before_hit = np.arange(self.points_number)[np.newaxis, :] <= first_hits[:, np.newaxis]
+            ray_hits = first_hits >= 0
 
-            if not self.return_all_points:
-                self.sensed_points.append(point_to_add)
+        if self.return_all_points:
+            self.sensed_points = list()
+            for ray_id in range(len(angles)):
+                if not ray_hits[ray_id]:
+                    self.sensed_points.extend(map(tuple, samples[ray_id]))
+                    continue
+                self.sensed_points.extend(map(tuple, samples[ray_id][samples_before_hit[ray_id]]))
+                if self.exact_hits:
+                    self.sensed_points.append(tuple(hit_points[ray_id]))
+        else:
+            self.sensed_points = np.where(ray_hits[:, np.newaxis], hit_points, end_points).astype(np.float32)
 
         if self.return_only_distances:
             return np.linalg.norm(self.sensed_points - self.host_object.position, axis=1)
@@ -165,12 +175,13 @@ class LeaderPositionsTracker:
         self.host_object = host_object
         self.max_point = max_point
         self.eat_close_points = eat_close_points
-        # TODO: попробовать реализовать как ndarray, может быстрее будет, потому что другие сенсоры это как ndarray используют
-        self.leader_positions_hist = deque()
+        # позиции лидера в массиве float32, другие сенсоры берут из него срезы без копирования
+        self.leader_positions_hist = SlidingBuffer((2,), np.float32)
         self.saving_period = saving_period
         self.saving_counter = 0
         self.generate_corridor = generate_corridor
-        self.corridor = deque()
+        # пары точек границ [правая, левая] вместе с готовыми стенами коридора
+        self.corridor = CorridorBuffer()
         self.right_border_dot = np.array([0, 0])
         self.left_border_dot = np.array([0, 0])
         self.start_corridor_behind_follower = start_corridor_behind_follower
@@ -205,10 +216,8 @@ class LeaderPositionsTracker:
         self.saving_counter += 1
 
         if self.eat_close_points and len(self.leader_positions_hist) > 0:
-            norms = np.linalg.norm(np.array(self.leader_positions_hist) - self.host_object.position, axis=1)
-            indexes = np.nonzero(norms <= max(self.host_object.width, self.host_object.height))[0]
-            for index in sorted(indexes, reverse=True):
-                del self.leader_positions_hist[index]
+            norms = np.linalg.norm(self.leader_positions_hist.view - self.host_object.position, axis=1)
+            self.leader_positions_hist.remove(norms <= max(self.host_object.width, self.host_object.height))
         if self.generate_corridor:
             return self.leader_positions_hist, self.corridor
         else:
@@ -238,6 +247,9 @@ class LeaderPositionsTracker_v2(LeaderPositionsTracker):
     def __init__(self, *args, corridor_width, corridor_length, **kwargs):
         self.corridor_width = corridor_width
         self.corridor_length = corridor_length
+        # длины отрезков между соседними точками истории и их сумма, обновляются при добавлении и удалении точек
+        self.segments_lengths = deque()
+        self.path_length = 0.
         super(LeaderPositionsTracker_v2, self).__init__(*args, **kwargs)
 
     def scan(self, env):
@@ -265,36 +277,27 @@ class LeaderPositionsTracker_v2(LeaderPositionsTracker):
                         distance.euclidean(point_behind_follower, env.leader.position) / (
                                 self.saving_period * 5 * env.leader.max_speed))
 
-                    self.leader_positions_hist.extend(np.array(x) for x in
-                                                      zip(np.linspace(point_behind_follower[0], env.leader.position[0],
-                                                                      first_dots_for_follower_count),
-                                                          np.linspace(point_behind_follower[1], env.leader.position[1],
-                                                                      first_dots_for_follower_count)))
+                    self.leader_positions_hist.extend(np.linspace(point_behind_follower, env.leader.position,
+                                                                  first_dots_for_follower_count))
                 # TODO : вариант с отсроением коридора от точки ведомого
                 else:
                     first_dots_for_follower_count = int(
                         distance.euclidean(self.host_object.position, env.leader.position) / (
                                 self.saving_period * 5 * env.leader.max_speed))
-                    self.leader_positions_hist.extend(np.array(x) for x in
-                                                      zip(np.linspace(self.host_object.position[0],
-                                                                      env.leader.position[0],
-                                                                      first_dots_for_follower_count),
-                                                          np.linspace(self.host_object.position[1],
-                                                                      env.leader.position[1],
-                                                                      first_dots_for_follower_count)))
+                    self.leader_positions_hist.extend(np.linspace(self.host_object.position, env.leader.position,
+                                                                  first_dots_for_follower_count))
             else:
                 self.leader_positions_hist.append(env.leader.position.copy())
 
-            dists = np.linalg.norm(np.array(self.leader_positions_hist)[:-1, :] -
-                                   np.array(self.leader_positions_hist)[1:, :], axis=1)
-            path_length = np.sum(dists)
+            self._add_segments_lengths()
             # while path_length > env.max_distance:
-            while path_length > self.corridor_length:
+            while self.path_length > self.corridor_length:
                 self.leader_positions_hist.popleft()
                 self.corridor.popleft()
-                dists = np.linalg.norm(np.array(self.leader_positions_hist)[:-1, :] -
-                                       np.array(self.leader_positions_hist)[1:, :], axis=1)
-                path_length = np.sum(dists)
+                self.path_length -= self.segments_lengths.popleft()
+                if len(self.segments_lengths) == 0:
+                    # без накопленной ошибки округления
+                    self.path_length = 0.
 
             if self.generate_corridor and len(self.leader_positions_hist) > 1:
                 if self.saving_counter == 0:
@@ -326,6 +329,18 @@ class LeaderPositionsTracker_v2(LeaderPositionsTracker):
         else:
             return self.leader_positions_hist
 
+    def _add_segments_lengths(self):
+        """Adds the lengths of the segments to the points appended to the history since the last call"""
+        for i in range(len(self.leader_positions_hist) - 1 - len(self.segments_lengths), 0, -1):
+            segment_length = np.linalg.norm(self.leader_positions_hist[-i] - self.leader_positions_hist[-i - 1])
+            self.segments_lengths.append(segment_length)
+            self.path_length += segment_length
+
+    def reset(self):
+        super(LeaderPositionsTracker_v2, self).reset()
+        self.segments_lengths.clear()
+        self.path_length = 0.
+
     def show(self, env):
         for point in self.leader_positions_hist:
             pygame.draw.circle(env.gameDisplay, (80, 10, 10), point, 3)
@@ -365,16 +380,8 @@ class LeaderTrackDetector_vector:
     def scan(self, env, leader_positions_hist):
         self.vecs_values = np.zeros((self.position_sequence_length, 2), dtype=np.float32)
         if len(leader_positions_hist) > 0:
-            if self.detectable_positions == "new":
-                # vecs = np.array(leader_positions_hist[-self.position_sequence_length:]) - self.host_object.position
-                slice = list(itertools.islice(leader_positions_hist, max(0, len(leader_positions_hist) -
-                                                                         self.position_sequence_length),
-                                              len(leader_positions_hist)))
-                vecs = np.array(slice) - self.host_object.position
-            elif self.detectable_positions == "old":
-                # vecs = np.array(leader_positions_hist[:self.position_sequence_length]) - self.host_object.position
-                slice = list(itertools.islice(leader_positions_hist, 0, self.position_sequence_length))
-                vecs = np.array(slice) - self.host_object.position
+            vecs = _positions_window(leader_positions_hist, self.detectable_positions,
+                                     self.position_sequence_length) - self.host_object.position
             self.vecs_values[
             :min(len(leader_positions_hist), self.position_sequence_length)] = vecs
         return self.vecs_values
@@ -436,55 +443,61 @@ class LeaderTrackDetector_radar:
         if len(leader_positions_hist) > 0:
 
             if self.detectable_positions == "near":
-                leader_positions_hist = np.array(leader_positions_hist)
+                leader_positions_hist = _positions_window(leader_positions_hist, self.detectable_positions,
+                                                          self.position_sequence_length)
                 vecs_follower_to_leadhistory = leader_positions_hist - self.host_object.position
                 distances_follower_to_chosenDots = np.linalg.norm(vecs_follower_to_leadhistory, axis=1)
                 closest_indexes = np.argsort(distances_follower_to_chosenDots)
                 vecs_follower_to_leadhistory = vecs_follower_to_leadhistory[closest_indexes]
                 distances_follower_to_chosenDots = distances_follower_to_chosenDots[closest_indexes]
             else:
-                if self.detectable_positions == "new":
-                    # chosen_dots = np.array(leader_positions_hist[-self.position_sequence_length:])
-                    slice = list(itertools.islice(leader_positions_hist, max(0, len(leader_positions_hist) -
-                                                                             self.position_sequence_length),
-                                                  len(leader_positions_hist)))
-                    chosen_dots = np.array(slice)
-                elif self.detectable_positions == "old":
-                    # chosen_dots = np.array(leader_positions_hist[:self.position_sequence_length])
-                    slice = list(itertools.islice(leader_positions_hist, 0, self.position_sequence_length))
-                    chosen_dots = np.array(slice)
+                chosen_dots = _positions_window(leader_positions_hist, self.detectable_positions,
+                                                self.position_sequence_length)
                 vecs_follower_to_leadhistory = chosen_dots - self.host_object.position
                 distances_follower_to_chosenDots = np.linalg.norm(vecs_follower_to_leadhistory, axis=1)
             angles_history_to_dir = calculateAngle(vecs_follower_to_leadhistory, followerDirVec)
             angles_history_to_right = calculateAngle(vecs_follower_to_leadhistory, followerRightVec)
             angles_history_to_right[angles_history_to_dir > np.pi / 2] = -angles_history_to_right[
                 angles_history_to_dir > np.pi / 2]
-            for i in range(self.radar_sectors_number):
-                sector_dots_distances = distances_follower_to_chosenDots[
-                    (angles_history_to_right >= self.sectorsAngle_rad * i) & (
-                            angles_history_to_right < self.sectorsAngle_rad * (i + 1))]
-                if len(sector_dots_distances) > 0:
-                    self.radar_values[i] = np.min(sector_dots_distances)
+            sectors = self._sectors(angles_history_to_right)
+            in_radar = (sectors >= 0) & (sectors < self.radar_sectors_number)
+            # минимальное расстояние в каждом секторе за один проход по точкам
+            min_distances = np.full(self.radar_sectors_number, np.inf)
+            np.minimum.at(min_distances, sectors[in_radar], distances_follower_to_chosenDots[in_radar])
+            seen_sectors = np.isfinite(min_distances)
+            self.radar_values[seen_sectors] = min_distances[seen_sectors]
         return self.radar_values
 
+    def _sectors(self, angles):
+        """
+        Sector of each angle: i such that sectorsAngle_rad * i <= angle < sectorsAngle_rad * (i + 1);
+        -1 for angles that are not numbers
+        """
+        finite = np.isfinite(angles)
+        angles = np.where(finite, angles, 0)
+        sectors = np.floor(angles / self.sectorsAngle_rad).astype(int)
+        # деление округляется, поэтому на границах секторов номер уточняется теми же сравнениями, что и границы
+        sectors -= angles < self.sectorsAngle_rad * sectors
+        sectors += angles >= self.sectorsAngle_rad * (sectors + 1)
+        sectors[~finite] = -1
+        return sectors
+
     def reset(self):
         self.radar_values = np.zeros(self.radar_sectors_number, dtype=np.float32)
 
     def show(self, env):
-        for i in range(self.radar_values.shape[0]):
-            followerRightDir = self.host_object.direction + 90
-            if followerRightDir >= 360:
-                followerRightDir -= 360
+        followerRightDir = self.host_object.direction + 90
+        if followerRightDir >= 360:
+            followerRightDir -= 360
 
-            for i in range(self.radar_sectors_number):
-                if self.radar_values[i] == 0:
-                    continue
-                followerRightVec = rotateVector(np.array([self.radar_values[i], 0]), followerRightDir)
-                relativeDot = rotateVector(followerRightVec, self.sectorsAngle_deg * (self.radar_sectors_number - i) - (
-                        self.sectorsAngle_deg / 2))
-                absDot = self.host_object.position - relativeDot
-                pygame.draw.line(env.gameDisplay, (180, 80, 255), self.host_object.position, absDot, 3)
-                # pygame.draw.circle(env.gameDisplay, (255, 80, 180), absDot, 4)
+        sectors = np.flatnonzero(self.radar_values)
+        # направление на середину сектора: поворот вектора вправо от ведомого на угол сектора
+        angles = np.radians(followerRightDir + self.sectorsAngle_deg * (self.radar_sectors_number - sectors) -
+                            self.sectorsAngle_deg / 2)
+        relativeDots = self.radar_values[sectors, np.newaxis] * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        for absDot in self.host_object.position - relativeDots:
+            pygame.draw.line(env.gameDisplay, (180, 80, 255), self.host_object.position, absDot, 3)
+            # pygame.draw.circle(env.gameDisplay, (255, 80, 180), absDot, 4)
 
 
 class GreenBoxBorderSensor(LaserSensor):
@@ -639,15 +652,29 @@ class LeaderCorridor_lasers:
         num = np.sum(np.multiply(dap, dp), axis=1)
         return (num[:, np.newaxis] / denom) * db + b1
 
+    def _nearest_collides(self, origin, obstacle_lines):
+        """
+        Points where the lasers from the origin cross the nearest obstacle line (the end of the laser if there is
+        no crossing) and indices of these lines (-1 if none), for all lasers at once.
+
+        :param origin (np.array):
+            start point of the lasers
+        :param obstacle_lines (np.array):
+            lines (M, 2, 2) or history of lines (H, M, 2, 2) padded with NaN
+        """
+        ends = np.array(self.lasers_end_points, dtype=np.float64).reshape(-1, 2)
+        lasers = np.stack((np.broadcast_to(np.asarray(origin, dtype=np.float64), ends.shape), ends), axis=1)
+        distances, points, lines_ids = lasers_segments_intersection(lasers, obstacle_lines)
+        collides = np.where(np.isfinite(distances)[..., np.newaxis], points, ends)
+        return collides, lines_ids
+
     def collect_obstacle_edges(self, env, corridor):
         obstacle_lines = list()
         if self.react_to_safe_corridor:
-            for i in range(len(corridor) - 1):
-                obstacle_lines.append([corridor[i][0], corridor[i + 1][0]])
-                obstacle_lines.append([corridor[i][1], corridor[i + 1][1]])
+            # правая и левая стена каждого участка коридора по очереди
+            obstacle_lines.append(_corridor_walls(corridor).reshape(-1, 2, 2))
         if self.react_to_green_zone:
-            obstacle_lines.append([corridor[0][0], corridor[0][1]])
-            obstacle_lines.append([corridor[-1][0], corridor[-1][1]])
+            obstacle_lines.append([[corridor[0][0], corridor[0][1]], [corridor[-1][0], corridor[-1][1]]])
         if self.react_to_obstacles != False:
             # TODO : проверка списка динам препятствий
             if self.react_to_obstacles == "dynamic":
@@ -661,16 +688,19 @@ class LeaderCorridor_lasers:
             else:
                 ValueError("You need to specify which obstacles the sensor should respond to. Set "
                            "react_to_obstacles equal to one of the values: True, 'all', 'dynamic', 'static'")
+            obstacles_edges = list()
             for cur_object in (obstacles_list):
                 if cur_object is env.follower:
                     continue
                 if cur_object.blocks_vision:
-                    obstacle_lines.append([cur_object.rectangle.bottomleft, cur_object.rectangle.bottomright])
-                    obstacle_lines.append([cur_object.rectangle.topright, cur_object.rectangle.bottomright])
-                    obstacle_lines.append([cur_object.rectangle.topright, cur_object.rectangle.topleft])
-                    obstacle_lines.append([cur_object.rectangle.bottomleft, cur_object.rectangle.topleft])
-        obstacle_lines = np.array(obstacle_lines, dtype=np.float32)
-        return obstacle_lines
+                    obstacles_edges.append([cur_object.rectangle.bottomleft, cur_object.rectangle.bottomright])
+                    obstacles_edges.append([cur_object.rectangle.topright, cur_object.rectangle.bottomright])
+                    obstacles_edges.append([cur_object.rectangle.topright, cur_object.rectangle.topleft])
+                    obstacles_edges.append([cur_object.rectangle.bottomleft, cur_object.rectangle.topleft])
+            obstacle_lines.append(np.array(obstacles_edges, dtype=np.float64).reshape(-1, 2, 2))
+        if len(obstacle_lines) == 0:
+            return np.zeros((0, 2, 2), dtype=np.float32)
+        return np.concatenate(obstacle_lines, dtype=np.float32)
 
     def scan(self, env, corridor):
         self.lasers_collides = []
@@ -697,32 +727,10 @@ class LeaderCorridor_lasers:
                                                          self.host_object.direction + 150))
         if len(corridor) > 1:
             corridor_lines = self.collect_obstacle_edges(env, corridor)
-            lasers_values = []
-            self.lasers_collides = []
-            for laser_end_point in self.lasers_end_points:
-                # эта функция не работает с коллинеарными
-                # есть вариант лучше, но медленней
-                # https://www.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
-                rez = LeaderCorridor_lasers.intersect(corridor_lines[:, 0, :], corridor_lines[:, 1, :],
-                                                      np.array([self.host_object.position]),
-                                                      np.array([laser_end_point]))
-                intersected_line = corridor_lines[rez]
-                if len(intersected_line) > 0:
-                    x = LeaderCorridor_lasers.seg_intersect(intersected_line[:, 0, :], intersected_line[:, 1, :],
-                                                            np.array([self.host_object.position]),
-                                                            np.array([laser_end_point]))
-                    # TODO: исключить коллинеарные, вместо их точек пересечения добавить ближайшую точку коллинеарной границы
-                    # но это бесполезно при использовании функции intersect, которая не работает с коллинеарными
-                    exclude_rows = np.concatenate([np.nonzero(np.isinf(x))[0], np.nonzero(np.isnan(x))[0]])
-                    norms = np.linalg.norm(x - self.host_object.position, axis=1)
-                    lasers_values.append(np.min(norms))
-                    closest_dot_idx = np.argmin(np.linalg.norm(x - self.host_object.position, axis=1))
-                    self.lasers_collides.append(x[closest_dot_idx])
-                else:
-                    self.lasers_collides.append(laser_end_point)
+            self.lasers_collides = list(self._nearest_collides(self.host_object.position, corridor_lines)[0])
         obs = np.ones(self.front_lasers_count + self.back_lasers_count, dtype=np.float32) * self.laser_length
-        for i, collide in enumerate(self.lasers_collides):
-            obs[i] = np.linalg.norm(collide - self.host_object.position)
+        if len(self.lasers_collides) > 0:
+            obs[:] = np.linalg.norm(np.array(self.lasers_collides) - self.host_object.position, axis=1)
         return obs
 
     def show(self, env):
@@ -778,32 +786,10 @@ class LeaderCorridor_lasers_v2(LeaderCorridor_lasers):
 
         if len(corridor) > 1:
             corridor_lines = self.collect_obstacle_edges(env, corridor)
-            lasers_values = []
-            self.lasers_collides = []
-            for laser_end_point in self.lasers_end_points:
-                # эта функция не работает с коллинеарными
-                # есть вариант лучше, но медленней
-                # https://www.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
-                rez = LeaderCorridor_lasers.intersect(corridor_lines[:, 0, :], corridor_lines[:, 1, :],
-                                                      np.array([self.host_object.position]),
-                                                      np.array([laser_end_point]))
-                intersected_line = corridor_lines[rez]
-                if len(intersected_line) > 0:
-                    x = LeaderCorridor_lasers.seg_intersect(intersected_line[:, 0, :], intersected_line[:, 1, :],
-                                                            np.array([self.host_object.position]),
-                                                            np.array([laser_end_point]))
-                    # TODO: исключить коллинеарные, вместо их точек пересечения добавить ближайшую точку коллинеарной границы
-                    # но это бесполезно при использовании функции intersect, которая не работает с коллинеарными
-                    exclude_rows = np.concatenate([np.nonzero(np.isinf(x))[0], np.nonzero(np.isnan(x))[0]])
-                    norms = np.linalg.norm(x - self.host_object.position, axis=1)
-                    lasers_values.append(np.min(norms))
-                    closest_dot_idx = np.argmin(np.linalg.norm(x - self.host_object.position, axis=1))
-                    self.lasers_collides.append(x[closest_dot_idx])
-                else:
-                    self.lasers_collides.append(laser_end_point)
+            self.lasers_collides = list(self._nearest_collides(self.host_object.position, corridor_lines)[0])
         obs = np.ones(self.lasers_count, dtype=np.float32) * self.laser_length
-        for i, collide in enumerate(self.lasers_collides):
-            obs[i] = np.linalg.norm(collide - self.host_object.position)
+        if len(self.lasers_collides) > 0:
+            obs[:] = np.linalg.norm(np.array(self.lasers_collides) - self.host_object.position, axis=1)
         return obs
 
 
@@ -895,71 +881,25 @@ class LeaderCorridor_Prev_lasers_v2(LeaderCorridor_lasers_v2):
             # Сейчас в истории хранятся все грани препятствий, а не только пересеченные
             self.history_obstacles_list.pop(0)
             self.history_obstacles_list.append(corridor_lines)
+            all_obs_arr = self._history_observation(self.host_object.position)
+        return all_obs_arr
 
-            all_obs_list = []
-
-            for j, corridor_lines_item in enumerate(self.history_obstacles_list):
-
-                corridor_lines_item = np.array(corridor_lines_item)
-
-                lasers_values_item = []
-                self.lasers_collides_item = []
-                for laser_end_point in self.lasers_end_points:
-                    rez = LeaderCorridor_lasers.intersect(corridor_lines_item[:, 0, :], corridor_lines_item[:, 1, :],
-                                                          np.array([self.host_object.position]),
-                                                          np.array([laser_end_point]))
-                    intersected_line_item = corridor_lines_item[rez]
-                    if len(intersected_line_item) > 0:
-                        x = LeaderCorridor_lasers.seg_intersect(intersected_line_item[:, 0, :],
-                                                                intersected_line_item[:, 1, :],
-                                                                np.array([self.host_object.position]),
-                                                                np.array([laser_end_point]))
-                        # TODO: исключить коллинеарные, вместо их точек пересечения добавить ближайшую точку коллинеарной границы
-                        # но это бесполезно при использовании функции intersect, которая не работает с коллинеарными
-                        exclude_rows = np.concatenate([np.nonzero(np.isinf(x))[0], np.nonzero(np.isnan(x))[0]])
-                        norms = np.linalg.norm(x - self.host_object.position, axis=1)
-                        lasers_values_item.append(np.min(norms))
-                        closest_dot_idx = np.argmin(np.linalg.norm(x - self.host_object.position, axis=1))
-                        self.lasers_collides_item.append(x[closest_dot_idx])
-                    else:
-                        self.lasers_collides_item.append(laser_end_point)
-                self.lasers_collides_item_history.append(self.lasers_collides_item.copy())
-
-                obs_item = np.ones(self.lasers_count, dtype=np.float32) * self.laser_length
-                for i, collide in enumerate(self.lasers_collides_item):
-                    obs_item[i] = np.linalg.norm(collide - self.host_object.position)
-
-                if self.pad_sectors:
-                    front = np.zeros(len(obs_item))
-                    right = np.zeros(len(obs_item))
-                    behind = np.zeros(len(obs_item))
-                    left = np.zeros(len(obs_item))
-
-                    lasers_in_sector = self.lasers_count / 4
-                    for i in range(len(obs_item)):
-                        if i < lasers_in_sector:
-                            front[i] = obs_item[i]
-                        elif lasers_in_sector <= i < 2 * lasers_in_sector:
-                            right[i] = obs_item[i]
-                        elif 2 * lasers_in_sector <= i < 3 * lasers_in_sector:
-                            behind[i] = obs_item[i]
-                        else:
-                            left[i] = obs_item[i]
+    def _history_observation(self, origin):
+        """Laser values for every entry of the obstacles history, all entries are processed at once"""
+        collides, _ = self._nearest_collides(origin, _stack_lines_history(self.history_obstacles_list))
+        self.lasers_collides_item_history = [list(collides_item) for collides_item in collides]
+        self.lasers_collides_item = self.lasers_collides_item_history[-1]
 
-                    # front = np.array([obs_item[0], obs_item[1], 0, 0, 0, 0, 0, 0, 0, 0, 0, obs_item[11]])
-                    # right = np.array([0, 0, obs_item[2], obs_item[3], obs_item[4], 0, 0, 0, 0, 0, 0, 0])
-                    # behind = np.array([0, 0, 0, 0, 0, obs_item[5], obs_item[6], obs_item[7], 0, 0, 0, 0])
-                    # left = np.array([0, 0, 0, 0, 0, 0, 0, 0, obs_item[8], obs_item[9], obs_item[10], 0])
-                    res_out = np.concatenate((front, right, behind, left), axis=None)
-                else:
-                    res_out = obs_item
+        obs_items = np.linalg.norm(collides - np.asarray(origin), axis=-1).astype(np.float32)
+        if not self.pad_sectors:
+            return obs_items
 
-                all_obs_list.append(res_out)
-            all_obs_arr = np.array(all_obs_list)
-            # print(all_obs_arr)
-        #             print('ALL CORIDOR OBS ARR 1: ', all_obs_arr)
-        #             print('ALL CORIDOR OBS ARR 1: ', all_obs_arr.shape)
-        return all_obs_arr
+        # каждый лазер попадает в свой сектор: спереди, справа, сзади, слева, остальные сектора заполнены нулями
+        lasers_in_sector = self.lasers_count / 4
+        sectors = np.minimum(np.arange(self.lasers_count) // lasers_in_sector, 3).astype(int)
+        padded = np.zeros((len(obs_items), 4, self.lasers_count))
+        padded[:, sectors, np.arange(self.lasers_count)] = obs_items
+        return padded.reshape(len(obs_items), 4 * self.lasers_count)
 
     def reset(self):
         zeros_item = np.zeros([1, 2, 2])
@@ -1151,13 +1091,9 @@ class LeaderCorridor_lasers_compas(LeaderCorridor_Prev_lasers_v2):
                              "react_to_safe_corridor=True, react_to_green_zone=True, react_to_obstacles=False")
 
     def collect_obstacle_edges(self, env, corridor):
-        left_walls, right_walls = [], []
-        if self.react_to_safe_corridor:
-            for i in range(len(corridor) - 1):
-                right_walls.append([corridor[i][0], corridor[i + 1][0]])
-                left_walls.append([corridor[i][1], corridor[i + 1][1]])
-        left_walls = np.array(left_walls)
-        right_walls = np.array(right_walls)
+        corridor_walls = _corridor_walls(corridor)
+        right_walls = corridor_walls[:, 0]
+        left_walls = corridor_walls[:, 1]
 
         front_wall, back_wall = None, None
         if self.react_to_green_zone:
@@ -1189,59 +1125,31 @@ class LeaderCorridor_lasers_compas(LeaderCorridor_Prev_lasers_v2):
             # Сейчас в истории хранятся все грани препятствий, а не только пересеченные
             self.history_obstacles_list.pop(0)
             self.history_obstacles_list.append((corridor_lines, walls_orientations))
-            all_obs_list = []
-            for j, corridor_lines_item in enumerate(self.history_obstacles_list):
-                corridor_lines, walls_orientations = corridor_lines_item
-                lasers_values_item = []
-                self.lasers_collides_item = []
-                self.lasers_collides_corridor_orientation = []
-                for laser_end_point in self.lasers_end_points:
 
-                    rez = LeaderCorridor_lasers.intersect(corridor_lines[:, 0, :], corridor_lines[:, 1, :],
-                                                          np.array([self.host_object.position]),
-                                                          np.array([laser_end_point]))
-                    intersected_line_item = corridor_lines[rez]
-                    chosen_walls_orientations = walls_orientations[rez]
-                    if len(intersected_line_item) > 0:
-                        x = LeaderCorridor_lasers.seg_intersect(intersected_line_item[:, 0, :],
-                                                                intersected_line_item[:, 1, :],
-                                                                np.array([self.host_object.position]),
-                                                                np.array([laser_end_point]))
-                        # TODO: исключить коллинеарные, вместо их точек пересечения добавить ближайшую точку коллинеарной границы
-                        # но это бесполезно при использовании функции intersect, которая не работает с коллинеарными
-                        exclude_rows = np.concatenate([np.nonzero(np.isinf(x))[0], np.nonzero(np.isnan(x))[0]])
-                        norms = np.linalg.norm(x - self.host_object.position, axis=1)
-                        lasers_values_item.append(np.min(norms))
-                        closest_dot_idx = np.argmin(np.linalg.norm(x - self.host_object.position, axis=1))
-                        self.lasers_collides_item.append(x[closest_dot_idx])
-                        self.lasers_collides_corridor_orientation.append(chosen_walls_orientations[closest_dot_idx])
-                    else:
-                        self.lasers_collides_item.append(laser_end_point)
-                        self.lasers_collides_corridor_orientation.append(np.zeros(4))
-                self.lasers_collides_item_history.append(self.lasers_collides_item.copy())
-                self.lasers_collides_corridor_orientation_history.append(self.lasers_collides_corridor_orientation.copy())
-
-                obs_item = np.zeros(self.lasers_count*5, dtype=np.float32)
-                obs_item[:self.lasers_count] = 1
-                for i, (collide, orientation) in enumerate(zip(self.lasers_collides_item, self.lasers_collides_corridor_orientation)):
-                    if (orientation == 0).all():
-                        obs_item[i] = np.linalg.norm(collide - self.host_object.position)
-                    elif orientation[0] == 1:
-                        obs_item[i] = 0
-                        obs_item[i + self.lasers_count*1] = np.linalg.norm(collide - self.host_object.position)
-                    elif orientation[1] == 1:
-                        obs_item[i] = 0
-                        obs_item[i + self.lasers_count*2] = np.linalg.norm(collide - self.host_object.position)
-                    elif orientation[2] == 1:
-                        obs_item[i] = 0
-                        obs_item[i + self.lasers_count * 3] = np.linalg.norm(
-                            collide - self.host_object.position)
-                    elif orientation[3] == 1:
-                        obs_item[i] = 0
-                        obs_item[i + self.lasers_count * 4] = np.linalg.norm(
-                            collide - self.host_object.position)
-                all_obs_list.append(obs_item)
-            all_obs_arr = np.array(all_obs_list)
+            lines_history = _stack_lines_history([lines for lines, _ in self.history_obstacles_list])
+            orientations_history = np.zeros(lines_history.shape[:2] + (4,))
+            for j, (_, walls_orientations) in enumerate(self.history_obstacles_list):
+                orientations_history[j, :len(walls_orientations)] = walls_orientations
+
+            collides, lines_ids = self._nearest_collides(self.host_object.position, lines_history)
+            # без пересечения ориентация нулевая
+            orientations = np.where((lines_ids >= 0)[..., np.newaxis],
+                                    np.take_along_axis(orientations_history, np.maximum(lines_ids, 0)[..., np.newaxis],
+                                                       axis=1), 0)
+            self.lasers_collides_item_history = [list(collides_item) for collides_item in collides]
+            self.lasers_collides_corridor_orientation_history = [list(orientation) for orientation in orientations]
+            self.lasers_collides_item = self.lasers_collides_item_history[-1]
+            self.lasers_collides_corridor_orientation = self.lasers_collides_corridor_orientation_history[-1]
+
+            # 0 -- нет пересечения со стеной коридора, 1-4 -- передняя, задняя, левые, правые стены
+            distances = np.linalg.norm(collides - self.host_object.position, axis=-1).astype(np.float32)
+            walls_kinds = np.where(orientations.any(axis=-1), orientations.argmax(axis=-1) + 1, 0)
+            all_obs_arr = np.zeros((len(collides), 5, self.lasers_count), dtype=np.float32)
+            all_obs_arr[:, 0, :] = 1
+            all_obs_arr[:, 0, :][walls_kinds > 0] = 0
+            history_ids, lasers_ids = np.indices(walls_kinds.shape)
+            all_obs_arr[history_ids, walls_kinds, lasers_ids] = distances
+            all_obs_arr = all_obs_arr.reshape(len(collides), 5 * self.lasers_count)
         #             print('ALL CORIDOR OBS ARR 1: ', all_obs_arr)
         #             print('ALL CORIDOR OBS ARR 1: ', all_obs_arr.shape)
         #print(all_obs_arr)
@@ -1287,6 +1195,38 @@ class LeaderCorridor_lasers_compas(LeaderCorridor_Prev_lasers_v2):
                     elif laser_orientation[3] == 1:
                         pygame.draw.circle(env.gameDisplay, (60, 255, 60), laser_collide, 3)
 
+def _positions_window(leader_positions_hist, detectable_positions, position_sequence_length):
+    """
+    Positions of the leader history used by the detectors: the last ("new") or the first ("old")
+    position_sequence_length positions, all positions for "near". For SlidingBuffer it is a view without copying.
+    """
+    if not isinstance(leader_positions_hist, SlidingBuffer):
+        leader_positions_hist = np.array(leader_positions_hist)
+    if detectable_positions == "new":
+        return leader_positions_hist[max(0, len(leader_positions_hist) - position_sequence_length):]
+    elif detectable_positions == "old":
+        return leader_positions_hist[:position_sequence_length]
+    return leader_positions_hist[:]
+
+
+def _corridor_walls(corridor):
+    """Walls (K, 2, 2, 2) of the corridor: right and left wall between each pair of consecutive border points"""
+    if isinstance(corridor, CorridorBuffer):
+        return corridor.walls
+    borders = np.array([[right, left] for right, left in corridor], dtype=np.float64).reshape(-1, 2, 2)
+    return np.stack((borders[:-1], borders[1:]), axis=2)
+
+
+def _stack_lines_history(lines_history):
+    """Stacks the history of obstacle lines (H, M, 2, 2), shorter entries are padded with NaN lines"""
+    lines_history = [np.asarray(lines).reshape(-1, 2, 2) for lines in lines_history]
+    max_lines = max(len(lines) for lines in lines_history)
+    stacked = np.full((len(lines_history), max_lines, 2, 2), np.nan)
+    for j, lines in enumerate(lines_history):
+        stacked[j, :len(lines)] = lines
+    return stacked
+
+
 # Можно конечно через getattr из модуля брать, но так можно проверку добавить
 SENSOR_CLASSNAME_TO_CLASS = {
     "LaserSensor": LaserSensor,
@@ -0,0 +1,124 @@
+from math import floor
+
+import numpy as np
+
+try:
+    from continuous_grid_arctic.utils.ring_buffer import SlidingBuffer
+except:
+    from src.continuous_grid_arctic.utils.ring_buffer import SlidingBuffer
+
+
+class ObstaclesIndex:
+    def __init__(self, game_objects, moving_objects=(), cell_size=100):
+        """
+        Uniform grid over the hitboxes of static game objects (rocks, bridge walls), built once per reset.
+        Moving objects from the same list (leader, follower) form a small dynamic layer that is checked always.
+        Queries return candidates -- a superset of the objects that satisfy the exact check, in the order of
+        game_objects, so the exact check over them gives the same result as the check over the whole list.
+
+        :param game_objects (list):
+            game objects (Game.game_object_list)
+        :param moving_objects (list):
+            objects from game_objects that change their position
+        :param cell_size (int):
+            grid cell size in pixels
+        """
+        self.game_objects = list(game_objects)
+        self.cell_size = cell_size
+
+        moving_ids = {id(cur_object) for cur_object in moving_objects}
+        self.moving_indices = [i for i, cur_object in enumerate(self.game_objects) if id(cur_object) in moving_ids]
+
+        # ячейка сетки -> индексы статических объектов, хитбокс которых её задевает
+        self.cells = dict()
+        self.min_cell = None
+        self.max_cell = None
+        for i, cur_object in enumerate(self.game_objects):
+            if id(cur_object) in moving_ids:
+                continue
+            rect = cur_object.rectangle
+            cells_x, cells_y = self._cells_range(rect.left, rect.top, rect.right, rect.bottom)
+            for cell_x in cells_x:
+                for cell_y in cells_y:
+                    self.cells.setdefault((cell_x, cell_y), list()).append(i)
+
+        if self.cells:
+            self.min_cell = (min(cell[0] for cell in self.cells), min(cell[1] for cell in self.cells))
+            self.max_cell = (max(cell[0] for cell in self.cells), max(cell[1] for cell in self.cells))
+
+    def _cells_range(self, left, top, right, bottom):
+        """Cells covering the box (borders included), clipped to the occupied part of the grid if it is known"""
+        first_x, last_x = floor(left / self.cell_size), floor(right / self.cell_size)
+        first_y, last_y = floor(top / self.cell_size), floor(bottom / self.cell_size)
+        if self.min_cell is not None:
+            first_x, first_y = max(first_x, self.min_cell[0]), max(first_y, self.min_cell[1])
+            last_x, last_y = min(last_x, self.max_cell[0]), min(last_y, self.max_cell[1])
+        return range(first_x, last_x + 1), range(first_y, last_y + 1)
+
+    def _query_box(self, left, top, right, bottom):
+        indices = set(self.moving_indices)
+        if self.cells:
+            cells_x, cells_y = self._cells_range(left, top, right, bottom)
+            for cell_x in cells_x:
+                for cell_y in cells_y:
+                    indices.update(self.cells.get((cell_x, cell_y), ()))
+        return [self.game_objects[i] for i in sorted(indices)]
+
+    def query_rect(self, rect):
+        """Objects whose hitboxes may intersect the rect (pygame.Rect)"""
+        return self._query_box(rect.left, rect.top, rect.right, rect.bottom)
+
+    def query_radius(self, point, radius):
+        """Objects whose hitboxes may be closer than radius to the point"""
+        return self._query_box(point[0] - radius, point[1] - radius, point[0] + radius, point[1] + radius)
+
+
+class PointsIndex:
+    def __init__(self, cell_size):
+        """
+        Uniform grid over a growing sequence of points (e.g. the factual trajectory of the leader). Points are added
+        one by one and keep their order in the points array, radius queries check only the cells around the query
+        point, so their cost does not depend on the number of points.
+
+        :param cell_size (float):
+            grid cell size in pixels, queries are cheapest when it is close to the query radius
+        """
+        self.cell_size = cell_size
+        self.points = SlidingBuffer((2,), np.float64)
+        # ячейка сетки -> индексы точек в ней; подряд идущие одинаковые точки (ведущий стоит) не добавляются
+        self.cells = dict()
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, point):
+        if len(self.points) == 0 or (self.points[-1] != point).any():
+            cell = (floor(point[0] / self.cell_size), floor(point[1] / self.cell_size))
+            self.cells.setdefault(cell, list()).append(len(self.points))
+        self.points.append(point)
+
+    def clear(self):
+        self.points.clear()
+        self.cells = dict()
+
+    def nearest(self, point, radius):
+        """
+        Closest point not farther than radius from the point.
+
+        :return: index of the closest point (None if there is no such point) and the distance to it
+        """
+        candidates = list()
+        for cell_x in range(floor((point[0] - radius) / self.cell_size),
+                            floor((point[0] + radius) / self.cell_size) + 1):
+            for cell_y in range(floor((point[1] - radius) / self.cell_size),
+                                floor((point[1] + radius) / self.cell_size) + 1):
+                candidates.extend(self.cells.get((cell_x, cell_y), ()))
+        if len(candidates) == 0:
+            return None, np.inf
+
+        candidates = np.array(candidates)
+        distances = np.linalg.norm(self.points.view[candidates] - point, axis=1)
+        closest = np.argmin(distances)
+        if distances[closest] > radius:
+            return None, np.inf
+        return int(candidates[closest]), distances[closest]
@@ -0,0 +1,56 @@
+import weakref
+from math import sin, cos, fmod
+
+import numpy as np
+import pygame
+
+# изображение -> {номер шага угла: повёрнутое изображение}, общий для всех сред процесса
+_ROTATED_IMAGES = weakref.WeakKeyDictionary()
+
+
+def rotated_size(width, height, angle):
+    """
+    Size of the image after pygame.transform.rotate, computed without rotating the image (the same formula as in
+    pygame, including the float32 angle and the exact rotation by multiples of 90 degrees)
+
+    :param width, height (int):
+        size of the original image
+    :param angle (float):
+        rotation angle in degrees (counterclockwise, as in pygame)
+    :return: width and height of the rotated image
+    """
+    angle = float(np.float32(angle))
+    if fmod(angle, 90.0) == 0:
+        turns = int(angle) // 90 % 4
+        return (height, width) if turns % 2 else (width, height)
+
+    radangle = angle * .01745329251994329
+    sangle = sin(radangle)
+    cangle = cos(radangle)
+    cx, cy = cangle * width, cangle * height
+    sx, sy = sangle * width, sangle * height
+    new_width = int(max(abs(cx + sy), abs(cx - sy), abs(-cx + sy), abs(-cx - sy)))
+    new_height = int(max(abs(sx + cy), abs(sx - cy), abs(-sx + cy), abs(-sx - cy)))
+    return new_width, new_height
+
+
+def rotated_image(image, angle, angle_step=1):
+    """
+    Image rotated by the angle rounded to angle_step degrees. Rotated images are created once per image and angle
+    and shared by all environments of the process.
+
+    :param image (pygame.Surface):
+        original image
+    :param angle (float):
+        rotation angle in degrees (counterclockwise, as in pygame)
+    :param angle_step (float):
+        angle quantization step; None -- exact rotation without caching
+    """
+    if not angle_step:
+        return pygame.transform.rotate(image, angle)
+
+    angle_id = int(round((angle % 360) / angle_step))
+    image_cache = _ROTATED_IMAGES.setdefault(image, dict())
+    if angle_id not in image_cache:
+        image_cache[angle_id] = pygame.transform.rotate(image, angle_id * angle_step)
+    return image_cache[angle_id]
@@ -5,13 +5,65 @@ from gym import Wrapper, ObservationWrapper
 from gym.spaces import Box
 from warnings import warn
 try:
-    import cv2
-except:
-    warn("cv2 is not loaded, wrappers with images won't work correctly")
+    import lz4.block
+except ImportError:
+    # lz4 нужен только для MyFrameStack(lz4_compress=True)
+    lz4 = None
 try:
     from continuous_grid_arctic.utils.misc import rotateVector, calculateAngle
 except:
     from src.continuous_grid_arctic.utils.misc import rotateVector, calculateAngle
+try:
+    from continuous_grid_arctic.utils.observation import LEADER_POSITION, LEADER_DIRECTION, FOLLOWER_POSITION, \
+        FOLLOWER_DIRECTION
+except:
+    from src.continuous_grid_arctic.utils.observation import LEADER_POSITION, LEADER_DIRECTION, FOLLOWER_POSITION, \
+        FOLLOWER_DIRECTION
+
+
+class LazyFrames:
+    """
+    Stacked observation that keeps references to the frames instead of a copy of them. Consecutive observations share
+    the frames, so a replay buffer stores each frame once. np.asarray(lazy_frames) concatenates the frames.
+    """
+    __slots__ = ("frames", "frame_shape", "dtype", "lz4_compress")
+
+    def __init__(self, frames, frame_shape, dtype, lz4_compress=False):
+        """
+        :param frames (tuple):
+            frames from the oldest to the newest, np.ndarray or bytes compressed by lz4
+        :param frame_shape (tuple):
+            shape of a frame
+        :param dtype (np.dtype):
+            type of the frames
+        :param lz4_compress (bool):
+            the frames are compressed by lz4
+        """
+        self.frames = frames
+        self.frame_shape = frame_shape
+        self.dtype = dtype
+        self.lz4_compress = lz4_compress
+
+    @property
+    def shape(self):
+        return (len(self.frames) * self.frame_shape[0],) + tuple(self.frame_shape[1:])
+
+    def _frame(self, frame):
+        if self.lz4_compress:
+            return np.frombuffer(lz4.block.decompress(frame), dtype=self.dtype).reshape(self.frame_shape)
+        return frame
+
+    def __array__(self, dtype=None):
+        observes = np.concatenate([self._frame(frame) for frame in self.frames])
+        if dtype is not None:
+            return observes.astype(dtype)
+        return observes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        return self.__array__()[item]
 
 
 class MyFrameStack(ObservationWrapper):
@@ -19,30 +71,41 @@ class MyFrameStack(ObservationWrapper):
     For example, if the number of stacks is 4, then the returned observation contains
     the most recent 4 observations. For environment 'Pendulum-v1', the original observation
     is an array with shape [3], so if we stack 4 observations, the processed observation
-    has shape [4, 3].
+    has shape [12].
     .. note::
-        To be memory efficient, the stacked observations are wrapped by :class:`LazyFrame`.
+        The frames are written to a preallocated buffer of 2 * framestack frames: each frame is written twice,
+        at the write index and framestack frames after it, so the last framestack frames always form
+        a contiguous slice of the buffer.
     .. note::
         The observation space must be `Box` type. If one uses `Dict`
         as observation space, it should apply `FlattenDictWrapper` at first.
-    Example::
-        >>> import gym
-        >>> env = gym.make('PongNoFrameskip-v0')
-        >>> env = FrameStack(env, 4)
-        >>> env.observation_space
-        Box(4, 210, 160, 3)
     Args:
         env (Env): environment object
-        num_stack (int): number of stacks
-        lz4_compress (bool): use lz4 to compress the frames internally
+        framestack (int): number of stacks
+        lz4_compress (bool): use lz4 to compress the frames of LazyFrames (output="lazy")
+        output (str): "array" -- new array (a copy of the slice of the buffer),
+            "view" -- slice of the buffer without copying, it is overwritten by the next step,
+            "lazy" -- LazyFrames, the frames are shared by consecutive observations
     """
 
-    def __init__(self, env, framestack, lz4_compress=False):
+    def __init__(self, env, framestack, lz4_compress=False, output="array"):
         super().__init__(env)
+        if output not in ("array", "view", "lazy"):
+            raise ValueError("output {} not in list: {}".format(output, ["array", "view", "lazy"]))
+        if lz4_compress and output != "lazy":
+            raise ValueError("lz4_compress can be used only with output='lazy'")
+        if lz4_compress and lz4 is None:
+            raise ImportError("lz4 is not installed, lz4_compress=True can't be used")
         self.framestack = framestack
         self.lz4_compress = lz4_compress
+        self.output = output
 
-        self.frames = deque(maxlen=framestack)
+        # буфер создаётся по первому наблюдению, чтобы сохранить его тип и форму
+        self.buffer = None
+        # кадры для LazyFrames (сжатые, если lz4_compress)
+        self.frames = [None] * framestack
+        # номер места, куда будет записан следующий кадр
+        self.index = 0
 
         low = np.tile(self.observation_space.low[...], framestack)
         high = np.tile(
@@ -53,62 +116,96 @@ class MyFrameStack(ObservationWrapper):
         )
 
     def observation(self):
-        assert len(self.frames) == self.framestack, (len(self.frames), self.framestack)
-        observes = np.concatenate(self.frames)
+        if self.output == "lazy":
+            observation = self.frames[self.index:] + self.frames[:self.index]
+            return LazyFrames(tuple(observation), self.buffer.shape[1:], self.buffer.dtype, self.lz4_compress)
 
+        observes = self.buffer[self.index:self.index + self.framestack].reshape((-1,) + self.buffer.shape[2:])
+        if self.output == "array":
+            return observes.copy()
         return observes
-        # return gym.wrappers.frame_stack.LazyFrames(observes, self.lz4_compress)
+
+    def _frame(self, observation):
+        if self.lz4_compress:
+            return lz4.block.compress(np.ascontiguousarray(observation, dtype=self.buffer.dtype).tobytes())
+        if self.output == "lazy":
+            return np.array(observation, dtype=self.buffer.dtype)
+        return None
 
     def step(self, action):
         observation, reward, done, info = self.env.step(action)
-        self.frames.append(observation)
+        self.buffer[self.index] = observation
+        self.buffer[self.index + self.framestack] = observation
+        self.frames[self.index] = self._frame(observation)
+        self.index = (self.index + 1) % self.framestack
         return self.observation(), reward, done, info
 
     def reset(self, **kwargs):
-        observation = self.env.reset(**kwargs)
-        [self.frames.append(observation) for _ in range(self.framestack)]
+        observation = np.asarray(self.env.reset(**kwargs))
+        if self.buffer is None or self.buffer.shape[1:] != observation.shape or self.buffer.dtype != observation.dtype:
+            self.buffer = np.empty((2 * self.framestack,) + observation.shape, dtype=observation.dtype)
+        self.buffer[:] = observation
+        self.frames = [self._frame(observation)] * self.framestack
+        self.index = 0
         return self.observation()
 
 
+# классы сенсоров, наблюдения которых собирает ContinuousObserveModifier_v0, в порядке проверки
+OBSERVED_SENSOR_CLASSES = ('LeaderTrackDetector_vector', 'LeaderTrackDetector_radar', 'LeaderCorridor_lasers',
+                           'LeaderCorridor_lasers_v2', 'FollowerInfo', 'LaserSensor')
+
+
 class ContinuousObserveModifier_v0(ObservationWrapper):
+    """
+    Concatenates the normalized outputs of the follower sensors into one vector. The layout of the vector is
+    compiled at construction: for each sensor its slice in the vector and the clip bounds, the normalization constants
+    are taken from the sensors at the first observation. Each step writes the sensor outputs into a preallocated
+    float32 vector, the returned observation is a copy of it.
+    LaserSensor with return_all_points returns only the points not covered by obstacles, so its output is padded
+    with zeros or truncated to the size of its slice.
+    """
 
     def __init__(self, env, action_values_range=None, lz4_compress=False):
         super().__init__(env)
         self.observations_list = None
         features_number = 0
-        self.use_prev_obs = use_prev_obs
-        self.max_prev_obs = max_prev_obs
+        # (имя сенсора, класс сенсора, начало, конец, нижняя граница, переменный размер выхода сенсора)
+        self.observation_layout = list()
 
         for sensor_name, sensor_config in env.follower_sensors.items():
-            if sensor_name =='LeaderTrackDetector_vector' or sensor_config.get("sensor_class", None) =='LeaderTrackDetector_vector':
-                features_number += sensor_config['position_sequence_length'] * 2
-
-            if sensor_name =='LeaderTrackDetector_radar' or sensor_config.get("sensor_class", None) =='LeaderTrackDetector_radar':
-                features_number += sensor_config['radar_sectors_number']
-            if sensor_name =='FollowerInfo' or sensor_config.get("sensor_class", None) =='FollowerInfo':
-                if 'speed_direction_param' in sensor_config:
-                    features_number += sensor_config['speed_direction_param']
-            if sensor_name =='LaserSensor' or sensor_config.get("sensor_class", None) =='LaserSensor':
+            sensor_class = sensor_name if sensor_name in OBSERVED_SENSOR_CLASSES else sensor_config.get("sensor_class", None)
+            if sensor_class == 'LeaderTrackDetector_vector':
+                sensor_features_number = sensor_config['position_sequence_length'] * 2
+            elif sensor_class == 'LeaderTrackDetector_radar':
+                sensor_features_number = sensor_config['radar_sectors_number']
+            elif sensor_class == 'FollowerInfo':
+                sensor_features_number = sensor_config.get('speed_direction_param', 2)
+            elif sensor_class == 'LaserSensor':
                 if sensor_config['return_all_points']:
                     lidar_points_number = (int(sensor_config['available_angle'] / sensor_config['angle_step'])+1) * sensor_config['points_number']
                 else:
                     lidar_points_number = (int(sensor_config['available_angle'] / sensor_config['angle_step'])+1)
                 if sensor_config["return_only_distances"]:
-                    features_number += lidar_points_number
+                    sensor_features_number = lidar_points_number
                 else:
-                    features_number += lidar_points_number * 2
-
-            if sensor_name =='LeaderCorridor_lasers' or sensor_config.get("sensor_class", None) =='LeaderCorridor_lasers':
-                if 'front_lasers_count' in sensor_config:
-                    features_number += sensor_config['front_lasers_count']
-                else:
-                    features_number += 3  # env.follower_sensors['LeaderCorridor_lasers']['lasers_count']
-                if 'back_lasers_count' in sensor_config:
-                    features_number += sensor_config['back_lasers_count']
-            if sensor_name in ["LeaderCorridor_lasers_v2"] or sensor_config.get("sensor_class", None) in ["LeaderCorridor_lasers_v2"]:
-                features_number += sensor_config['lasers_count']
+                    sensor_features_number = lidar_points_number * 2
+            elif sensor_class == 'LeaderCorridor_lasers':
+                sensor_features_number = sensor_config.get('front_lasers_count', 3) + sensor_config.get('back_lasers_count', 0)
+            elif sensor_class == 'LeaderCorridor_lasers_v2':
+                sensor_features_number = sensor_config['lasers_count']
+            else:
+                continue
+            low = 0 if sensor_class in ('LeaderTrackDetector_radar', 'LeaderCorridor_lasers', 'LeaderCorridor_lasers_v2') else -1
+            variable_size = sensor_class == 'LaserSensor' and sensor_config['return_all_points']
+            self.observation_layout.append((sensor_name, sensor_class, features_number,
+                                            features_number + sensor_features_number, low, variable_size))
+            features_number += sensor_features_number
 
         self.features_number_num = features_number
+        self.observation_vector = np.zeros(features_number, dtype=np.float32)
+        # план заполнения вектора: (имя сенсора, срез вектора, делитель, нижняя граница, переменный размер),
+        # создаётся по сенсорам ведомого
+        self.observation_plan = None
         self.observation_space = Box(-np.ones(features_number),
                                          np.ones(features_number))
 
@@ -122,39 +219,34 @@ class ContinuousObserveModifier_v0(ObservationWrapper):
                                     shape=env.action_space.shape,
                                     dtype=env.action_space.dtype)
 
+    def _sensor_scale(self, sensor_name, sensor_class):
+        """Normalization constant of the sensor output"""
+        if sensor_class in ('LeaderTrackDetector_vector', 'LeaderTrackDetector_radar'):
+            return self.max_distance
+        if sensor_class in ('LeaderCorridor_lasers', 'LeaderCorridor_lasers_v2'):
+            return self.follower.sensors[sensor_name].laser_length
+        if sensor_class == 'LaserSensor':
+            return self.follower.sensors[sensor_name].range * self.PIXELS_TO_METER
+        return 1
+
     def observation(self, obs):
-        features_list = []
-
-        for sensor_name in self.follower_sensors.keys():
-            sensor_config = self.follower_sensors[sensor_name]
-            if sensor_name == 'LeaderTrackDetector_vector' or sensor_config["sensor_class"] == 'LeaderTrackDetector_vector':
-                history_vecs = obs[sensor_name].flatten()
-                history_vecs = np.clip(history_vecs / self.max_distance, -1, 1)
-                features_list.append(history_vecs)
-            if sensor_name == 'LeaderTrackDetector_radar' or sensor_config["sensor_class"] == 'LeaderTrackDetector_radar':
-                history_radar = obs[sensor_name]
-                history_radar = np.clip(history_radar / self.max_distance, 0, 1)
-                features_list.append(history_radar)
-            if sensor_name == 'LeaderCorridor_lasers' or sensor_config["sensor_class"] == 'LeaderCorridor_lasers':
-                corridor_lasers = obs[sensor_name]
-                corridor_lasers =  np.clip(corridor_lasers / self.follower.sensors[sensor_name].laser_length, 0, 1)
-                features_list.append(corridor_lasers)
-            if sensor_name == 'LeaderCorridor_lasers_v2' or sensor_config["sensor_class"] == 'LeaderCorridor_lasers_v2':
-                corridor_lasers_v2 = obs[sensor_name]
-                corridor_lasers_v2 = np.clip(corridor_lasers_v2 / self.follower.sensors[sensor_name].laser_length, 0, 1)
-                features_list.append(corridor_lasers_v2)
-            if sensor_name == 'FollowerInfo' or sensor_config["sensor_class"] == 'FollowerInfo':
-                follower_info = obs[sensor_name]
-                follower_info = np.clip(follower_info, -1, 1)
-                features_list.append(follower_info)
-            if sensor_name == 'LaserSensor' or sensor_config["sensor_class"] == 'LaserSensor':
-                lidar_sensed_points = obs[sensor_name]
-                # переход к относительным координатам лучше делать в сенсоре
-                if len(lidar_sensed_points.shape)==2:
-                    lidar_sensed_points = np.concatenate(lidar_sensed_points)
-                lidar_sensed_points = np.clip(lidar_sensed_points / (self.follower.sensors[sensor_name].range * self.PIXELS_TO_METER), -1, 1)
-                features_list.append(lidar_sensed_points)
-            self.observations_list = np.concatenate(features_list)
+        if self.observation_plan is None:
+            self.observation_plan = [(sensor_name, self.observation_vector[start:end],
+                                      self._sensor_scale(sensor_name, sensor_class), low, variable_size)
+                                     for sensor_name, sensor_class, start, end, low, variable_size
+                                     in self.observation_layout]
+
+        for sensor_name, features, scale, low, variable_size in self.observation_plan:
+            values = np.reshape(obs[sensor_name], -1)
+            if variable_size:
+                # число точек меняется от шага к шагу: лишние отбрасываются, недостающие заполняются нулями
+                values_number = min(len(values), len(features))
+                features[values_number:] = 0
+                features, values = features[:values_number], values[:values_number]
+            # переход к относительным координатам лучше делать в сенсоре
+            np.divide(values, scale, out=features)
+            np.clip(features, low, 1, out=features)
+        self.observations_list = self.observation_vector.copy()
         return self.observations_list
 
     def step(self, action):
@@ -166,29 +258,25 @@ class ContinuousObserveModifier_v0(ObservationWrapper):
         return obs, rews, dones, infos
 
 
+# классы сенсоров с историей значений, наблюдения которых собирает ContinuousObserveModifier_sensorPrev
+HISTORY_SENSOR_CLASSES = ('LeaderCorridor_Prev_lasers_v2', 'LeaderCorridor_Prev_lasers_v3', 'LeaderCorridor_lasers_compas')
+
+
 class ContinuousObserveModifier_sensorPrev(ObservationWrapper):
     """
     A wrapper for sensors that return a history of values. That is, they are expected to show signs of
-    form (steps, dimensions)
+    form (steps, dimensions).
+    The layout is compiled at construction as in ContinuousObserveModifier_v0: each sensor has its columns
+    in a preallocated float32 buffer (max_prev_obs, features), each step writes the normalized outputs into it.
     """
     def __init__(self, env, action_values_range=None, lz4_compress=False, max_prev_obs=0):
         super().__init__(env)
         self.observations_list = None
-        features_number = 0
         self.max_prev_obs = max_prev_obs
 
-        for sensor_name, sensor_config in env.follower_sensors.items():
-            if sensor_config["sensor_class"] in ["LeaderCorridor_Prev_lasers_v2", "LeaderCorridor_Prev_lasers_v3"]:
-                if sensor_config["pad_sectors"]:
-                    features_number += (4*sensor_config['lasers_count'])
-                else:
-                    features_number += sensor_config['lasers_count']
-            if sensor_config["sensor_class"]=="LeaderCorridor_lasers_compas":
-                features_number += (5*sensor_config['lasers_count'])
-
-        self.features_number_num = features_number
-        self.observation_space = Box(-np.ones([self.max_prev_obs, features_number]),
-                                     np.ones([self.max_prev_obs, features_number]))
+        sensors_names = [sensor_name for sensor_name, sensor_config in env.follower_sensors.items()
+                         if self._history_sensor_class(sensor_name, sensor_config) is not None]
+        self._compile_layout(env, sensors_names, max_prev_obs)
 
         self.action_values_range = action_values_range
         if self.action_values_range is not None:
@@ -200,61 +288,74 @@ class ContinuousObserveModifier_sensorPrev(ObservationWrapper):
                                     shape=env.action_space.shape,
                                     dtype=env.action_space.dtype)
 
+    @staticmethod
+    def _history_sensor_class(sensor_name, sensor_config):
+        """Class of the sensor with history or None if the sensor is not collected by the wrapper"""
+        sensor_class = sensor_name if sensor_name in HISTORY_SENSOR_CLASSES else sensor_config.get("sensor_class", None)
+        return sensor_class if sensor_class in HISTORY_SENSOR_CLASSES else None
+
+    def _compile_layout(self, env, sensors_names, history_length):
+        """
+        Columns of the sensors in the observation buffer
+
+        :param sensors_names (list):
+            names of the sensors with history in the order of the columns
+        :param history_length (int):
+            number of history entries (rows) returned by the sensors
+        """
+        features_number = 0
+        # (имя сенсора, начало, конец)
+        self.observation_layout = list()
+        for sensor_name in sensors_names:
+            sensor_config = env.follower_sensors[sensor_name]
+            lasers_count = sensor_config.get('lasers_count', 12)
+            if self._history_sensor_class(sensor_name, sensor_config) == 'LeaderCorridor_lasers_compas':
+                sensor_features_number = 5 * lasers_count
+            elif sensor_config.get("pad_sectors", True):
+                sensor_features_number = 4 * lasers_count
+            else:
+                sensor_features_number = lasers_count
+            self.observation_layout.append((sensor_name, features_number, features_number + sensor_features_number))
+            features_number += sensor_features_number
+
+        self.features_number_num = features_number
+        self.observation_buffer = np.zeros((history_length, features_number), dtype=np.float32)
+        # план заполнения буфера: (имя сенсора, столбцы буфера, длина лазера), создаётся по сенсорам ведомого
+        self.observation_plan = None
+        self.observation_space = Box(-np.ones([history_length, features_number]),
+                                     np.ones([history_length, features_number]))
+
     def observation(self, obs):
-        features_list = []
-
-        for sensor_name in self.follower_sensors.keys():
-            sensor_config = self.follower_sensors[sensor_name]
-            if sensor_name in ['LeaderCorridor_Prev_lasers_v2', "LeaderCorridor_Prev_lasers_v3"] or sensor_config["sensor_class"] in ['LeaderCorridor_Prev_lasers_v2', "LeaderCorridor_Prev_lasers_v3"]:
-                corridor_obs = obs[sensor_name]
-                assert len(corridor_obs.shape) == 2
-                assert corridor_obs.shape[0] == self.max_prev_obs
-                corridor_obs = np.clip(corridor_obs / self.follower.sensors[sensor_name].laser_length, 0, 1)
-                features_list.append(corridor_obs)
-            if sensor_name == 'LeaderCorridor_lasers_compas' or sensor_config["sensor_class"] == 'LeaderCorridor_lasers_compas':
-                corridor_obs = obs[sensor_name]
-                assert len(corridor_obs.shape) == 2
-                assert corridor_obs.shape[0] == self.max_prev_obs
-                corridor_obs = np.clip(corridor_obs / self.follower.sensors[sensor_name].laser_length, 0, 1)
-                features_list.append(corridor_obs)
-        self.observations_list = np.concatenate(features_list, axis=1)
+        if self.observation_plan is None:
+            self.observation_plan = [(sensor_name, self.observation_buffer[:, start:end],
+                                      self.follower.sensors[sensor_name].laser_length)
+                                     for sensor_name, start, end in self.observation_layout]
+
+        for sensor_name, features, laser_length in self.observation_plan:
+            corridor_obs = obs[sensor_name]
+            assert corridor_obs.shape == features.shape
+            np.divide(corridor_obs, laser_length, out=features)
+            np.clip(features, 0, 1, out=features)
+        self.observations_list = self.observation_buffer.copy()
         return self.observations_list
 
-class ContinuousObserveModifierPrev(ObservationWrapper):
+
+class ContinuousObserveModifierPrev(ContinuousObserveModifier_sensorPrev):
     """
     Wrapper for accumulating previous values of two upgraded sensors (1) Beam sensor with 12 beams for the corridor
     and obstacles; 2) Beam sensor for obstacles with 30 (variably) beams
     """
 
     def __init__(self, env, action_values_range=None, lz4_compress=False):
-        super().__init__(env)
+        ObservationWrapper.__init__(self, env)
         self.observations_list = None
-        features_number = 0
         self.prev_obs_flag = env.env.use_prev_obs
         self.num_prev_obs = env.env.max_prev_obs
 
-
-        if 'LeaderCorridor_Prev_lasers_v2' in self.follower_sensors:
-            if 'front_lasers_count' in env.follower_sensors['LeaderCorridor_Prev_lasers_v2']:
-                features_number += env.follower_sensors['LeaderCorridor_Prev_lasers_v2']['front_lasers_count']
-            if 'back_lasers_count' in env.follower_sensors['LeaderCorridor_Prev_lasers_v2']:
-                features_number += env.follower_sensors['LeaderCorridor_Prev_lasers_v2']['back_lasers_count']
-
-
-        if 'LaserPrevSensor' in self.follower_sensors:
-            if 'front_lasers_count' in env.follower_sensors['LaserPrevSensor']:
-                features_number += env.follower_sensors['LaserPrevSensor']['front_lasers_count']
-            if 'back_lasers_count' in env.follower_sensors['LaserPrevSensor']:
-                features_number += env.follower_sensors['LaserPrevSensor']['back_lasers_count']
-
-
-        self.features_number_num = features_number
-
-
-        self.observation_space = Box(-np.ones([self.num_prev_obs, features_number]),
-                                     np.ones([self.num_prev_obs, features_number]))
-
-
+        # сенсоры берутся по именам: лазеры коридора и препятствий, затем лазеры препятствий
+        sensors_names = [sensor_name for sensor_name in ('LeaderCorridor_Prev_lasers_v2', 'LaserPrevSensor')
+                         if sensor_name in env.follower_sensors]
+        self._compile_layout(env, sensors_names, self.num_prev_obs)
 
         self.action_values_range = action_values_range
         if self.action_values_range is not None:
@@ -266,26 +367,6 @@ class ContinuousObserveModifierPrev(ObservationWrapper):
                                     shape=env.action_space.shape,
                                     dtype=env.action_space.dtype)
 
-    # TODO: исправить
-    def observation(self, obs):
-        features_list = []
-
-        # TODO: исправить
-        if 'LeaderCorridor_Prev_lasers_v2' in self.follower.sensors:
-            corridor_lasers_v2 = obs['LeaderCorridor_Prev_lasers_v2']
-            corridor_lasers_v2 = np.clip(corridor_lasers_v2 / self.follower.sensors['LeaderCorridor_Prev_lasers_v2'].laser_length, 0, 1)
-            # features_list.append(corridor_lasers_v2)
-
-        if 'LaserPrevSensor' in self.follower.sensors:
-            corridor_obs_lasers = obs['LaserPrevSensor']
-            corridor_obs_lasers = np.clip(corridor_obs_lasers / self.follower.sensors['LaserPrevSensor'].laser_length, 0, 1)
-            # features_list.append(corridor_obs_lasers)
-
-
-        self.observations_list  = np.concatenate((corridor_lasers_v2, corridor_obs_lasers), axis=1)
-
-        return self.observations_list
-
     def step(self, action):
         if self.action_values_range is not None:
             action -= self.min
@@ -304,6 +385,16 @@ def areDotsOnLeft(line, dots):
     d = (line[1,0] - line[0,0]) * (dots[:,1] - line[0,1]) - (dots[:, 0] - line[0,0]) * (line[1,1]-line[0,1])
     return d > 0.01
 
+
+def nearestResizeIndices(source_size, target_size):
+    """
+    Indices of the source pixels for resizing by the nearest neighbour method, computed as in cv2.INTER_NEAREST
+    source_size: int, number of pixels along the axis of the source image
+    target_size: int, number of pixels along the axis of the resized image
+    """
+    inverse_scale = 1. / (target_size / source_size)
+    return np.minimum(np.floor(np.arange(target_size) * inverse_scale).astype(int), source_size - 1)
+
 # Враппер, который выходы лидара преобразует в 2д картинку
 class ContinuousObserveModifier_lidarMap2d(ContinuousObserveModifier_v0):
     def __init__(self,
@@ -336,6 +427,54 @@ class ContinuousObserveModifier_lidarMap2d(ContinuousObserveModifier_v0):
         self.prev_lidar_map = None
         self.fill_safe_zone = fill_safe_zone
 
+        # два буфера карты: в один рисуется текущая карта, в другом хранится предыдущая
+        map_shape = (int(self.lidar_angle_steps_count), int(self.lidar_points_number), 3)
+        self.lidar_map_buffers = (np.zeros(map_shape, dtype=np.float32), np.zeros(map_shape, dtype=np.float32))
+        # строки и столбцы карты для изменения размера (cv2.resize получает размер как (ширина, высота))
+        self.resize_rows = nearestResizeIndices(map_shape[0], resized_image_shape[1])
+        self.resize_cols = nearestResizeIndices(map_shape[1], resized_image_shape[0])
+
+    def lidarMapCells(self, lidar_observation):
+        """
+        Rows and columns of the map cells of the lidar points.
+        Each point [0,0] starts a new ray, the rays go by the angle steps 0, 1, -1, 2, -2, ... from the direction of
+        the follower. The rows are shifted by half of the map, so the direction of the follower is in the middle row.
+        """
+        points_number = lidar_observation.shape[0]
+        ray_starts = np.all(lidar_observation == 0, axis=1)
+        ray_starts[0] = False
+        ray_numbers = np.cumsum(ray_starts)
+        point_indices = np.arange(points_number)
+        cols = point_indices - np.maximum.accumulate(np.where(ray_starts, point_indices, 0))
+        angle_steps = np.where(ray_numbers % 2 == 1, (ray_numbers + 1) // 2, -(ray_numbers // 2))
+        rows = (angle_steps + self.lidar_angle_steps_count // 2) % self.lidar_angle_steps_count
+        return rows, cols
+
+    def dotsInsideSafeZone(self, lidar_observation, leader_position, follower_position, leader_directions,
+                           follower_direction):
+        """Mask of the lidar points inside the rectangle behind the leader"""
+        if not self.add_safezone_on_map:
+            return np.zeros(lidar_observation.shape[0], dtype=bool)
+        # вычисляем линии простого прямоугольника за спиной у лидера в относительных координатах
+        min_distance, max_distance, max_dev = self.min_distance, self.max_distance, self.max_dev
+        rectangle_points = [np.array([-min_distance, max_dev]), np.array([-min_distance, -max_dev]),
+                           np.array([-max_distance, max_dev]), np.array([-max_distance, -max_dev])]
+        rotated_rectangle_points = [rotateVector(x, leader_directions) for x in rectangle_points]
+        actual_rectangle_points = [x+leader_position for x in rotated_rectangle_points]
+        relative_to_follower_rectangle_points = [x-follower_position for x in actual_rectangle_points]
+        relative_to_follower_rectangle_points_rotated = [rotateVector(x, -follower_direction) for x in relative_to_follower_rectangle_points]
+        # проверяем точки лидара на то, находятся ли они внутри этого прямоугольника или нет.
+
+        line = np.array([relative_to_follower_rectangle_points[1], relative_to_follower_rectangle_points[0]])
+        insideDots_currRectangle = areDotsOnLeft(line, lidar_observation)
+        line = np.array([relative_to_follower_rectangle_points[3], relative_to_follower_rectangle_points[1]])
+        insideDots_currRectangle &= areDotsOnLeft(line, lidar_observation)
+        line = np.array([ relative_to_follower_rectangle_points[2], relative_to_follower_rectangle_points[3]])
+        insideDots_currRectangle &= areDotsOnLeft(line, lidar_observation)
+        line = np.array([relative_to_follower_rectangle_points[0], relative_to_follower_rectangle_points[2]])
+        insideDots_currRectangle &= areDotsOnLeft(line, lidar_observation)
+        return insideDots_currRectangle
+
     def DrawLidar2dMap(self, lidar_map_size,
                      leader_position,
                      follower_position,
@@ -345,82 +484,30 @@ class ContinuousObserveModifier_lidarMap2d(ContinuousObserveModifier_v0):
                      leader_directions,
                      follower_direction):
         """
-        leader_position
-        follower_position
+        Draws the map in the buffer that does not hold the previous map: rows are the rays (the direction of
+        the follower is in the middle row), columns are the points of the rays. Red channel -- cells not seen by
+        the lidar, green -- the leader, blue -- the safe zone (or its border if fill_safe_zone is False).
         """
-
-        # рисуем карту из нулей
-        lidar_map = np.zeros((lidar_map_size[0], lidar_map_size[1], 3), dtype=np.float32)
+        lidar_map = self.lidar_map_buffers[0] if self.lidar_map_buffers[0] is not self.prev_lidar_map \
+            else self.lidar_map_buffers[1]
         # Заполняем красный канал единицами - препятствия, потом будем обнулять точки, которые видит лидар
-        lidar_map[:,:,0] = 1
+        lidar_map[:, :, 0] = 1
+        lidar_map[:, :, 1:] = 0
+
+        rows, cols = self.lidarMapCells(lidar_observation)
+        # точкам, которые видит лидар, ставим 0 в красном канале
+        lidar_map[rows, cols, 0] = 0
+        inside_safe_zone = self.dotsInsideSafeZone(lidar_observation, leader_position, follower_position,
+                                                   leader_directions, follower_direction)
+        lidar_map[rows[inside_safe_zone], cols[inside_safe_zone], 2] = 1
 
-        # добавить прямоугольник за лидером
-        # вычисляем линии простого прямоугольника за спиной у лидера в относительных координатах
-        if self.add_safezone_on_map:
-            min_distance, max_distance, max_dev = self.min_distance, self.max_distance, self.max_dev
-            rectangle_points = [np.array([-min_distance, max_dev]), np.array([-min_distance, -max_dev]),
-                               np.array([-max_distance, max_dev]), np.array([-max_distance, -max_dev])]
-            rotated_rectangle_points = [rotateVector(x, leader_directions) for x in rectangle_points]
-            actual_rectangle_points = [x+leader_position for x in rotated_rectangle_points]
-            relative_to_follower_rectangle_points = [x-follower_position for x in actual_rectangle_points]
-            relative_to_follower_rectangle_points_rotated = [rotateVector(x, -follower_direction) for x in relative_to_follower_rectangle_points]
-            # проверяем точки лидара на то, находятся ли они внутри этого прямоугольника или нет.
-
-            line = np.array([relative_to_follower_rectangle_points[1], relative_to_follower_rectangle_points[0]])
-            insideDots_currRectangle = areDotsOnLeft(line, lidar_observation)
-            line = np.array([relative_to_follower_rectangle_points[3], relative_to_follower_rectangle_points[1]])
-            insideDots_currRectangle &= areDotsOnLeft(line, lidar_observation)
-            line = np.array([ relative_to_follower_rectangle_points[2], relative_to_follower_rectangle_points[3]])
-            insideDots_currRectangle &= areDotsOnLeft(line, lidar_observation)
-            line = np.array([relative_to_follower_rectangle_points[0], relative_to_follower_rectangle_points[2]])
-            insideDots_currRectangle &= areDotsOnLeft(line, lidar_observation)
-        else:
-            insideDots_currRectangle = np.zeros(lidar_observation.shape[0], dtype=np.bool)
-        step_i, point_i = 0, 0
-        # идём по точкам, которые вернул лидар
-        # предполагается, что каждая точка [0,0] в списке - это начало нового луча
-        for x_i, x in enumerate(lidar_observation):
-            if (x==0).all():
-                point_i = 0
-                if x_i !=0:
-                    if step_i==0:
-                        step_i += 1
-                    elif step_i > 0:
-                        step_i *= -1
-                    elif step_i < 0:
-                        step_i *= -1
-                        step_i += 1
-            # Если эта точка есть в списке, ставим ей 0 в красном канале
-            lidar_map[step_i, point_i, 0] = 0
-            if insideDots_currRectangle[x_i]:
-                lidar_map[step_i, point_i, 2] = 1
-            point_i +=1
         if not self.fill_safe_zone:
-            #raise NotImplementedError("Не работает. Херня какая-то рисуется")
-            safe_zone_border = np.zeros_like(lidar_map[:,:,2])
-            for i in range(lidar_map.shape[0]):
-                for j in range(lidar_map.shape[1]-1):
-                    if lidar_map[i,j,2]==1:
-                        if i==0:
-                            if j==0:
-                                if lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[-1,j,2]==1:
-                                    continue
-                            if lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[i,j-1,2]==1 and lidar_map[-1,j,2]==1:
-                                continue
-                        elif i==lidar_map.shape[0]-1:
-                            if j==0:
-                                if lidar_map[i,j+1,2]==1 and lidar_map[0,j,2]==1 and lidar_map[i-1,j,2]==1:
-                                    continue
-                            if lidar_map[i,j+1,2]==1 and lidar_map[0,j,2]==1 and lidar_map[i,j-1,2]==1 and lidar_map[i-1,j,2]==1:
-                                continue
-                        elif j==0:
-                            if lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[i-1,j,2]==1:
-                                continue
-                        elif lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[i,j-1,2]==1 and lidar_map[i-1,j,2]==1:
-                            continue
-                        else:
-                            safe_zone_border[i,j] = 1
-            lidar_map[:, :, 2] = safe_zone_border
+            # граница зоны -- клетки зоны без хотя бы одного из 4 соседей в зоне (зона минус её эрозия крестом 3x3),
+            # клетки за краем карты считаются клетками зоны
+            safe_zone = lidar_map[:, :, 2] == 1
+            padded_zone = np.pad(safe_zone, 1, constant_values=True)
+            eroded_zone = padded_zone[:-2, 1:-1] & padded_zone[2:, 1:-1] & padded_zone[1:-1, :-2] & padded_zone[1:-1, 2:]
+            lidar_map[:, :, 2] = safe_zone & ~eroded_zone
 
         # лидеру на карте ставим 1 в зелёном канале
         follower_to_leader_vec = leader_position - follower_position
@@ -428,15 +515,26 @@ class ContinuousObserveModifier_lidarMap2d(ContinuousObserveModifier_v0):
         distance_between_points = self.lidar_range_pixels / self.lidar_points_number
         if follower_to_leader_dist <= self.lidar_range_pixels:
             leader_row_on_map = -int(angle_between_leader_and_follower // lidar_angle_step)
+            leader_row_on_map = (leader_row_on_map + self.lidar_angle_steps_count // 2) % self.lidar_angle_steps_count
             leader_col_on_map = int(follower_to_leader_dist // distance_between_points)
             lidar_map[leader_row_on_map, leader_col_on_map, 1] = 1
         return lidar_map
 
+    def lidarMapObservation(self, lidar_map):
+        """Adds the previous map with forgetting and resizes the map by the nearest neighbour method"""
+        if self.prev_lidar_map is not None and self.map_wrapper_forgetting_rate is not None:
+            # буфер предыдущей карты будет перезаписан следующей картой, поэтому вычитание делается в нём
+            np.subtract(self.prev_lidar_map, self.map_wrapper_forgetting_rate, out=self.prev_lidar_map)
+            lidar_map += self.prev_lidar_map
+            np.clip(lidar_map, 0, 1, out=lidar_map)
+        self.prev_lidar_map = lidar_map
+        return lidar_map[self.resize_rows[:, np.newaxis], self.resize_cols]
+
     def observation(self, obs):
-        leader_position = np.array([obs['numerical_features'][0], obs['numerical_features'][1]])
-        follower_position = np.array([obs['numerical_features'][5], obs['numerical_features'][6]])
+        leader_position = np.array(obs['numerical_features'][LEADER_POSITION])
+        follower_position = np.array(obs['numerical_features'][FOLLOWER_POSITION])
         relative_leader_position = leader_position - follower_position
-        relative_leader_position_2 = rotateVector(relative_leader_position, -obs['numerical_features'][8])
+        relative_leader_position_2 = rotateVector(relative_leader_position, -obs['numerical_features'][FOLLOWER_DIRECTION])
         arccos_x = np.arccos(relative_leader_position_2.dot(np.array([1, 0])) / (np.linalg.norm(relative_leader_position_2) * np.linalg.norm(np.array([1, 0]))))
         arccos_y = np.arccos(relative_leader_position_2.dot(np.array([0, 1])) / (np.linalg.norm(relative_leader_position_2) * np.linalg.norm(np.array([0, 1]))))
         if arccos_y > np.pi / 2:
@@ -445,15 +543,9 @@ class ContinuousObserveModifier_lidarMap2d(ContinuousObserveModifier_v0):
 
         lidar_map = self.DrawLidar2dMap((self.lidar_angle_steps_count, self.lidar_points_number), leader_position, follower_position,
                                  angle_between_leader_and_follower,  obs["LaserSensor"], self.follower_sensors['LaserSensor']['angle_step'],
-                                 obs['numerical_features'][3], obs['numerical_features'][8])
+                                 obs['numerical_features'][LEADER_DIRECTION], obs['numerical_features'][FOLLOWER_DIRECTION])
 
-        lidar_map = np.roll(lidar_map, self.lidar_angle_steps_count // 2, axis=0)
-        if self.prev_lidar_map is not None:
-            lidar_map += (self.prev_lidar_map - self.map_wrapper_forgetting_rate)
-            lidar_map = np.clip(lidar_map, 0, 1)
-        self.prev_lidar_map = lidar_map
-        resized = cv2.resize(lidar_map, self.resized_image_shape, interpolation = cv2.INTER_NEAREST)
-        return resized
+        return self.lidarMapObservation(lidar_map)
 
     def step(self, action):
         if self.action_values_range is not None:
@@ -492,26 +584,9 @@ class ContinuousObserveModifier_lidarMap2d_v2(ContinuousObserveModifier_lidarMap
         self.prev_follower_position = None
         self.prev_follower_direction = None
 
-    def DrawLidar2dMap(self, lidar_map_size,
-                     leader_position,
-                     follower_position,
-                     angle_between_leader_and_follower,
-                     lidar_observation,
-                     lidar_angle_step,
-                     leader_directions,
-                     follower_direction):
-        """
-        leader_position
-        follower_position
-        """
-
-        # рисуем карту из нулей
-        lidar_map = np.zeros((lidar_map_size[0], lidar_map_size[1], 3), dtype=np.float32)
-        # Заполняем красный канал единицами - препятствия, потом будем обнулять точки, которые видит лидар
-        lidar_map[:,:,0] = 1
-
-        # добавить прямоугольник за лидером
-        # вычисляем линии простого прямоугольника за спиной у лидера в относительных координатах
+    def dotsInsideSafeZone(self, lidar_observation, leader_position, follower_position, leader_directions,
+                           follower_direction):
+        """Mask of the lidar points inside the corridor of the leader"""
         if self.add_safezone_on_map:
             dotsInsideSafeZone = None
             if len(self.corridor)>2:
@@ -559,64 +634,10 @@ class ContinuousObserveModifier_lidarMap2d_v2(ContinuousObserveModifier_lidarMap
                     else:
                         dotsInsideSafeZone |= insideDots_currRectangle
             else:
-                dotsInsideSafeZone = np.zeros(lidar_observation.shape[0], dtype=np.bool)
+                dotsInsideSafeZone = np.zeros(lidar_observation.shape[0], dtype=bool)
         else:
-            dotsInsideSafeZone = np.zeros(lidar_observation.shape[0], dtype=np.bool)
-        step_i, point_i = 0, 0
-        # идём по точкам, которые вернул лидар
-        # предполагается, что каждая точка [0,0] в списке - это начало нового луча
-        for x_i, x in enumerate(lidar_observation):
-            if (x==0).all():
-                point_i = 0
-                if x_i !=0:
-                    if step_i==0:
-                        step_i += 1
-                    elif step_i > 0:
-                        step_i *= -1
-                    elif step_i < 0:
-                        step_i *= -1
-                        step_i += 1
-            # Если эта точка есть в списке, ставим ей 0 в красном канале
-            lidar_map[step_i, point_i, 0] = 0
-            if dotsInsideSafeZone[x_i]:
-                lidar_map[step_i, point_i, 2] = 1
-            point_i +=1
-
-        if not self.fill_safe_zone:
-            raise NotImplementedError("Не работает. Херня какая-то рисуется")
-            safe_zone_border = np.zeros_like(lidar_map[:,:,2])
-            for i in range(lidar_map.shape[0]):
-                for j in range(lidar_map.shape[1]-1):
-                    if lidar_map[i,j,2]==1:
-                        if i==0:
-                            if j==0:
-                                if lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[-1,j,2]==1:
-                                    continue
-                            if lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[i,j-1,2]==1 and lidar_map[-1,j,2]==1:
-                                continue
-                        elif i==lidar_map.shape[0]-1:
-                            if j==0:
-                                if lidar_map[i,j+1,2]==1 and lidar_map[0,j,2]==1 and lidar_map[i-1,j,2]==1:
-                                    continue
-                            if lidar_map[i,j+1,2]==1 and lidar_map[0,j,2]==1 and lidar_map[i,j-1,2]==1 and lidar_map[i-1,j,2]==1:
-                                continue
-                        elif j==0:
-                            if lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[i-1,j,2]==1:
-                                continue
-                        elif lidar_map[i,j+1,2]==1 and lidar_map[i+1,j,2]==1 and lidar_map[i,j-1,2]==1 and lidar_map[i-1,j,2]==1:
-                            continue
-                        else:
-                            safe_zone_border[i,j] = 1
-            lidar_map[:, :, 2] = safe_zone_border
-        # лидеру на карте ставим 1 в зелёном канале
-        follower_to_leader_vec = leader_position - follower_position
-        follower_to_leader_dist = np.linalg.norm(follower_to_leader_vec)
-        distance_between_points = self.lidar_range_pixels / self.lidar_points_number
-        if follower_to_leader_dist <= self.lidar_range_pixels:
-            leader_row_on_map = -int(angle_between_leader_and_follower // lidar_angle_step)
-            leader_col_on_map = int(follower_to_leader_dist // distance_between_points)
-            lidar_map[leader_row_on_map, leader_col_on_map, 1] = 1
-        return lidar_map
+            dotsInsideSafeZone = np.zeros(lidar_observation.shape[0], dtype=bool)
+        return dotsInsideSafeZone
 
     def constructCorridor(self, relative_leader_position, follower_position, follower_direction):
         if self.saving_counter % self.saving_period == 0:
@@ -682,29 +703,23 @@ class ContinuousObserveModifier_lidarMap2d_v2(ContinuousObserveModifier_lidarMap
         self.saving_counter += 1
 
     def observation(self, obs):
-        leader_position = np.array([obs['numerical_features'][0], obs['numerical_features'][1]])
-        follower_position = np.array([obs['numerical_features'][5], obs['numerical_features'][6]])
+        leader_position = np.array(obs['numerical_features'][LEADER_POSITION])
+        follower_position = np.array(obs['numerical_features'][FOLLOWER_POSITION])
 
         relative_leader_position = leader_position - follower_position
-        relative_leader_position_2 = rotateVector(relative_leader_position, -obs['numerical_features'][8])
+        relative_leader_position_2 = rotateVector(relative_leader_position, -obs['numerical_features'][FOLLOWER_DIRECTION])
         arccos_x = np.arccos(relative_leader_position_2.dot(np.array([1, 0])) / (np.linalg.norm(relative_leader_position_2) * np.linalg.norm(np.array([1, 0]))))
         arccos_y = np.arccos(relative_leader_position_2.dot(np.array([0, 1])) / (np.linalg.norm(relative_leader_position_2) * np.linalg.norm(np.array([0, 1]))))
         if arccos_y > np.pi / 2:
             arccos_x = -arccos_x
         angle_between_leader_and_follower = np.degrees(arccos_x)
-        self.constructCorridor(relative_leader_position, follower_position, obs['numerical_features'][8])
+        self.constructCorridor(relative_leader_position, follower_position, obs['numerical_features'][FOLLOWER_DIRECTION])
 
         lidar_map = self.DrawLidar2dMap((self.lidar_angle_steps_count, self.lidar_points_number), leader_position, follower_position,
                                  angle_between_leader_and_follower,  obs["LaserSensor"], self.follower_sensors['LaserSensor']['angle_step'],
-                                 obs['numerical_features'][3], obs['numerical_features'][8])
+                                 obs['numerical_features'][LEADER_DIRECTION], obs['numerical_features'][FOLLOWER_DIRECTION])
 
-        lidar_map = np.roll(lidar_map, self.lidar_angle_steps_count // 2, axis=0)
-        if self.prev_lidar_map is not None:
-            lidar_map += (self.prev_lidar_map - self.map_wrapper_forgetting_rate)
-            lidar_map = np.clip(lidar_map, 0, 1)
-        self.prev_lidar_map = lidar_map
-        resized = cv2.resize(lidar_map, self.resized_image_shape, interpolation = cv2.INTER_NEAREST)
-        return resized
+        return self.lidarMapObservation(lidar_map)
 
     def reset(self, **kwargs):
         observation = self.env.reset(**kwargs)
@@ -760,7 +775,7 @@ class LeaderTrajectory_v0(ObservationWrapper):
         # self.leader_positions_hist.append(obs[:2])
         vecs_follower_to_leadhistory_far = np.zeros((self.framestack, 2), dtype=np.float32)
         if len(self.leader_positions_hist) > 0:
-            vecs = np.array(self.leader_positions_hist[-self.framestack:]) - obs['numerical_features'][5:7]
+            vecs = np.array(self.leader_positions_hist[-self.framestack:]) - obs['numerical_features'][FOLLOWER_POSITION]
             vecs_follower_to_leadhistory_far[:min(len(self.leader_positions_hist), self.framestack)] = vecs
         vecs_follower_to_leadhistory_far = vecs_follower_to_leadhistory_far.flatten()
         vecs_follower_to_leadhistory_far = np.clip(vecs_follower_to_leadhistory_far / (self.max_distance * 2), -1, 1)
@@ -778,7 +793,7 @@ class LeaderTrajectory_v0(ObservationWrapper):
         radar_values = np.zeros(self.radar_sectors_number, dtype=np.float32)
         if len(self.leader_positions_hist) > 0:
             closest_dots = np.array(self.leader_positions_hist[:min(len(self.leader_positions_hist), self.framestack)])
-            vecs_follower_to_leadhistory_close = closest_dots - obs['numerical_features'][5:7]
+            vecs_follower_to_leadhistory_close = closest_dots - obs['numerical_features'][FOLLOWER_POSITION]
             distances_follower_to_closestDots = np.linalg.norm(vecs_follower_to_leadhistory_close, axis=1)
             angles_history_to_dir = calculateAngle(vecs_follower_to_leadhistory_close, followerDirVec)
             angles_history_to_right = calculateAngle(vecs_follower_to_leadhistory_close, followerRightVec)
@@ -798,8 +813,8 @@ class LeaderTrajectory_v0(ObservationWrapper):
 
     def step(self, action):
         observation, reward, done, info = self.env.step(action)
-        self.leader_positions_hist.append(observation['numerical_features'][:2])
-        norms = np.linalg.norm(np.array(self.leader_positions_hist) - observation['numerical_features'][5:7], axis=1)
+        self.leader_positions_hist.append(np.array(observation['numerical_features'][LEADER_POSITION]))
+        norms = np.linalg.norm(np.array(self.leader_positions_hist) - observation['numerical_features'][FOLLOWER_POSITION], axis=1)
         indexes = np.nonzero(norms <= max(self.follower.width, self.follower.height))[0]
         for index in sorted(indexes, reverse=True):
             del self.leader_positions_hist[index]
@@ -0,0 +1,103 @@
+import os
+from copy import deepcopy
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+try:
+    from continuous_grid_arctic.follow_the_leader_continuous_env import Game
+    from continuous_grid_arctic.follow_the_leader_batched_env import BatchedGame
+except:
+    from src.continuous_grid_arctic.follow_the_leader_continuous_env import Game
+    from src.continuous_grid_arctic.follow_the_leader_batched_env import BatchedGame
+
+SENSORS = {
+    "LeaderPositionsTracker_v2": {"sensor_class": "LeaderPositionsTracker_v2", "eat_close_points": False,
+                                  "generate_corridor": True, "saving_period": 8,
+                                  "start_corridor_behind_follower": True, "corridor_length": 250,
+                                  "corridor_width": 30},
+    "LeaderCorridor_lasers": {"sensor_class": "LeaderCorridor_lasers", "react_to_green_zone": True,
+                              "react_to_obstacles": True, "front_lasers_count": 5, "back_lasers_count": 2},
+    "LaserSensor": {"sensor_class": "LaserSensor", "available_angle": 360, "angle_step": 30, "points_number": 10,
+                    "sensor_range": 4, "return_all_points": False, "return_only_distances": True},
+    "Radar": {"sensor_class": "LeaderTrackDetector_radar", "position_sequence_length": 100,
+              "detectable_positions": "near", "radar_sectors_number": 90},
+}
+
+NUM_ENVS = 3
+STEPS = 60
+SEED = 5
+
+
+def _assert_equal(value, expected, name):
+    """Compares observation values, including the nested lists and tuples of the position trackers"""
+    if isinstance(expected, (list, tuple)):
+        assert len(value) == len(expected), name
+        for item, expected_item in zip(value, expected):
+            _assert_equal(item, expected_item, name)
+    else:
+        np.testing.assert_array_equal(np.asarray(value), np.asarray(expected), err_msg=name)
+
+
+def _run_games(game_kwargs, actions):
+    """Reference run: NUM_ENVS separate Game instances, each reset right after the end of its episode"""
+    np.random.seed(SEED)
+    games = [Game(**game_kwargs) for _ in range(NUM_ENVS)]
+    games[0].seed(SEED)
+    for game in games:
+        game.reset()
+
+    results = list()
+    for step_actions in actions:
+        step_results = list()
+        for game, action in zip(games, step_actions):
+            obs, reward, done, info = game.step(action)
+            step_results.append((deepcopy(dict(obs)), reward, done, dict(info)))
+            if done:
+                game.reset()
+        results.append(step_results)
+    for game in games:
+        game.close()
+    return results
+
+
+@pytest.mark.parametrize("game_kwargs", [
+    dict(),
+    dict(add_bear=True, bear_number=4),
+    dict(add_bear=False, random_frames_per_step=[5, 15]),
+], ids=["default", "bears", "random_frames"])
+def test_batched_game_matches_games(game_kwargs):
+    game_kwargs = dict(game_kwargs, follower_sensors=SENSORS, headless=True, max_steps=25)
+    rng = np.random.RandomState(0)
+    actions = rng.uniform([0, -0.5], [0.5, 0.5], size=(STEPS, NUM_ENVS, 2)).astype(np.float32)
+    expected = _run_games(game_kwargs, actions)
+
+    np.random.seed(SEED)
+    env = BatchedGame(NUM_ENVS, **game_kwargs)
+    env.seed(SEED)
+    env.reset()
+    dones_number = 0
+    try:
+        for step_actions, step_expected in zip(actions, expected):
+            observations, rewards, dones, infos = env.step(step_actions)
+            for env_index, (expected_obs, expected_reward, expected_done, expected_info) in enumerate(step_expected):
+                info = dict(infos[env_index])
+                if dones[env_index]:
+                    obs = info.pop("terminal_observation")
+                else:
+                    obs = {key: value[env_index] for key, value in observations.items()}
+
+                assert rewards[env_index] == expected_reward
+                assert dones[env_index] == expected_done
+                assert info == expected_info
+                assert obs.keys() == expected_obs.keys()
+                for key in expected_obs:
+                    _assert_equal(obs[key], expected_obs[key], key)
+                dones_number += expected_done
+    finally:
+        env.close()
+
+    # сравнение должно захватывать автоматический сброс сред
+    assert dones_number > 0